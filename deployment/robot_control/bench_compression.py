@@ -0,0 +1,96 @@
+import argparse
+import os
+import time
+import zlib
+
+import mujoco
+import numpy as np
+
+from compression import encode_state
+
+# State Stream Compression Benchmark
+# Records a short trajectory per scene and encodes every frame with each option the
+# servers offer (see compression.py), reporting bytes per frame against encode CPU time.
+# permessage-deflate is emulated with zlib exactly as websockets runs it: raw deflate,
+# one stream per connection (context takeover), sync flush per message.
+#
+# Usage (from repo root):
+#   python deployment/robot_control/bench_compression.py
+#   python deployment/robot_control/bench_compression.py public/mujoco/menagerie/unitree_g1/scene_puppet.xml --frames 500
+
+DEFAULT_SCENES = [
+    "public/mujoco/menagerie/unitree_g1/scene.xml",
+    "public/mujoco/menagerie/unitree_g1/scene_puppet.xml",
+]
+
+# (label, codec, permessage-deflate (level, window) or None)
+CONFIGS = [
+    ("json", "json", None),
+    ("json + deflate 1/w12", "json", (1, 12)),
+    ("json + deflate 6/w12", "json", (6, 12)),
+    ("json + deflate 9/w15", "json", (9, 15)),
+    ("binary", "binary", None),
+    ("binary + deflate 6/w12", "binary", (6, 12)),
+    ("zlib 1", "zlib", None),
+    ("zlib 6", "zlib", None),
+    ("zlib 9", "zlib", None),
+]
+
+def record(model, frames, batch, seed=0):
+    # Time + qpos every `batch` steps under slowly varying random controls
+    data = mujoco.MjData(model)
+    rng = np.random.default_rng(seed)
+    lo, hi = model.actuator_ctrlrange[:, 0], model.actuator_ctrlrange[:, 1]
+    target = np.zeros(model.nu)
+    states = []
+    for k in range(frames):
+        if k % 25 == 0 and model.nu:
+            target = lo + rng.random(model.nu) * (hi - lo)
+        data.ctrl[:] = target
+        mujoco.mj_step(model, data, batch)
+        states.append({"time": data.time, "qpos": data.qpos.copy()})
+    return states
+
+def run_config(states, codec, deflate, level):
+    compressor = None
+    if deflate is not None:
+        compressor = zlib.compressobj(deflate[0], zlib.DEFLATED, -deflate[1], 5)
+    total = 0
+    start = time.perf_counter()
+    for state in states:
+        message = encode_state(state, codec, level)
+        payload = message.encode() if isinstance(message, str) else message
+        if compressor is not None:
+            payload = (compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-4]
+        total += len(payload)
+    elapsed = time.perf_counter() - start
+    return total / len(states), elapsed / len(states) * 1e6
+
+def bench_scene(path, frames, batch):
+    model = mujoco.MjModel.from_xml_path(path)
+    hz = 1.0 / (batch * model.opt.timestep)
+    states = record(model, frames, batch)
+    print(f"\n--- {os.path.basename(path)} (nq={model.nq}, {frames} frames, {hz:g} Hz) ---")
+    print(f"  {'config':<24}{'bytes/frame':>12}{'vs json':>9}{'encode us':>11}{'KB/s':>9}")
+    baseline = None
+    for label, codec, deflate in CONFIGS:
+        level = int(label.split()[-1]) if codec == "zlib" else 6
+        size, us = run_config(states, codec, deflate, level)
+        baseline = baseline or size
+        print(f"  {label:<24}{size:>12.0f}{100.0 * size / baseline:>8.0f}%{us:>11.1f}{size * hz / 1024:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare state stream codecs: bytes saved vs CPU cost.")
+    parser.add_argument("scenes", nargs="*", default=DEFAULT_SCENES)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--batch", type=int, default=8, help="Physics steps between frames")
+    args = parser.parse_args()
+
+    for path in args.scenes:
+        if not os.path.exists(path):
+            print(f"Skipping {path} (not found)")
+            continue
+        bench_scene(path, args.frames, args.batch)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+# State Stream Compression (main.py, main_puppet.py)
+# Two independent layers, both negotiated per client:
+#
+# 1. permessage-deflate (RFC 7692), transparent to the application. Offered by browsers
+#    and websockets clients by default; the server accepts it unless started with
+#    --ws-compression off. Python clients on a LAN can decline it with
+#    websockets.connect(uri, compression=None) and skip the CPU cost on both ends.
+#      --deflate-level 1..9   (default 6)  --deflate-window 9..15 (default 12, memory per client)
+#
+# 2. Application codec, picked by the client after connecting:
+#      {"type": "hello", "codec": "zlib"}
+#      -> {"type": "hello", "codec": "zlib", "codecs": [...], "deflate": true}
+#    "json"   - text frames as before (default)
+#    "binary" - packed float32 fields, 2-5x smaller than JSON and far cheaper to build
+#    "zlib"   - "binary" compressed with zlib (--codec-level), for constrained links. Only
+#               pays off while much of the state is at rest; float32 of a moving scene
+#               barely compresses, there "binary" alone gets nearly all of the savings.
+#    Clients using "zlib" should decline permessage-deflate, compressing twice is wasted work.
+#
+# Binary frame layout (little endian):
+#   magic "TSF1" | u8 flags (1 = zlib body) | body
+#   body: f64 time | u8 nfields | per field: u8 name_len, name, u32 count, f32[count]
+# Each frame is encoded once per codec and shared by all clients using that codec.
+#
+# Compare CPU cost and bytes per scene: python deployment/robot_control/bench_compression.py
+
+CODECS = ("json", "binary", "zlib")
+MAGIC = b"TSF1"
+FLAG_ZLIB = 1
+DEFAULT_LEVEL = 6
+DEFAULT_WINDOW = 12
+
+def compression_options(argv=None):
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--ws-compression", choices=("deflate", "off"), default=os.environ.get("WS_COMPRESSION", "deflate"))
+    parser.add_argument("--deflate-level", type=int, default=int(os.environ.get("DEFLATE_LEVEL", DEFAULT_LEVEL)))
+    parser.add_argument("--deflate-window", type=int, default=int(os.environ.get("DEFLATE_WINDOW", DEFAULT_WINDOW)))
+    parser.add_argument("--codec-level", type=int, default=int(os.environ.get("CODEC_LEVEL", DEFAULT_LEVEL)))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return args
+
+def serve_kwargs(options):
+    # Extra keyword arguments for websockets.serve
+    if options.ws_compression == "off":
+        return {"compression": None}
+    from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+    return {"extensions": [ServerPerMessageDeflateFactory(
+        server_max_window_bits=options.deflate_window,
+        client_max_window_bits=options.deflate_window,
+        compress_settings={"level": options.deflate_level, "memLevel": 5},
+    )]}
+
+def describe(options):
+    if options.ws_compression == "off":
+        deflate = "permessage-deflate off"
+    else:
+        deflate = f"permessage-deflate level {options.deflate_level} window {options.deflate_window}"
+    return f"{deflate}, codecs {'/'.join(CODECS)} (zlib level {options.codec_level})"
+
+def deflate_active(websocket):
+    # True when permessage-deflate was negotiated on this connection
+    protocol = getattr(websocket, "protocol", websocket)
+    return any(ext.name == "permessage-deflate" for ext in getattr(protocol, "extensions", []))
+
+def encode_binary(state):
+    # state: {"time": float, name: array, ...}
+    parts = [struct.pack("<dB", state["time"], len(state) - 1)]
+    for name, values in state.items():
+        if name == "time":
+            continue
+        arr = np.asarray(values, dtype="<f4").ravel()
+        key = name.encode()
+        parts.append(struct.pack("<B", len(key)) + key + struct.pack("<I", arr.size))
+        parts.append(arr.tobytes())
+    return b"".join(parts)
+
+def decode_binary(body):
+    t, nfields = struct.unpack_from("<dB", body)
+    state = {"time": t}
+    off = 9
+    for _ in range(nfields):
+        n = body[off]
+        name = body[off + 1:off + 1 + n].decode()
+        off += 1 + n
+        (count,) = struct.unpack_from("<I", body, off)
+        off += 4
+        state[name] = np.frombuffer(body, dtype="<f4", count=count, offset=off)
+        off += 4 * count
+    return state
+
+def encode_state(state, codec="json", level=DEFAULT_LEVEL):
+    if codec == "json":
+        return json.dumps({k: (v.tolist() if isinstance(v, np.ndarray) else v) for k, v in state.items()})
+    body = encode_binary(state)
+    if codec == "zlib":
+        return MAGIC + bytes([FLAG_ZLIB]) + zlib.compress(body, level)
+    return MAGIC + bytes([0]) + body
+
+def decode_state(message):
+    # Client side helper: text -> dict of lists, binary -> dict of float32 arrays
+    if isinstance(message, str):
+        return json.loads(message)
+    if message[:4] != MAGIC:
+        raise ValueError("Not a state frame")
+    body = message[5:]
+    if message[4] & FLAG_ZLIB:
+        body = zlib.decompress(body)
+    return decode_binary(body)
+
+class StateCodecs:
+    # Per-client codec table, encodes each frame once per codec in use
+    def __init__(self, level=DEFAULT_LEVEL):
+        self.level = level
+        self.codec = {} # websocket -> codec
+
+    def negotiate(self, websocket, msg):
+        codec = msg.get("codec", "json")
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec '{codec}', expected one of {CODECS}")
+        self.codec[websocket] = codec
+        return {"type": "hello", "codec": codec, "codecs": list(CODECS), "deflate": deflate_active(websocket)}
+
+    def forget(self, websocket):
+        self.codec.pop(websocket, None)
+
+    def messages(self, clients, state):
+        # -> [(client, message)]
+        encoded = {}
+        out = []
+        for client in clients:
+            codec = self.codec.get(client, "json")
+            if codec not in encoded:
+                encoded[codec] = encode_state(state, codec, self.level)
+            out.append((client, encoded[codec]))
+        return out
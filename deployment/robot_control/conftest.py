@@ -0,0 +1,2 @@
+# test_control.py is a manual client for a running server (python test_control.py), not a test module
+collect_ignore = ["test_control.py"]
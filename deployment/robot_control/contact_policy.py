@@ -0,0 +1,300 @@
+import argparse
+import itertools
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+
+# Contact Policy for the gyro scenes (generate_mjcf.py, igenerate_mjcf.py)
+#
+# Every generated geom belongs to a structure group. The policy lists which groups
+# may touch each other; from it we derive contype/conaffinity bitmasks, so geoms
+# that can never meaningfully collide drop out of broadphase/narrowphase, plus
+# <exclude> pairs for bodies that are connected (welds, parent/child chains)
+# but whose groups are otherwise allowed to collide.
+#
+# The G1 XML geoms keep contype="1" conaffinity="1", so the "robot" group always
+# owns bit 0. Groups listed in `shared_groups` also use bit 0 (e.g. the floor when
+# it comes from an included scene instead of the generator). Bitmasks can't tell
+# shared groups apart, so a policy that separates them (pruned: structure touches
+# the floor but not the robot) also needs <exclude> pairs between the structure
+# bodies and every robot body, see separate_pairs().
+#
+# Generated XML carries a <!-- contact policy: ... --> stamp. The report checks the
+# compiled candidate pairs against it and exits non-zero when masks and policy disagree.
+#
+# Report (from repo root):
+#   python deployment/robot_control/generate_mjcf.py --contact-policy legacy --output public/mujoco/menagerie/unitree_g1/scene_gyro_legacy.xml
+#   python deployment/robot_control/generate_mjcf.py
+#   python deployment/robot_control/contact_policy.py public/mujoco/menagerie/unitree_g1/scene_gyro_legacy.xml public/mujoco/menagerie/unitree_g1/scene_gyro.xml
+
+GROUPS = ("robot", "floor", "gyro", "nodes", "pistons")
+
+CONTACT_POLICIES = {
+    # Everything collides with everything (generator output before pruning)
+    "legacy": None,
+    # Structure keeps touching the robot and the floor, but never itself.
+    # Robot <-> gyro_inner is welded, so that pair is excluded.
+    "touch": {
+        "robot": {"robot", "floor", "gyro", "nodes"},
+        "floor": {"robot", "gyro", "nodes"},
+        "gyro": {"robot", "floor"},
+        "nodes": {"robot", "floor"},
+        "pistons": set(),
+    },
+    # Structure only rests on the floor, robot keeps its own contacts
+    "pruned": {
+        "robot": {"robot", "floor"},
+        "floor": {"robot", "gyro", "nodes"},
+        "gyro": {"floor"},
+        "nodes": {"floor"},
+        "pistons": set(),
+    },
+}
+DEFAULT_POLICY = "touch"
+
+class ContactPolicy:
+    def __init__(self, name=DEFAULT_POLICY, shared_groups=("robot",)):
+        if name not in CONTACT_POLICIES:
+            raise ValueError(f"Unknown contact policy '{name}', expected one of {tuple(CONTACT_POLICIES)}")
+        self.name = name
+        self.rules = CONTACT_POLICIES[name]
+        self.shared = tuple(g for g in GROUPS if g in shared_groups)
+        if self.rules is not None:
+            for g, allowed in self.rules.items():
+                for other in allowed:
+                    if g not in self.rules.get(other, set()):
+                        raise ValueError(f"Contact policy '{name}' is not symmetric: {g} -> {other}")
+
+        # Bit per group
+        self.bits = {}
+        next_bit = 1
+        for g in GROUPS:
+            if g in shared_groups:
+                self.bits[g] = 1
+            else:
+                next_bit <<= 1
+                self.bits[g] = next_bit
+
+    def allows(self, g1, g2):
+        if self.rules is None:
+            return True
+        return g2 in self.rules.get(g1, set())
+
+    def masks(self, group):
+        # Shared groups come from XML we don't generate, they keep the MuJoCo default 1/1
+        if self.rules is None or group in self.shared:
+            return 1, 1
+        allowed = self.rules.get(group, set())
+        if not allowed:
+            return 0, 0
+        conaffinity = 0
+        for other in allowed:
+            conaffinity |= self.bits[other]
+        return self.bits[group], conaffinity
+
+    def overlaps(self, g1, g2):
+        # Would the bitmasks alone let these groups collide?
+        ct1, ca1 = self.masks(g1)
+        ct2, ca2 = self.masks(g2)
+        return bool((ct1 & ca2) | (ct2 & ca1))
+
+    def conflicts(self):
+        # Group pairs the policy forbids but the bitmasks let through (only possible
+        # between groups sharing bit 0), these need <exclude> pairs.
+        if self.rules is None:
+            return []
+        return [(g1, g2) for g1, g2 in itertools.combinations_with_replacement(GROUPS, 2)
+                if self.overlaps(g1, g2) and not self.allows(g1, g2)]
+
+    def stamp(self):
+        return f"<!-- contact policy: {self.name} shared: {','.join(self.shared)} -->"
+
+    @classmethod
+    def from_xml(cls, path):
+        # Policy stamped into a generated scene or one of its includes, None if not generated
+        try:
+            with open(path) as f:
+                text = f.read()
+        except OSError:
+            return None
+        m = re.search(r"<!-- contact policy: (\w+) shared: ([\w,]*) -->", text)
+        if m:
+            return cls(m.group(1), shared_groups=tuple(g for g in m.group(2).split(",") if g))
+        for include in re.findall(r'<include\s+file="([^"]+)"', text):
+            policy = cls.from_xml(os.path.join(os.path.dirname(path), include))
+            if policy is not None:
+                return policy
+        return None
+
+    def geom_group(self, contype, bodyid):
+        # Group of a compiled geom, from its contype bit. Bit 0 is the floor when it
+        # sits in the world body and the floor shares the bit, otherwise the robot.
+        if contype & 1:
+            return "floor" if "floor" in self.shared and bodyid == 0 else "robot"
+        for g, bit in self.bits.items():
+            if g not in self.shared and contype == bit:
+                return g
+        return None
+
+    def geom_attrs(self, group):
+        contype, conaffinity = self.masks(group)
+        return f'contype="{contype}" conaffinity="{conaffinity}"'
+
+    def exclude_xml(self, connections, separate=()):
+        # connections: [(body1, group1, body2, group2)] of structurally connected bodies.
+        # separate: other body pairs, excluded only where the policy forbids what the
+        # bitmasks allow (see separate_pairs).
+        # Only pairs the bitmasks would still let collide need an explicit exclude.
+        if self.rules is None:
+            return ""
+        xml = ""
+        seen = set()
+        pairs = [(c, True) for c in connections] + [(c, False) for c in separate]
+        for (b1, g1, b2, g2), connected in pairs:
+            key = tuple(sorted((b1, b2)))
+            if key in seen or not self.overlaps(g1, g2):
+                continue
+            if not connected and self.allows(g1, g2):
+                continue
+            seen.add(key)
+            xml += f'        <exclude body1="{b1}" body2="{b2}"/>\n'
+        return xml
+
+    def separate_pairs(self, bodies, robot_bodies):
+        # bodies: [(body, group)] of the generated structure. Pairs with every robot body
+        # for the groups in conflicts(), raises if those are needed but the robot is unknown.
+        needed = {g for pair in self.conflicts() if "robot" in pair for g in pair if g != "robot"}
+        if not needed:
+            return []
+        if not robot_bodies:
+            others = [g for g in self.shared if g != "robot"]
+            raise ValueError(f"Contact policy '{self.name}' keeps {sorted(needed)} off the robot, which shares bit 0 "
+                             f"with {others}: the robot bodies are needed for <exclude> pairs")
+        return [(b, g, rb, "robot") for b, g in bodies if g in needed for rb in robot_bodies]
+
+def robot_bodies(path):
+    # Body names of the robot XML (G1), None if it isn't there
+    try:
+        root = ET.parse(path).getroot()
+    except (OSError, ET.ParseError):
+        return None
+    return [b.get("name") for b in root.iter("body") if b.get("name")]
+
+def chain_connections(bodies, group):
+    # All pairs inside a rigid chain (root -> outer -> middle -> inner), parent/child
+    # and non-adjacent ones alike.
+    return [(a, group, b, group) for a, b in itertools.combinations(bodies, 2)]
+
+# --- REPORT ---
+
+def candidate_mask(model):
+    # Geom pairs that survive MuJoCo's static collision filters (same body, welded
+    # bodies, parent/child, <exclude>, contype/conaffinity). These are the pairs
+    # broadphase has to consider every step. Mask over np.triu_indices(ngeom, k=1).
+    import mujoco
+    import numpy as np
+
+    ngeom = model.ngeom
+    body = model.geom_bodyid
+    weld = model.body_weldid[body]
+    parent_weld = model.body_weldid[model.body_parentid[model.body_weldid]]
+    filterparent = not (model.opt.disableflags & mujoco.mjtDisableBit.mjDSBL_FILTERPARENT)
+
+    i, j = np.triu_indices(ngeom, k=1)
+    keep = weld[i] != weld[j]
+    keep &= ~((weld[i] == 0) & (weld[j] == 0))
+    if filterparent:
+        wi, wj = weld[i], weld[j]
+        keep &= ~((wi != 0) & (wj != 0) & ((wi == parent_weld[wj]) | (wj == parent_weld[wi])))
+    ct, ca = model.geom_contype, model.geom_conaffinity
+    keep &= ((ct[i] & ca[j]) | (ct[j] & ca[i])) != 0
+
+    if model.nexclude > 0:
+        sig = model.exclude_signature
+        excluded = set(zip((sig >> 16).tolist(), (sig & 0xFFFF).tolist()))
+        bi, bj = body[i], body[j]
+        for k in np.nonzero(keep)[0]:
+            a, b = int(bi[k]), int(bj[k])
+            if (a, b) in excluded or (b, a) in excluded:
+                keep[k] = False
+    return keep
+
+def candidate_pairs(model):
+    return int(candidate_mask(model).sum())
+
+def check_policy(model, policy):
+    # Candidate pairs (after all static filters) that the policy forbids, and allowed
+    # group pairs the masks never let meet. Empty when masks and policy agree.
+    import numpy as np
+
+    if policy is None or policy.rules is None:
+        return []
+    groups = [policy.geom_group(int(ct), int(b)) for ct, b in zip(model.geom_contype, model.geom_bodyid)]
+    i, j = np.triu_indices(model.ngeom, k=1)
+    keep = candidate_mask(model)
+    problems = []
+    seen = set()
+    for a, b in zip(i[keep].tolist(), j[keep].tolist()):
+        ga, gb = groups[a], groups[b]
+        if ga and gb and not policy.allows(ga, gb):
+            seen.add(tuple(sorted((ga, gb))))
+    problems += [f"{ga} <-> {gb} can collide, policy '{policy.name}' forbids it" for ga, gb in sorted(seen)]
+
+    present = {g: [k for k, gk in enumerate(groups) if gk == g] for g in GROUPS}
+    ct, ca = model.geom_contype, model.geom_conaffinity
+    for ga, gb in itertools.combinations_with_replacement(GROUPS, 2):
+        if not policy.allows(ga, gb) or not present[ga] or not present[gb] or ga == gb:
+            continue
+        ka, kb = present[ga], present[gb]
+        if not np.any((ct[ka][:, None] & ca[kb][None, :]) | (ct[kb][None, :] & ca[ka][:, None])):
+            problems.append(f"{ga} <-> {gb} is allowed by policy '{policy.name}' but the masks never match")
+    return problems
+
+def compare(paths, steps=1000):
+    import mujoco
+    from profile_scene import profile_model
+
+    rows = []
+    for path in paths:
+        model = mujoco.MjModel.from_xml_path(path)
+        data = mujoco.MjData(model)
+        report = profile_model(model, data, steps=steps, warmup=100)
+        timers = report["timers"]
+        rows.append({
+            "path": path,
+            "ngeom": model.ngeom,
+            "nexclude": model.nexclude,
+            "pairs": candidate_pairs(model),
+            "ncon": report["ncon"]["mean"],
+            "collision_us": timers.get("pos_collision", {}).get("per_step_us", 0.0),
+            "step_us": timers.get("step", {}).get("per_step_us", 0.0),
+            "problems": check_policy(model, ContactPolicy.from_xml(path)),
+        })
+
+    print(f"  {'scene':<48}{'geoms':>7}{'excl':>6}{'pairs':>8}{'ncon':>7}{'coll us':>9}{'step us':>9}")
+    for r in rows:
+        print(f"  {r['path'][-48:]:<48}{r['ngeom']:>7}{r['nexclude']:>6}{r['pairs']:>8}{r['ncon']:>7.1f}{r['collision_us']:>9.1f}{r['step_us']:>9.1f}")
+
+    base = rows[0]
+    for r in rows[1:]:
+        removed = base["pairs"] - r["pairs"]
+        share = 100.0 * removed / base["pairs"] if base["pairs"] else 0.0
+        coll = base["collision_us"] / r["collision_us"] if r["collision_us"] > 0 else float("inf")
+        step = base["step_us"] / r["step_us"] if r["step_us"] > 0 else float("inf")
+        print(f"\n{r['path']}: removed {removed} of {base['pairs']} candidate pairs ({share:.1f}%), "
+              f"collision {coll:.2f}x, step {step:.2f}x faster")
+
+    for r in rows:
+        for problem in r["problems"]:
+            print(f"\nMISMATCH {r['path']}: {problem}")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare candidate contact pairs and step time of scenes (first one is the baseline).")
+    parser.add_argument("scenes", nargs="+")
+    parser.add_argument("--steps", type=int, default=1000)
+    args = parser.parse_args()
+    rows = compare(args.scenes, steps=args.steps)
+    if any(r["problems"] for r in rows):
+        sys.exit(1)
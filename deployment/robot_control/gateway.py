@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+import uuid
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+
+from compression import compression_options, describe, serve_kwargs
+
+# Session Gateway (one machine, many independent puppet simulations)
+# Spawns a pool of main_puppet.py worker processes (one simulation each, own port)
+# and routes every WebSocket session to one of them. Messages are relayed as is in both
+# directions (text or binary, never decoded or re-encoded).
+#
+#   python deployment/robot_control/gateway.py --workers 8 --port 8766 [-- <extra main_puppet args>]
+#
+# Clients connect to ws://host:8766/<session_id> (or ?session=<id>). All connections with
+# the same id share one simulation (e.g. a viewer and a controller); a connection without
+# an id gets a fresh session of its own. A worker hosts --sessions-per-worker sessions
+# (default 1: every user gets an independent simulation); when all are taken new sessions
+# are refused with close code 1013 (try again later). With --recycle (default) a worker is
+# restarted once its last session ends, so the next user starts from a fresh state.
+#
+# Load report: GET http://host:8766/status -> JSON per worker (sessions, clients, messages,
+# bytes, cpu %, rss), also printed every --report seconds.
+# Extra worker args must not bind shared resources (--udp / --shm use fixed defaults).
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main_puppet.py")
+READY_TIMEOUT = 60.0
+TAIL_LINES = 20
+
+class Worker:
+    def __init__(self, index, port, extra_args):
+        self.index = index
+        self.port = port
+        self.extra_args = extra_args
+        self.proc = None
+        self.state = "stopped" # starting | ready | stopping | dead
+        self.sessions = {} # session id -> set of client connections
+        self.restarts = 0
+        self.messages_up = 0
+        self.messages_down = 0
+        self.bytes_down = 0
+        self.tail = deque(maxlen=TAIL_LINES) # Last output lines, shown when it dies
+        self._cpu = (time.monotonic(), 0.0)
+
+    @property
+    def uri(self):
+        return f"ws://127.0.0.1:{self.port}"
+
+    async def start(self):
+        self.state = "starting"
+        cmd = [sys.executable, "-u", WORKER_SCRIPT, "--headless", "--port", str(self.port), *self.extra_args]
+        self.proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+        asyncio.ensure_future(self._pump_output(self.proc))
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline and self.proc.returncode is None:
+            try:
+                async with websockets.connect(self.uri, open_timeout=1.0):
+                    self.state = "ready"
+                    self._cpu = (time.monotonic(), self._cpu_seconds())
+                    return True
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.InvalidHandshake):
+                await asyncio.sleep(0.2)
+        self.state = "dead"
+        print(f"[w{self.index}] failed to start:\n  " + "\n  ".join(self.tail))
+        return False
+
+    async def stop(self):
+        self.state = "stopping" # Not routable from here on
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.terminate()
+            try:
+                await asyncio.wait_for(self.proc.wait(), timeout=5.0)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+        self.state = "stopped"
+
+    async def restart(self):
+        if self.state in ("starting", "stopping"):
+            return False # Already on its way
+        await self.stop()
+        self.restarts += 1
+        return await self.start()
+
+    async def _pump_output(self, proc):
+        async for line in proc.stdout:
+            text = line.decode(errors="replace").rstrip()
+            self.tail.append(text)
+            if "Error" in text or "Traceback" in text:
+                print(f"[w{self.index}] {text}")
+        if proc is self.proc and self.state == "ready":
+            self.state = "dead"
+            print(f"[w{self.index}] exited with code {await proc.wait()}")
+
+    def _cpu_seconds(self):
+        # utime + stime from /proc (Linux), 0 elsewhere
+        try:
+            with open(f"/proc/{self.proc.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError, AttributeError):
+            return 0.0
+
+    def _rss_mb(self):
+        try:
+            with open(f"/proc/{self.proc.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+        except (OSError, ValueError, IndexError, AttributeError):
+            return None
+
+    def load(self):
+        now, cpu = time.monotonic(), self._cpu_seconds()
+        then, cpu_then = self._cpu
+        self._cpu = (now, cpu)
+        return {
+            "worker": self.index,
+            "port": self.port,
+            "state": self.state,
+            "sessions": len(self.sessions),
+            "clients": sum(len(c) for c in self.sessions.values()),
+            "messages_up": self.messages_up,
+            "messages_down": self.messages_down,
+            "mb_down": self.bytes_down / 1e6,
+            "cpu_percent": 100.0 * max(0.0, cpu - cpu_then) / (now - then) if now > then else 0.0, # New process after a restart
+            "rss_mb": self._rss_mb(),
+            "restarts": self.restarts,
+        }
+
+class Gateway:
+    def __init__(self, args, extra_args):
+        self.args = args
+        self.workers = [Worker(i, args.base_port + i, extra_args) for i in range(args.workers)]
+        self.routes = {} # session id -> worker
+        self.started = time.monotonic()
+
+    async def start(self):
+        # Workers start concurrently; each already loads from the mjb cache after the first
+        results = await asyncio.gather(*[w.start() for w in self.workers])
+        print(f"{sum(results)}/{len(self.workers)} workers ready")
+
+    async def stop(self):
+        await asyncio.gather(*[w.stop() for w in self.workers])
+
+    def session_id(self, websocket):
+        url = urlsplit(websocket.request.path)
+        query = parse_qs(url.query).get("session")
+        sid = query[0] if query else url.path.strip("/")
+        return sid or uuid.uuid4().hex[:12]
+
+    def route(self, sid):
+        worker = self.routes.get(sid)
+        if worker is not None and worker.state == "ready":
+            return worker
+        free = [w for w in self.workers if w.state == "ready" and len(w.sessions) < self.args.sessions_per_worker]
+        if not free:
+            return None
+        worker = min(free, key=lambda w: (len(w.sessions), sum(len(c) for c in w.sessions.values())))
+        self.routes[sid] = worker
+        worker.sessions[sid] = set()
+        return worker
+
+    async def release(self, worker, sid, websocket):
+        clients = worker.sessions.get(sid)
+        if clients is None:
+            return
+        clients.discard(websocket)
+        if clients:
+            return
+        del worker.sessions[sid]
+        self.routes.pop(sid, None)
+        if self.args.recycle and not worker.sessions:
+            print(f"[w{worker.index}] session {sid} ended, restarting for a fresh simulation")
+            await worker.restart()
+
+    async def handler(self, websocket):
+        sid = self.session_id(websocket)
+        worker = self.route(sid)
+        if worker is None:
+            await websocket.close(1013, "All simulation workers are busy")
+            return
+        worker.sessions[sid].add(websocket)
+        try:
+            async with websockets.connect(worker.uri, compression=None, max_size=None) as upstream:
+                async def up():
+                    async for message in websocket:
+                        await upstream.send(message)
+                        worker.messages_up += 1
+
+                async def down():
+                    async for message in upstream:
+                        await websocket.send(message)
+                        worker.messages_down += 1
+                        worker.bytes_down += len(message)
+
+                tasks = [asyncio.ensure_future(up()), asyncio.ensure_future(down())]
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for t in tasks:
+                    t.cancel()
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            print(f"[w{worker.index}] relay for session {sid} ended: {e}")
+        finally:
+            await self.release(worker, sid, websocket)
+
+    def status(self):
+        return {
+            "uptime_s": time.monotonic() - self.started,
+            "sessions": len(self.routes),
+            "workers": [w.load() for w in self.workers],
+        }
+
+    def process_request(self, connection, request):
+        # Plain HTTP status page next to the WebSocket endpoint
+        if request.path.rstrip("/") == "/status":
+            return connection.respond(200, json.dumps(self.status(), indent=1) + "\n")
+        return None
+
+    async def watchdog(self):
+        # Restart workers that died and print the load report
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(1.0)
+            for w in self.workers:
+                if w.state == "dead" and not w.sessions:
+                    print(f"[w{w.index}] restarting")
+                    await w.restart()
+            if self.args.report > 0 and time.monotonic() - last_report >= self.args.report:
+                last_report = time.monotonic()
+                for load in self.status()["workers"]:
+                    print(f"  w{load['worker']} :{load['port']} {load['state']:<8} sessions {load['sessions']} clients {load['clients']} "
+                          f"| up {load['messages_up']} down {load['messages_down']} ({load['mb_down']:.1f} MB) "
+                          f"| cpu {load['cpu_percent']:.0f}% rss {load['rss_mb'] or 0:.0f} MB")
+
+async def main_async(args, extra_args):
+    # SIGTERM (docker stop, timeout) unwinds through the finally below so no worker is orphaned
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass
+
+    gateway = Gateway(args, extra_args)
+    print(f"Starting {args.workers} puppet workers on ports {args.base_port}-{args.base_port + args.workers - 1}...")
+    await gateway.start()
+    options = compression_options(extra_args)
+    print(f"Compression: {describe(options)}")
+    try:
+        async with websockets.serve(gateway.handler, args.host, args.port, process_request=gateway.process_request,
+                                    max_size=None, **serve_kwargs(options)):
+            print(f"Gateway listening on ws://{args.host}:{args.port}/<session_id> (status: http://{args.host}:{args.port}/status)")
+            await gateway.watchdog()
+    finally:
+        await gateway.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Route WebSocket sessions to a pool of main_puppet.py workers.",
+                                     epilog="Arguments after -- are passed to every worker (e.g. -- --rate 2x --model scene.xml)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--base-port", type=int, default=9100, help="First worker port")
+    parser.add_argument("--sessions-per-worker", type=int, default=1)
+    parser.add_argument("--no-recycle", dest="recycle", action="store_false", help="Keep worker state between sessions")
+    parser.add_argument("--report", type=float, default=30.0, help="Seconds between load reports (0 disables)")
+    argv = sys.argv[1:]
+    extra_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+    try:
+        asyncio.run(main_async(args, extra_args))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("Gateway stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from mesh_io import read_obj, read_stl
+from piston_templates import NODE_MODES, PISTON_FIDELITY, piston_xml, spring_xml
+
+# Tensegrity Scene from an Arbitrary Mesh (STL / OBJ)
+#   Mesh vertices   -> node bodies
+#   Mesh edges      -> pistons (piston_templates.piston_xml)
+#   Face diagonals  -> passive springs (spring_xml). An edge shared by two coplanar
+#                      triangles only exists because a polygon was triangulated
+#                      (e.g. the rhombi of rhrombic_dodecahedron.stl).
+#
+# Usage (from repo root):
+#   python deployment/robot_control/generate_from_mesh.py deployment/robot_control/rhrombic_dodecahedron.stl --size 3.6
+#   python deployment/robot_control/generate_from_mesh.py shape.obj --piston-fidelity tendon --node-mode mocap --with-robot
+#
+# Large meshes: everything up to the XML is vectorized (weld, edges, diagonals).
+# Use --piston-fidelity tendon to keep the compiled model small.
+
+DEFAULT_OUTPUT = "public/mujoco/menagerie/unitree_g1/scene_mesh.xml"
+G1_PATH = "public/mujoco/menagerie/unitree_g1/g1.xml"
+DEFAULT_WELD_TOL = 1e-4 # Fraction of the bounding box diagonal, absorbs CAD chamfers and float noise
+MIN_UNIT_FRACTION = 0.02 # Sizing unit never below this fraction of the (scaled) bounding box diagonal
+MIN_NODE_RADIUS = 0.005 # m, keeps node mass/inertia well above mjMINVAL
+MIN_STRUT = 0.002 # m
+
+def load_mesh(path):
+    # -> verts (V, 3), faces (F, 3). STL comes as a triangle soup, every corner is its own vertex.
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".obj":
+        return read_obj(path)
+    if ext == ".stl":
+        tris = np.asarray(read_stl(path)["v"], dtype=np.float64)
+        return tris.reshape(-1, 3), np.arange(3 * len(tris)).reshape(-1, 3)
+    raise ValueError(f"Unsupported mesh format '{ext}', expected .stl or .obj")
+
+def weld_vertices(verts, faces, tol=DEFAULT_WELD_TOL):
+    # Merges vertices closer than tol times the bounding box diagonal (works the same for
+    # meshes in m or mm). Spatial hash with cell size = tolerance: candidate pairs come from
+    # the own cell and the 13 forward neighbour cells, so duplicates straddling a cell
+    # boundary are merged too. Clusters are joined transitively (connected components).
+    # Returns unique verts and faces re-indexed into them (degenerate faces dropped).
+    cell = tol * max(float(np.linalg.norm(verts.max(axis=0) - verts.min(axis=0))), 1e-12)
+    keys = np.floor(verts / cell).astype(np.int64)
+    keys -= keys.min(axis=0) - 1 # >= 1, so the -1 neighbours stay non-negative
+    dims = keys.max(axis=0) + 2
+    if float(np.prod(dims.astype(np.float64))) >= 2.0 ** 62:
+        raise ValueError(f"Weld tolerance {tol} too small for this mesh")
+    code = (keys[:, 0] * dims[1] + keys[:, 1]) * dims[2] + keys[:, 2]
+
+    # Vertices grouped by cell: cell c holds order[starts[c]:starts[c] + counts[c]]
+    cells, cell_of, counts = np.unique(code, return_inverse=True, return_counts=True)
+    cell_of = cell_of.reshape(-1)
+    order = np.argsort(cell_of, kind="stable")
+    starts = np.cumsum(counts) - counts
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    def expand(i, lo, n):
+        # Pairs of each i with order[lo:lo + n]
+        i = np.repeat(i, n)
+        j = order[np.repeat(lo, n) + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)]
+        close = np.sum((verts[i] - verts[j]) ** 2, axis=1) <= cell * cell
+        return i[close], j[close]
+
+    # Own cell: each vertex with the ones after it
+    everyone = np.arange(len(verts))
+    pairs = [expand(everyone, rank + 1, starts[cell_of] + counts[cell_of] - rank - 1)]
+    for dx, dy, dz in [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) > (0, 0, 0)]:
+        target = cells + (dx * dims[1] + dy) * dims[2] + dz
+        nb = np.minimum(np.searchsorted(cells, target), len(cells) - 1)
+        hit = cells[nb] == target
+        if not hit.any():
+            continue
+        mine = hit[cell_of]
+        other = nb[cell_of[mine]]
+        pairs.append(expand(everyone[mine], starts[other], counts[other]))
+    i = np.concatenate([p[0] for p in pairs])
+    j = np.concatenate([p[1] for p in pairs])
+
+    # Connected components: min-label propagation + pointer jumping
+    labels = everyone.copy()
+    while True:
+        prev = labels.copy()
+        low = np.minimum(labels[i], labels[j])
+        np.minimum.at(labels, i, low)
+        np.minimum.at(labels, j, low)
+        labels = labels[labels]
+        if np.array_equal(labels, prev):
+            break
+
+    roots, compact = np.unique(labels, return_inverse=True)
+    welded = verts[roots]
+    faces = compact.reshape(-1)[faces]
+    ok = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    return welded, faces[ok]
+
+def extract_edges(verts, faces, coplanar_tol=1e-6):
+    # Unique undirected edges (E, 2) and a mask of face diagonals (edges between two
+    # coplanar faces, 1 - |n1.n2| below coplanar_tol, i.e. ~0.08 deg for 1e-6).
+    e = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    edges, inverse, counts = np.unique(e, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+
+    t = verts[faces]
+    n = np.cross(t[:, 1] - t[:, 0], t[:, 2] - t[:, 0])
+    n /= np.linalg.norm(n, axis=1, keepdims=True)
+
+    # Group the face slots by edge; manifold interior edges have exactly 2 faces
+    order = np.argsort(inverse, kind="stable")
+    face_of_slot = order // 3
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    diagonal = np.zeros(len(edges), dtype=bool)
+    two = np.nonzero(counts == 2)[0]
+    fa = face_of_slot[starts[two]]
+    fb = face_of_slot[starts[two] + 1]
+    # abs(): input winding is not trusted, opposite normals are still coplanar
+    diagonal[two] = np.abs(np.einsum("ij,ij->i", n[fa], n[fb])) > 1.0 - coplanar_tol
+    return edges, diagonal
+
+def generate_scene_from_mesh(mesh_path, output_path=DEFAULT_OUTPUT, size=None, scale=1.0,
+                             weld_tol=DEFAULT_WELD_TOL, diagonals="spring", piston_fidelity="full",
+                             node_mode="free", with_robot=False):
+    t_start = time.perf_counter()
+    raw_verts, raw_faces = load_mesh(mesh_path)
+    verts, faces = weld_vertices(raw_verts, raw_faces, tol=weld_tol)
+    edges, diagonal = extract_edges(verts, faces)
+    t_topology = time.perf_counter()
+
+    print(f"Mesh: {mesh_path}")
+    print(f"  Vertices: {len(raw_verts)} -> {len(verts)} welded, Faces: {len(faces)}, Edges: {len(edges)} ({int(diagonal.sum())} face diagonals)")
+
+    # Center, then scale (--size: bounding box diagonal in meters)
+    verts = verts - (verts.min(axis=0) + verts.max(axis=0)) / 2
+    if size is not None:
+        scale = size / np.linalg.norm(verts.max(axis=0) - verts.min(axis=0))
+    verts = verts * scale
+
+    piston_edges = edges if diagonals == "piston" else edges[~diagonal]
+    spring_edges = edges[diagonal] if diagonals == "spring" else np.zeros((0, 2), dtype=edges.dtype)
+
+    # Sizes follow the mesh resolution (same ratios as generate_puppet.py at s=1.8), floored
+    # by the bounding box so sliver edges left in a CAD export cannot shrink the nodes to nothing
+    edge_len = np.linalg.norm(verts[edges[:, 0]] - verts[edges[:, 1]], axis=1)
+    bbox_diag = float(np.linalg.norm(verts.max(axis=0) - verts.min(axis=0)))
+    unit = max(float(np.median(edge_len)), bbox_diag * MIN_UNIT_FRACTION)
+    th_struct = max(unit * 0.02, MIN_STRUT)
+    node_radius = max(unit * 0.05, MIN_NODE_RADIUS)
+    z_offset = 1.0 if with_robot else float(-verts[:, 2].min() + node_radius)
+
+    # Same settings as generate_puppet.py
+    d_joint = 'damping="1.0" armature="1.0"'
+    d_geom = 'contype="0" conaffinity="0" solref="0.005 1" solimp="0.9 0.95 0.001" margin="0.001"'
+    if node_mode not in NODE_MODES:
+        raise ValueError(f"Unknown node mode '{node_mode}', expected one of {NODE_MODES}")
+
+    # --- PISTONS ---
+    xml_pistons = []
+    xml_equality = []
+    xml_actuator = []
+    xml_tendon = []
+    node_children = {}
+    v_list = verts.tolist()
+    for k, (n1, n2) in enumerate(piston_edges.tolist()):
+        frag = piston_xml(f"piston_mesh_{k}", n1, n2, v_list[n1], v_list[n2], z_offset, th_struct, d_joint, d_geom,
+                          kp=10000, dual_actuators=False, center_site=True, fidelity=piston_fidelity)
+        xml_pistons.append(frag["body"])
+        for idx, children in frag["node_children"].items():
+            node_children.setdefault(idx, []).append(children)
+        xml_equality.append(frag["equality"])
+        xml_actuator.append(frag["actuator"])
+        xml_tendon.append(frag["tendon"])
+
+    # --- SPRINGS ---
+    for k, (n1, n2) in enumerate(spring_edges.tolist()):
+        xml_tendon.append(spring_xml(f"spring_{k}", f"node_{n1}", f"node_{n2}", width=th_struct * 0.5))
+
+    # --- NODES ---
+    # Built after the pistons so node children go straight in (no markers to replace)
+    xml_nodes = []
+    for i, (x, y, z) in enumerate(v_list):
+        if node_mode == "mocap":
+            xml_nodes.append(f'    <body name="node_{i}" pos="{x} {y} {z + z_offset}" mocap="true">\n')
+        elif node_mode == "static":
+            xml_nodes.append(f'    <body name="node_{i}" pos="{x} {y} {z + z_offset}">\n')
+        else:
+            xml_nodes.append(f'    <body name="node_{i}" pos="{x} {y} {z + z_offset}" gravcomp="1">\n')
+            xml_nodes.append('        <freejoint/>\n')
+        xml_nodes.append(f'        <site name="node_{i}"/>\n')
+        xml_nodes.append(f'        <geom type="sphere" size="{node_radius}" rgba="0.8 0.5 0.2 1" mass="1.0" {d_geom}/>\n')
+        xml_nodes.extend(node_children.get(i, ()))
+        xml_nodes.append('    </body>\n')
+
+    xml_nodes = "".join(xml_nodes) + "".join(xml_pistons)
+    xml_equality = "".join(xml_equality)
+    xml_actuator = "".join(xml_actuator)
+    xml_tendon = "".join(xml_tendon)
+
+    # --- ROBOT ATTACHMENT (optional) ---
+    if with_robot:
+        try:
+            with open(G1_PATH, "r") as f:
+                final_xml = f.read()
+        except FileNotFoundError:
+            print(f"Error: Could not find {G1_PATH}")
+            return
+        xml_nodes += '    <body name="center_anchor" pos="0 0 {}">\n'.format(z_offset)
+        xml_nodes += '        <site name="center_site"/>\n'
+        xml_nodes += '    </body>\n'
+        xml_equality += '        <weld name="attach_robot" body1="center_anchor" body2="pelvis" relpose="0 0 0 1 0 0 0"/>\n'
+    else:
+        final_xml = '<mujoco model="tensegrity_mesh">\n  <option timestep="0.002"/>\n  <worldbody>\n    <light pos="0 0 5" dir="0 0 -1"/>\n  </worldbody>\n</mujoco>\n'
+
+    # --- INJECTION ---
+    floor_asset = """
+    <texture type="2d" name="groundplane" builtin="checker" mark="edge" rgb1="0.2 0.3 0.4" rgb2="0.1 0.2 0.3" markrgb="0.8 0.8 0.8" width="300" height="300"/>
+    <material name="groundplane" texture="groundplane" texuniform="true" texrepeat="5 5" reflectance="0.2"/>
+    """
+    if '</asset>' in final_xml:
+        final_xml = final_xml.replace('</asset>', floor_asset + '\n  </asset>')
+    else:
+        final_xml = final_xml.replace('<worldbody>', f'<asset>{floor_asset}</asset>\n<worldbody>')
+
+    floor_xml = '<geom name="floor" size="0 0 0.05" type="plane" material="groundplane"/>'
+    final_xml = final_xml.replace('<worldbody>', f'<worldbody>\n    {floor_xml}\n{xml_nodes}')
+
+    for tag, block in (("actuator", xml_actuator), ("tendon", xml_tendon), ("equality", xml_equality)):
+        if not block:
+            continue
+        if f'</{tag}>' in final_xml:
+            final_xml = final_xml.replace(f'</{tag}>', block + f'\n  </{tag}>')
+        else:
+            final_xml = final_xml.replace('</mujoco>', f'<{tag}>\n{block}</{tag}>\n</mujoco>')
+
+    with open(output_path, "w") as f:
+        f.write(final_xml)
+
+    t_end = time.perf_counter()
+    print(f"  Nodes: {len(verts)} ({node_mode}), Pistons: {len(piston_edges)} ({piston_fidelity}), Springs: {len(spring_edges)}")
+    print(f"  Topology {1e3 * (t_topology - t_start):.1f} ms, XML {1e3 * (t_end - t_topology):.1f} ms")
+    print(f"Generated Mesh Scene: {output_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a tensegrity scene (nodes, pistons, springs) from an STL/OBJ mesh.")
+    parser.add_argument("mesh")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--size", type=float, default=None, help="Scale so the bounding box diagonal is SIZE meters (overrides --scale)")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--weld-tol", type=float, default=DEFAULT_WELD_TOL,
+                        help="Vertices closer than this fraction of the bounding box diagonal (grid cell size) are merged")
+    parser.add_argument("--diagonals", choices=("spring", "piston", "skip"), default="spring",
+                        help="What to emit for edges that split a planar polygon")
+    parser.add_argument("--piston-fidelity", choices=PISTON_FIDELITY, default="full",
+                        help="full: freejoint barrel + 2 rods, reduced: single slide chain, tendon: length actuated tendon")
+    parser.add_argument("--node-mode", choices=NODE_MODES, default="free",
+                        help="free: freejoint nodes, mocap: kinematic nodes driven by the server, static: welded to world")
+    parser.add_argument("--with-robot", action="store_true", help="Merge into the G1 model and weld the pelvis to the mesh center")
+    args = parser.parse_args()
+    generate_scene_from_mesh(args.mesh, args.output, size=args.size, scale=args.scale, weld_tol=args.weld_tol,
+                             diagonals=args.diagonals, piston_fidelity=args.piston_fidelity,
+                             node_mode=args.node_mode, with_robot=args.with_robot)
@@ -1,12 +1,16 @@
-import math
-
+import argparse
 import math
 import os
+import re
+
+from contact_policy import CONTACT_POLICIES, DEFAULT_POLICY, ContactPolicy, chain_connections
+from ring_lod import RING_LOD, RingLOD
 
-def generate_scene_gyro():
+def generate_scene_gyro(contact_policy=DEFAULT_POLICY, output_path=None, ring_lod="high"):
     # Paths
     g1_path = "public/mujoco/menagerie/unitree_g1/g1.xml"
-    output_path = "public/mujoco/menagerie/unitree_g1/scene_gyro.xml"
+    if output_path is None:
+        output_path = "public/mujoco/menagerie/unitree_g1/scene_gyro.xml"
 
     # Read G1 XML
     try:
@@ -30,32 +34,24 @@ def generate_scene_gyro():
 
     # Defaults to Inline
     d_joint = 'damping="0.5" armature="0.02"'
-    d_geom = 'contype="1" conaffinity="1" condim="3" solref="0.005 1" solimp="0.9 0.95 0.001" margin="0.001"'
+    # Contacts: contype/conaffinity per structure group (see contact_policy.py)
+    contact = ContactPolicy(contact_policy)
+    print(f"Contact Policy: {contact_policy}")
+    d_solver = 'condim="3" solref="0.005 1" solimp="0.9 0.95 0.001" margin="0.001"'
+    d_geom = f'{contact.geom_attrs("gyro")} {d_solver}'
+    d_node_geom = f'{contact.geom_attrs("nodes")} {d_solver}'
+    d_piston_geom = f'{contact.geom_attrs("pistons")} {d_solver}'
+    d_payload = contact.geom_attrs("gyro")
 
     # --- 1. GYROSCOPE ASSEMBLY (ROOT) ---
     th_struct = s * 0.015
     xml_body = ""
     
+    # Ring geometry per LOD level (see ring_lod.py)
+    rings = RingLOD(ring_lod)
+
     def get_ring_geoms(radius, color, axis='z', phase=0):
-        g = ""
-        seg = 16
-        gap = 0.2
-        for start in [gap, math.pi + gap]:
-            for i in range(seg):
-                a1 = start + i * (math.pi - 2*gap)/seg + phase
-                a2 = start + (i+1) * (math.pi - 2*gap)/seg + phase
-                c1, s1 = math.cos(a1), math.sin(a1)
-                c2, s2 = math.cos(a2), math.sin(a2)
-                
-                if axis == 'z': p1, p2 = (radius*c1, radius*s1, 0), (radius*c2, radius*s2, 0)
-                elif axis == 'y': p1, p2 = (radius*c1, 0, radius*s1), (radius*c2, 0, radius*s2)
-                elif axis == 'x': p1, p2 = (0, radius*c1, radius*s1), (0, radius*c2, radius*s2)
-                else: p1, p2 = (radius*c1, radius*s1, 0), (radius*c2, radius*s2, 0)
-                    
-                g += '        <geom type="capsule" fromto="{:.4f} {:.4f} {:.4f} {:.4f} {:.4f} {:.4f}" size="{}" rgba="{}" mass="0.1" {}/>\n'.format(
-                    p1[0], p1[1], p1[2], p2[0], p2[1], p2[2], th_struct, color, d_geom
-                )
-        return g
+        return rings.geoms(radius, color, th_struct, axis=axis, phase=phase, seg=16, gap=0.2, mass=0.1, geom_attrs=d_geom)
 
     # ROOT BODY
     xml_body += '    <body name="gyro_root" pos="0 0 {}">\n'.format(z_offset)
@@ -68,11 +64,11 @@ def generate_scene_gyro():
     xml_body += get_ring_geoms(s*0.55, "1 0.8 0 1", axis='x', phase=math.pi/2)
     # Payload Nodes 2/3
     xml_body += '            <site name="node_2" pos="0 {} 0"/>\n'.format(s)
-    xml_body += '            <geom type="sphere" pos="0 {} 0" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1"/>\n'.format(s, s*0.06)
-    xml_body += '            <geom type="capsule" fromto="0 {} 0 0 {} 0" size="{}" rgba="1 0.8 0 1" mass="0.01"/>\n'.format(s*0.55, s, th_struct)
+    xml_body += '            <geom type="sphere" pos="0 {} 0" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1" {}/>\n'.format(s, s*0.06, d_payload)
+    xml_body += '            <geom type="capsule" fromto="0 {} 0 0 {} 0" size="{}" rgba="1 0.8 0 1" mass="0.01" {}/>\n'.format(s*0.55, s, th_struct, d_payload)
     xml_body += '            <site name="node_3" pos="0 {} 0"/>\n'.format(-s)
-    xml_body += '            <geom type="sphere" pos="0 {} 0" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1"/>\n'.format(-s, s*0.06)
-    xml_body += '            <geom type="capsule" fromto="0 {} 0 0 {} 0" size="{}" rgba="1 0.8 0 1" mass="0.01"/>\n'.format(-s*0.55, -s, th_struct)
+    xml_body += '            <geom type="sphere" pos="0 {} 0" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1" {}/>\n'.format(-s, s*0.06, d_payload)
+    xml_body += '            <geom type="capsule" fromto="0 {} 0 0 {} 0" size="{}" rgba="1 0.8 0 1" mass="0.01" {}/>\n'.format(-s*0.55, -s, th_struct, d_payload)
 
     # MIDDLE RING (Silver, X-Axis)
     xml_body += '            <body name="gyro_middle" pos="0 0 0">\n'
@@ -80,11 +76,11 @@ def generate_scene_gyro():
     xml_body += get_ring_geoms(s*0.50, "0.8 0.8 0.8 1", axis='z', phase=math.pi/2)
     # Payload Nodes 0/1
     xml_body += '                <site name="node_0" pos="{} 0 0"/>\n'.format(s)
-    xml_body += '                <geom type="sphere" pos="{} 0 0" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1"/>\n'.format(s, s*0.06)
-    xml_body += '                <geom type="capsule" fromto="{} 0 0 {} 0 0" size="{}" rgba="0.8 0.8 0.8 1" mass="0.01"/>\n'.format(s*0.50, s, th_struct)
+    xml_body += '                <geom type="sphere" pos="{} 0 0" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1" {}/>\n'.format(s, s*0.06, d_payload)
+    xml_body += '                <geom type="capsule" fromto="{} 0 0 {} 0 0" size="{}" rgba="0.8 0.8 0.8 1" mass="0.01" {}/>\n'.format(s*0.50, s, th_struct, d_payload)
     xml_body += '                <site name="node_1" pos="{} 0 0"/>\n'.format(-s)
-    xml_body += '                <geom type="sphere" pos="{} 0 0" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1"/>\n'.format(-s, s*0.06)
-    xml_body += '                <geom type="capsule" fromto="{} 0 0 {} 0 0" size="{}" rgba="0.8 0.8 0.8 1" mass="0.01"/>\n'.format(-s*0.50, -s, th_struct)
+    xml_body += '                <geom type="sphere" pos="{} 0 0" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1" {}/>\n'.format(-s, s*0.06, d_payload)
+    xml_body += '                <geom type="capsule" fromto="{} 0 0 {} 0 0" size="{}" rgba="0.8 0.8 0.8 1" mass="0.01" {}/>\n'.format(-s*0.50, -s, th_struct, d_payload)
 
     # INNER RING (Bronze, Z-Axis)
     xml_body += '                <body name="gyro_inner" pos="0 0 0">\n'
@@ -92,11 +88,11 @@ def generate_scene_gyro():
     xml_body += get_ring_geoms(s*0.45, "0.8 0.5 0.2 1", axis='y')
     # Payload Nodes 4/5
     xml_body += '                    <site name="node_4" pos="0 0 {}"/>\n'.format(s)
-    xml_body += '                    <geom type="sphere" pos="0 0 {}" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1"/>\n'.format(s, s*0.06)
-    xml_body += '                    <geom type="capsule" fromto="0 0 {} 0 0 {}" size="{}" rgba="0.8 0.5 0.2 1" mass="0.01"/>\n'.format(s*0.45, s, th_struct)
+    xml_body += '                    <geom type="sphere" pos="0 0 {}" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1" {}/>\n'.format(s, s*0.06, d_payload)
+    xml_body += '                    <geom type="capsule" fromto="0 0 {} 0 0 {}" size="{}" rgba="0.8 0.5 0.2 1" mass="0.01" {}/>\n'.format(s*0.45, s, th_struct, d_payload)
     xml_body += '                    <site name="node_5" pos="0 0 {}"/>\n'.format(-s)
-    xml_body += '                    <geom type="sphere" pos="0 0 {}" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1"/>\n'.format(-s, s*0.06)
-    xml_body += '                    <geom type="capsule" fromto="0 0 {} 0 0 {}" size="{}" rgba="0.8 0.5 0.2 1" mass="0.01"/>\n'.format(-s*0.45, -s, th_struct)
+    xml_body += '                    <geom type="sphere" pos="0 0 {}" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1" {}/>\n'.format(-s, s*0.06, d_payload)
+    xml_body += '                    <geom type="capsule" fromto="0 0 {} 0 0 {}" size="{}" rgba="0.8 0.5 0.2 1" mass="0.01" {}/>\n'.format(-s*0.45, -s, th_struct, d_payload)
     
     xml_body += '                </body>\n' # End Inner
     xml_body += '            </body>\n' # End Middle
@@ -118,13 +114,17 @@ def generate_scene_gyro():
         xml_nodes += '    <body name="node_{}" pos="{} {} {}">\n'.format(idx, v[0], v[1], v[2] + z_offset)
         xml_nodes += '        <freejoint/>\n'
         xml_nodes += '        <site name="node_{}"/>\n'.format(idx)
-        xml_nodes += '        <geom type="sphere" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1" {}/>\n'.format(s*0.03, d_geom)
+        xml_nodes += '        <geom type="sphere" size="{}" rgba="0.2 0.8 0.2 1" mass="0.1" {}/>\n'.format(s*0.03, d_node_geom)
         xml_nodes += '    </body>\n'
 
     # --- 3. TENDONS, ACTUATORS, EQUALITY ---
     xml_tendon = ""
     xml_actuator = ""
     xml_equality = ""
+    xml_contact = ""
+
+    # Structurally connected body pairs (candidates for <exclude>)
+    connections = chain_connections(["gyro_root", "gyro_outer", "gyro_middle", "gyro_inner"], "gyro")
 
     # Gyro Actuators
     xml_actuator += '        <motor name="act_outer"  joint="motor_outer"  gear="1000" ctrllimited="true" ctrlrange="-1 1"/>\n'
@@ -150,11 +150,11 @@ def generate_scene_gyro():
                 # Piston Barrel (Floating, constrained by equality)
                 xml_nodes += f'    <body name="{p_name}_barrel" pos="{mid_x} {mid_y} {mid_z}" zaxis="{dx} {dy} {dz}">\n'
                 xml_nodes += '        <freejoint/>\n'
-                xml_nodes += f'        <geom type="capsule" fromto="0 0 {-h_len/2} 0 0 {h_len/2}" size="{th_struct*1.5}" rgba="0 1 0 1" mass="0.05" {d_geom}/>\n'
+                xml_nodes += f'        <geom type="capsule" fromto="0 0 {-h_len/2} 0 0 {h_len/2}" size="{th_struct*1.5}" rgba="0 1 0 1" mass="0.05" {d_piston_geom}/>\n'
                 xml_nodes += f'        <site name="{p_name}_anchor_a" pos="0 0 {-h_len/2}"/>\n'
                 xml_nodes += f'        <body name="{p_name}_rod" pos="0 0 0">\n'
                 xml_nodes += f'            <joint name="slide_{p_name}" type="slide" axis="0 0 1" limited="true" range="-0.15 0.15" {d_joint}/>\n'
-                xml_nodes += f'            <geom type="capsule" fromto="0 0 {-h_len/2} 0 0 {h_len/2}" size="{th_struct}" rgba="0.5 1 0.5 1" mass="0.05" {d_geom}/>\n'
+                xml_nodes += f'            <geom type="capsule" fromto="0 0 {-h_len/2} 0 0 {h_len/2}" size="{th_struct}" rgba="0.5 1 0.5 1" mass="0.05" {d_piston_geom}/>\n'
                 xml_nodes += f'            <site name="{p_name}_anchor_b" pos="0 0 {h_len/2}"/>\n'
                 xml_nodes += '        </body>\n'
                 xml_nodes += '    </body>\n'
@@ -163,6 +163,10 @@ def generate_scene_gyro():
                 xml_equality += f'        <weld name="weld_{p_name}_a" body1="{p_name}_barrel" body2="node_{6+i}"/>\n'
                 xml_equality += f'        <weld name="weld_{p_name}_b" body1="{p_name}_rod" body2="node_{6+j}"/>\n'
                 
+                connections.append((f"{p_name}_barrel", "pistons", f"{p_name}_rod", "pistons"))
+                connections.append((f"{p_name}_barrel", "pistons", f"node_{6+i}", "nodes"))
+                connections.append((f"{p_name}_rod", "pistons", f"node_{6+j}", "nodes"))
+
                 # Actuator
                 xml_actuator += f'        <position name="act_{p_name}" joint="slide_{p_name}" kp="5000" ctrllimited="true" ctrlrange="-0.15 0.15"/>\n'
                 count_muscle += 1
@@ -188,22 +192,30 @@ def generate_scene_gyro():
 
     # Robot Attachment Weld
     xml_equality += '        <weld name="attach_robot" body1="gyro_inner" body2="pelvis" relpose="0 0 0 1 0 0 0"/>\n'
+    connections.append(("gyro_inner", "gyro", "pelvis", "robot"))
+
+    # Contact Excludes
+    xml_contact += contact.exclude_xml(connections)
 
     # --- INJECTION ---
     final_xml = g1_content
+
+    # Policy stamp for the contact report (see contact_policy.py)
+    final_xml = re.sub(r"<mujoco\b[^>]*>", lambda m: f"{m.group(0)}\n  {contact.stamp()}", final_xml, count=1)
     
     # Assets (Floor Material)
     floor_asset = """
     <texture type="2d" name="groundplane" builtin="checker" mark="edge" rgb1="0.2 0.3 0.4" rgb2="0.1 0.2 0.3" markrgb="0.8 0.8 0.8" width="300" height="300"/>
     <material name="groundplane" texture="groundplane" texuniform="true" texrepeat="5 5" reflectance="0.2"/>
     """
+    floor_asset += rings.xml_asset
     if '</asset>' in final_xml:
         final_xml = final_xml.replace('</asset>', floor_asset + '\n  </asset>')
     else:
         final_xml = final_xml.replace('<worldbody>', f'<asset>{floor_asset}</asset>\n<worldbody>')
 
     # Worldbody: Floor + Gyro + Nodes
-    floor_xml = '<geom name="floor" size="0 0 0.05" type="plane" material="groundplane"/>'
+    floor_xml = f'<geom name="floor" size="0 0 0.05" type="plane" material="groundplane" {contact.geom_attrs("floor")}/>'
     final_xml = final_xml.replace('<worldbody>', f'<worldbody>\n    {floor_xml}\n    {xml_body}\n    {xml_nodes}')
     
     # Actuators
@@ -226,10 +238,24 @@ def generate_scene_gyro():
         else:
              final_xml = final_xml.replace('</mujoco>', f'<equality>{xml_equality}</equality>\n</mujoco>')
 
+    # Contacts
+    if xml_contact:
+        if '</contact>' in final_xml:
+             final_xml = final_xml.replace('</contact>', xml_contact + '\n  </contact>')
+        else:
+             final_xml = final_xml.replace('</mujoco>', f'<contact>{xml_contact}</contact>\n</mujoco>')
+
     with open(output_path, "w") as f:
         f.write(final_xml)
 
     print(f"Generated Merged Scene: {output_path}")
 
 if __name__ == "__main__":
-    generate_scene_gyro()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contact-policy", choices=tuple(CONTACT_POLICIES), default=DEFAULT_POLICY,
+                        help="legacy: everything collides, touch: structure touches robot/floor only, pruned: structure touches floor only")
+    parser.add_argument("--ring-lod", choices=RING_LOD, default="high",
+                        help="high: 32 capsules per ring, low: capsule proxy + visual mesh, headless: capsule proxy only")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    generate_scene_gyro(contact_policy=args.contact_policy, output_path=args.output, ring_lod=args.ring_lod)
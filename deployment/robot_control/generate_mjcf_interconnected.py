@@ -1,7 +1,10 @@
+import argparse
 import math
 import os
 
-def generate_scene_gyro():
+from ring_lod import RING_LOD, RingLOD
+
+def generate_scene_gyro(ring_lod="high"):
     # Paths
     g1_path = "public/mujoco/menagerie/unitree_g1/g1.xml"
     output_path = "public/mujoco/menagerie/unitree_g1/scene_gyro_interconnected.xml"
@@ -34,26 +37,11 @@ def generate_scene_gyro():
     th_struct = s * 0.015
     xml_body = ""
     
+    # Ring geometry per LOD level (see ring_lod.py)
+    rings = RingLOD(ring_lod)
+
     def get_ring_geoms(radius, color, axis='z', phase=0):
-        g = ""
-        seg = 16
-        gap = 0.2
-        for start in [gap, math.pi + gap]:
-            for i in range(seg):
-                a1 = start + i * (math.pi - 2*gap)/seg + phase
-                a2 = start + (i+1) * (math.pi - 2*gap)/seg + phase
-                c1, s1 = math.cos(a1), math.sin(a1)
-                c2, s2 = math.cos(a2), math.sin(a2)
-                
-                if axis == 'z': p1, p2 = (radius*c1, radius*s1, 0), (radius*c2, radius*s2, 0)
-                elif axis == 'y': p1, p2 = (radius*c1, 0, radius*s1), (radius*c2, 0, radius*s2)
-                elif axis == 'x': p1, p2 = (0, radius*c1, radius*s1), (0, radius*c2, radius*s2)
-                else: p1, p2 = (radius*c1, radius*s1, 0), (radius*c2, radius*s2, 0)
-                    
-                g += '        <geom type="capsule" fromto="{:.4f} {:.4f} {:.4f} {:.4f} {:.4f} {:.4f}" size="{}" rgba="{}" mass="1.0" {}/>\n'.format(
-                    p1[0], p1[1], p1[2], p2[0], p2[1], p2[2], th_struct, color, d_geom
-                )
-        return g
+        return rings.geoms(radius, color, th_struct, axis=axis, phase=phase, seg=16, gap=0.2, mass=1.0, geom_attrs=d_geom)
 
     # ROOT BODY
     xml_body += '    <body name="gyro_root" pos="0 0 {}">\n'.format(z_offset)
@@ -251,6 +239,7 @@ def generate_scene_gyro():
     <texture type="2d" name="groundplane" builtin="checker" mark="edge" rgb1="0.2 0.3 0.4" rgb2="0.1 0.2 0.3" markrgb="0.8 0.8 0.8" width="300" height="300"/>
     <material name="groundplane" texture="groundplane" texuniform="true" texrepeat="5 5" reflectance="0.2"/>
     """
+    floor_asset += rings.xml_asset
     if '</asset>' in final_xml:
         final_xml = final_xml.replace('</asset>', floor_asset + '\n  </asset>')
     else:
@@ -286,4 +275,8 @@ def generate_scene_gyro():
     print(f"Generated Merged Scene: {output_path}")
 
 if __name__ == "__main__":
-    generate_scene_gyro()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ring-lod", choices=RING_LOD, default="high",
+                        help="high: 32 capsules per ring, low: capsule proxy + visual mesh, headless: capsule proxy only")
+    args = parser.parse_args()
+    generate_scene_gyro(ring_lod=args.ring_lod)
@@ -1,7 +1,10 @@
+import argparse
 import math
 import os
 
-def generate_scene_clean():
+from piston_templates import PISTON_FIDELITY, fill_node_children, node_children_marker, piston_xml, spring_xml
+
+def generate_scene_clean(piston_fidelity="full"):
     # Paths
     g1_path = "public/mujoco/menagerie/unitree_g1/g1.xml"
     output_path = "public/mujoco/menagerie/unitree_g1/scene_octacube.xml"
@@ -41,74 +44,22 @@ def generate_scene_clean():
     xml_actuator = ""
     xml_tendon = ""
     xml_contact = ""
+    node_children = {} # node_idx -> XML placed inside the node body (reduced/tendon pistons)
 
     # Helper: Add Piston (Linear Actuator)
+    # Geometry/fidelity variants live in piston_templates.py
     def add_piston(n1_idx, n2_idx, p1, p2, name_suffix, color):
-        nonlocal xml_nodes, xml_equality, xml_actuator
+        nonlocal xml_nodes, xml_equality, xml_actuator, xml_tendon
         p_name = f"piston_{name_suffix}"
-        mid_x, mid_y, mid_z = (p1[0]+p2[0])/2, (p1[1]+p2[1])/2, (p1[2]+p2[2])/2 + z_offset
-        dx, dy, dz = p2[0]-p1[0], p2[1]-p1[1], p2[2]-p1[2]
-        dist = math.sqrt(dx**2 + dy**2 + dz**2)
-        h_len = dist * 0.6
-        
-        # Double Acting Piston Dimensions
-        # Barrel: Central, length 40% of dist. (-0.2 to 0.2)
-        # Rods: Extend from barrel to nodes.
-        # At Neutral (q=0):
-        #   Rod A visual: -0.1 (inside) to -0.5 (anchor).
-        #   Rod B visual:  0.1 (inside) to  0.5 (anchor).
-        
-        barrel_half = dist * 0.2
-        barrel_inner_reach = dist * 0.1 # Visual start of rod inside barrel
-        node_reach = dist * 0.5
-        
-        # Per-Rod Ranges
-        # Compression: Rod can retract into barrel.
-        #   Max Retract: until anchor hits barrel end (-0.2)? Or deeper.
-        #   Let's allow retracting until anchor is at -0.25 (dist/4).
-        #   Current Anchor (-0.5) -> Target (-0.25) implies q = -0.25.
-        limit_comp = -dist * 0.25
-        
-        # Extension: Rod can extend out.
-        #   Max Extend: until overlap lost.
-        #   Current Inner (-0.1) -> Target (-0.2) (Edge of barrel). q = 0.1.
-        limit_ext = dist * 0.1
-        
-        # Piston Barrel (Central Housing - Dark Grey)
-        xml_nodes += f'    <body name="{p_name}_barrel" pos="{mid_x} {mid_y} {mid_z}" zaxis="{dx} {dy} {dz}" gravcomp="1">\n'
-        xml_nodes += '        <freejoint/>\n'
-        xml_nodes += f'        <geom type="cylinder" fromto="0 0 {-barrel_half} 0 0 {barrel_half}" size="{th_struct*2.0}" rgba="0.2 0.2 0.2 1" mass="1.0" {d_geom}/>\n'
-        # No anchor on barrel, it floats between rods.
-        
-        # Rod A (Left/Bottom - Negative Z)
-        xml_nodes += f'        <body name="{p_name}_rod_a" pos="0 0 0" gravcomp="1">\n'
-        # Axis -1 means positive q moves towards negative Z (Extension away from center)
-        xml_nodes += f'            <joint name="slide_{p_name}_a" type="slide" axis="0 0 -1" limited="true" range="{limit_comp} {limit_ext}" {d_joint}/>\n'
-        xml_nodes += f'            <geom type="cylinder" fromto="0 0 {-barrel_inner_reach} 0 0 {-node_reach}" size="{th_struct}" rgba="0.9 0.9 1.0 1" mass="0.5" {d_geom}/>\n'
-        xml_nodes += f'            <site name="{p_name}_anchor_a" pos="0 0 {-node_reach}"/>\n'
-        xml_nodes += '        </body>\n'
-
-        # Rod B (Right/Top - Positive Z)
-        xml_nodes += f'        <body name="{p_name}_rod_b" pos="0 0 0" gravcomp="1">\n'
-        # Axis +1 means positive q moves towards positive Z (Extension away from center)
-        xml_nodes += f'            <joint name="slide_{p_name}_b" type="slide" axis="0 0 1" limited="true" range="{limit_comp} {limit_ext}" {d_joint}/>\n'
-        xml_nodes += f'            <geom type="cylinder" fromto="0 0 {barrel_inner_reach} 0 0 {node_reach}" size="{th_struct}" rgba="0.9 0.9 1.0 1" mass="0.5" {d_geom}/>\n'
-        xml_nodes += f'            <site name="{p_name}_anchor_b" pos="0 0 {node_reach}"/>\n'
-        xml_nodes += '        </body>\n'
-
-        xml_nodes += '    </body>\n'
-        
-        # Weld Constraints to Nodes (Rod A -> N1, Rod B -> N2)
-        xml_equality += f'        <weld name="weld_{p_name}_a" body1="{p_name}_rod_a" body2="node_{n1_idx}"/>\n'
-        xml_equality += f'        <weld name="weld_{p_name}_b" body1="{p_name}_rod_b" body2="node_{n2_idx}"/>\n'
-        
-        # Symmetry Constraint (Keep Barrel Centered)
-        # Forces slide_a == slide_b, eliminating the floating DOF of the barrel.
-        xml_equality += f'        <joint name="eq_{p_name}" joint1="slide_{p_name}_a" joint2="slide_{p_name}_b" polycoef="0 1 0 0 0"/>\n'
-        
-        # Actuators (Dual - though now coupled, redundant but keeps control authority)
-        xml_actuator += f'        <position name="act_{p_name}_a" joint="slide_{p_name}_a" kp="1000" ctrllimited="true" ctrlrange="{limit_comp} {limit_ext}"/>\n'
-        xml_actuator += f'        <position name="act_{p_name}_b" joint="slide_{p_name}_b" kp="1000" ctrllimited="true" ctrlrange="{limit_comp} {limit_ext}"/>\n'
+        frag = piston_xml(p_name, n1_idx, n2_idx, p1, p2, z_offset, th_struct, d_joint, d_geom,
+                          rod_color="0.9 0.9 1.0 1", kp=1000, dual_actuators=True, center_site=False,
+                          fidelity=piston_fidelity)
+        xml_nodes += frag["body"]
+        for idx, children in frag["node_children"].items():
+            node_children[idx] = node_children.get(idx, "") + children
+        xml_equality += frag["equality"]
+        xml_actuator += frag["actuator"]
+        xml_tendon += frag["tendon"]
 
     # --- 1. OCTAHEDRON NODES (0-5) ---
     print(f"Generating Octahedron Nodes: {len(axis_verts)}")
@@ -117,6 +68,7 @@ def generate_scene_clean():
         xml_nodes += '        <freejoint/>\n' # Re-enabled (Kinematic)
         xml_nodes += '        <site name="node_{}"/>\n'.format(i)
         xml_nodes += '        <geom type="sphere" size="{}" rgba="0.8 0.5 0.2 1" mass="5.0" {}/>\n'.format(s*0.04, d_geom) # Mass 5.0
+        xml_nodes += node_children_marker(i)
         xml_nodes += '    </body>\n'
 
     # --- 2. CUBE NODES (6-13) ---
@@ -133,6 +85,7 @@ def generate_scene_clean():
         xml_nodes += '        <freejoint/>\n' # Re-enabled (Kinematic)
         xml_nodes += '        <site name="node_{}"/>\n'.format(idx)
         xml_nodes += '        <geom type="sphere" size="{}" rgba="0.2 0.8 0.2 1" mass="5.0" {}/>\n'.format(s*0.03, d_geom)
+        xml_nodes += node_children_marker(idx)
         xml_nodes += '    </body>\n'
 
     # --- 3. ACTUATORS (PISTONS) ---
@@ -174,14 +127,14 @@ def generate_scene_clean():
             dist = math.sqrt(sum((axis_verts[i][k]-cube_coords[j][k])**2 for k in range(3)))
             if abs(dist - rd_edge_len) < rd_tol:
                 t_name = f"spring_{count_spring}"
-                xml_tendon += f'        <spatial name="{t_name}" stiffness="100" damping="10" width="0.01" rgba="1 0.4 0.2 1">\n'
-                xml_tendon += f'            <site site="node_{i}"/>\n'
-                xml_tendon += f'            <site site="node_{6+j}"/>\n'
-                xml_tendon += '        </spatial>\n'
+                xml_tendon += spring_xml(t_name, f"node_{i}", f"node_{6+j}")
                 count_spring += 1
 
 
 
+    # Place piston parts that live inside node bodies
+    xml_nodes = fill_node_children(xml_nodes, node_children)
+
     # --- 5. ROBOT ATTACHMENT ---
     # Create a static center anchor for the robot
     xml_nodes += '    <body name="center_anchor" pos="0 0 {}">\n'.format(z_offset)
@@ -242,4 +195,8 @@ def generate_scene_clean():
     print(f"Generated Merged Scene: {output_path}")
 
 if __name__ == "__main__":
-    generate_scene_clean()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--piston-fidelity", choices=PISTON_FIDELITY, default="full",
+                        help="full: freejoint barrel + 2 rods, reduced: single slide chain, tendon: length actuated tendon")
+    args = parser.parse_args()
+    generate_scene_clean(piston_fidelity=args.piston_fidelity)
@@ -0,0 +1,168 @@
+import argparse
+import os
+import sys
+from collections import deque
+
+import mujoco
+import numpy as np
+
+# Divergence Detection and Rollback (main_puppet.py)
+# The stiff puppet (kp 10000 pistons, stiffness 500 tendons, many welds) can blow up.
+# After every physics batch the state is checked for:
+#   - new bad qpos / qvel / qacc / ctrl warnings (data.warning counters)
+#   - MuJoCo's own auto-reset (time jumping back)
+#   - non-finite qpos / qvel
+#   - a kinetic energy spike: more than --energy-spike times its running average (at
+#     least ENERGY_FLOOR), not checked for COMMAND_GRACE after the targets change so a
+#     legitimate command is never taken for a blow-up
+# Healthy states go into a small ring of mj_getState snapshots (every --health-interval
+# of sim time). On divergence the state is restored from the ring before anything is
+# broadcast, and the piston targets that changed since that snapshot are damped back
+# towards the snapshot's values. Repeated failures go further back in the ring and
+# finally clamp the targets to the snapshot's values.
+#
+#   --health-snapshots 20   (HEALTH_SNAPSHOTS)     ring length, 0 disables
+#   --health-interval 0.1   (HEALTH_INTERVAL)      sim seconds between snapshots
+#   --energy-spike 100      (HEALTH_ENERGY_SPIKE)  0 disables the energy check
+#
+#   {"type": "health"} -> {"type": "health", "rollbacks", "snapshots", "events": [...]}
+
+DEFAULT_SNAPSHOTS = 20
+DEFAULT_INTERVAL = 0.1
+DEFAULT_ENERGY_SPIKE = 100.0
+ENERGY_FLOOR = 1.0 # J, the running average never counts as lower than this (robot at rest)
+COMMAND_GRACE = 1.0 # Sim seconds after a target change without the energy spike check
+ENERGY_SMOOTHING = 0.05 # Running average weight per check
+DAMPING = 0.5 # Fraction of the change since the snapshot kept per rollback
+CLAMP_AFTER = 3 # Consecutive rollbacks after which the snapshot's targets are restored exactly
+RECOVERED_AFTER = 1.0 # Sim seconds without failure before the escalation starts over
+BAD_WARNINGS = (mujoco.mjtWarning.mjWARN_BADQPOS, mujoco.mjtWarning.mjWARN_BADQVEL,
+                mujoco.mjtWarning.mjWARN_BADQACC, mujoco.mjtWarning.mjWARN_BADCTRL)
+MAX_EVENTS = 50
+
+def health_options(argv=None):
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--health-snapshots", type=int, default=int(os.environ.get("HEALTH_SNAPSHOTS", DEFAULT_SNAPSHOTS)))
+    parser.add_argument("--health-interval", type=float, default=float(os.environ.get("HEALTH_INTERVAL", DEFAULT_INTERVAL)))
+    parser.add_argument("--energy-spike", type=float, default=float(os.environ.get("HEALTH_ENERGY_SPIKE", DEFAULT_ENERGY_SPIKE)))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return {"snapshots": args.health_snapshots, "interval": args.health_interval, "energy_spike": args.energy_spike}
+
+class HealthMonitor:
+    def __init__(self, model, snapshots=DEFAULT_SNAPSHOTS, interval=DEFAULT_INTERVAL, energy_spike=DEFAULT_ENERGY_SPIKE):
+        self.model = model
+        self.interval = interval
+        self.energy_spike = energy_spike
+        if energy_spike > 0:
+            # data.energy is only filled in with the energy flag (computed inside mj_step)
+            model.opt.enableflags |= int(mujoco.mjtEnableBit.mjENBL_ENERGY)
+        self.spec = mujoco.mjtState.mjSTATE_INTEGRATION
+        self.state_size = mujoco.mj_stateSize(model, self.spec)
+        self.ring = deque(maxlen=max(1, snapshots)) # (time, state, targets)
+        self.next_snapshot = None
+        self.last_time = None
+        self.warnings = 0
+        self.energy = None # Running average of the kinetic energy
+        self.targets = None # Targets seen at the last check
+        self.grace_until = None # Sim time until which the spike check is skipped
+        self.failures = 0 # Consecutive rollbacks
+        self.last_failure = None
+        self.rollbacks = 0
+        self.events = deque(maxlen=MAX_EVENTS)
+
+    def resync(self, data):
+        # Time moved back on purpose (lockstep reset, keyframe): start a new ring
+        self.ring.clear()
+        self.next_snapshot = None
+        self.last_time = None
+        self.warnings = self._warning_count(data)
+        self.energy = None
+        self.grace_until = None
+        self.failures = 0
+
+    def _warning_count(self, data):
+        return sum(int(data.warning[w].number) for w in BAD_WARNINGS)
+
+    def check(self, data, targets=None):
+        # -> reason string on divergence, None when healthy
+        warnings = self._warning_count(data)
+        new_warnings, self.warnings = warnings - self.warnings, warnings
+        if new_warnings > 0:
+            bad = [w.name[len("mjWARN_"):] for w in BAD_WARNINGS if data.warning[w].number]
+            return f"warning {'/'.join(bad)}"
+        if self.last_time is not None and data.time < self.last_time:
+            return "auto reset"
+        if not (np.isfinite(data.qpos).all() and np.isfinite(data.qvel).all()):
+            return "non-finite state"
+        if self.energy_spike > 0:
+            kinetic = float(data.energy[1])
+            if not np.isfinite(kinetic):
+                return "non-finite energy"
+            if targets is not None and list(targets) != self.targets:
+                self.targets = list(targets)
+                self.grace_until = data.time + COMMAND_GRACE
+            commanded = self.grace_until is not None and data.time < self.grace_until
+            if self.energy is not None and not commanded and kinetic > self.energy_spike * max(self.energy, ENERGY_FLOOR):
+                return f"energy spike {kinetic:.3g} J (average {self.energy:.3g} J)"
+            self.energy = kinetic if self.energy is None else self.energy + ENERGY_SMOOTHING * (kinetic - self.energy)
+        return None
+
+    def record(self, data, targets):
+        if self.next_snapshot is not None and data.time < self.next_snapshot:
+            return
+        state = np.empty(self.state_size)
+        mujoco.mj_getState(self.model, data, state, self.spec)
+        self.ring.append((data.time, state, list(targets)))
+        self.next_snapshot = data.time + self.interval
+
+    def rollback(self, data, targets, reason):
+        # After MuJoCo's auto reset data.time no longer says when it failed
+        failed_at = data.time if self.last_time is None or data.time >= self.last_time else self.last_time
+        if not self.ring:
+            # Nothing healthy recorded yet, start over from the model defaults
+            mujoco.mj_resetData(self.model, data)
+            restored, good = None, None
+        else:
+            # Each consecutive failure goes one snapshot further back
+            k = min(self.failures, len(self.ring) - 1)
+            restored, state, good = self.ring[-1 - k]
+            for _ in range(k):
+                self.ring.pop() # Newer snapshots led to the failure
+            mujoco.mj_setState(self.model, data, state, self.spec)
+            damping = 0.0 if self.failures + 1 >= CLAMP_AFTER else DAMPING
+            for i, v in enumerate(good[:len(targets)]):
+                targets[i] = v + (targets[i] - v) * damping
+        mujoco.mj_forward(self.model, data)
+
+        self.failures += 1
+        self.rollbacks += 1
+        self.last_failure = data.time
+        self.warnings = self._warning_count(data)
+        self.last_time = data.time
+        self.next_snapshot = data.time + self.interval
+        self.energy = None
+        event = {"reason": reason, "failed_at": failed_at, "restored": restored, "failures": self.failures}
+        self.events.append(event)
+        return event
+
+    def update(self, data, targets):
+        # Call after every physics batch, before broadcasting. -> rollback event or None
+        reason = self.check(data, targets)
+        if reason is not None:
+            return self.rollback(data, targets, reason)
+        if self.failures and data.time - self.last_failure > RECOVERED_AFTER:
+            self.failures = 0
+        self.last_time = data.time
+        self.record(data, targets)
+        return None
+
+    def info(self):
+        return {
+            "type": "health",
+            "rollbacks": self.rollbacks,
+            "failures": self.failures,
+            "snapshots": len(self.ring),
+            "interval": self.interval,
+            "energy": self.energy,
+            "events": list(self.events),
+        }
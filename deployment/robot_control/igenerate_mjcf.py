@@ -1,6 +1,11 @@
+import argparse
 import math
+import os
 
-def generate_rd_xml(filename="rd_structure.xml"):
+from contact_policy import CONTACT_POLICIES, DEFAULT_POLICY, ContactPolicy, chain_connections, robot_bodies
+from ring_lod import RING_LOD, RingLOD
+
+def generate_rd_xml(filename="rd_structure.xml", contact_policy=DEFAULT_POLICY, ring_lod="high", robot_xml=None):
     # Vertices of Rhombic Dodecahedron
     # 6 "Axis" vertices (Octahedron tips)
     # 8 "Corner" vertices (Cube corners)
@@ -12,7 +17,17 @@ def generate_rd_xml(filename="rd_structure.xml"):
     # Defaults
     th_struct = 0.02 # Structure thickness
 
-    xml_header = """<mujocoinclude>
+    # Contacts: contype/conaffinity per structure group (see contact_policy.py)
+    # This is an include, the floor comes from the including scene and shares bit 0
+    # with the robot, so keeping the structure off the robot takes excludes against
+    # the robot bodies (read from g1.xml next to the output by default).
+    contact = ContactPolicy(contact_policy, shared_groups=("robot", "floor"))
+    print(f"Contact Policy: {contact_policy}")
+    if robot_xml is None:
+        robot_xml = os.path.join(os.path.dirname(filename), "g1.xml")
+
+    xml_header = f"""<mujocoinclude>
+    {contact.stamp()}
 """
 
     # --- 1. GYROSCOPE ASSEMBLY (ROOT) ---
@@ -20,36 +35,11 @@ def generate_rd_xml(filename="rd_structure.xml"):
     xml_body = ""
     
     # Helper for Ring Geoms
+    # Smoother (32 segments), small gap for joints. LOD variants in ring_lod.py
+    rings = RingLOD(ring_lod)
+
     def get_ring_geoms(radius, color, axis='z', phase=0):
-        g = ""
-        seg = 32 # Smoother
-        gap = 0.1 # Small gap for joints
-        # Two Arcs
-        for start in [gap, math.pi + gap]:
-            for i in range(seg):
-                a1 = start + i * (math.pi - 2*gap)/seg + phase
-                a2 = start + (i+1) * (math.pi - 2*gap)/seg + phase
-                
-                c1, s1 = math.cos(a1), math.sin(a1)
-                c2, s2 = math.cos(a2), math.sin(a2)
-                
-                if axis == 'z':
-                    p1 = (radius*c1, radius*s1, 0)
-                    p2 = (radius*c2, radius*s2, 0)
-                elif axis == 'y':
-                    p1 = (radius*c1, 0, radius*s1)
-                    p2 = (radius*c2, 0, radius*s2)
-                elif axis == 'x':
-                    p1 = (0, radius*c1, radius*s1)
-                    p2 = (0, radius*c2, radius*s2)
-                else:
-                    p1 = (radius*c1, radius*s1, 0)
-                    p2 = (radius*c2, radius*s2, 0)
-                    
-                g += '        <geom type="capsule" fromto="{:.4f} {:.4f} {:.4f} {:.4f} {:.4f} {:.4f}" size="{}" rgba="{}" mass="0.1"/>\n'.format(
-                    p1[0], p1[1], p1[2], p2[0], p2[1], p2[2], th_struct, color
-                )
-        return g
+        return rings.geoms(radius, color, th_struct, axis=axis, phase=phase, seg=32, gap=0.1, mass=0.1, geom_attrs=contact.geom_attrs("gyro"))
 
     # --- 1. GYROSCOPE (Central Structure) ---
     # ROOT BODY: Floating Base for the Gyroscope
@@ -141,13 +131,13 @@ def generate_rd_xml(filename="rd_structure.xml"):
     # Render Nodes
     for i, v in enumerate(all_nodes):
         xml_body += '                    <body name="node_{}" pos="{} {} {}">\n'.format(i, v[0], v[1], v[2])
-        xml_body += '                        <geom type="sphere" size="{}" rgba="0.2 0.8 0.2 1" mass="0.01"/>\n'.format(s*0.04)
+        xml_body += '                        <geom type="sphere" size="{}" rgba="0.2 0.8 0.2 1" mass="0.01" {}/>\n'.format(s*0.04, contact.geom_attrs("nodes"))
         xml_body += '                    </body>\n'
 
     # Render Edges (Attached to Inner Ring frame)
     for index, (start, end) in enumerate(edges):
-        xml_body += '                    <geom name="strut_{}" type="capsule" size="{}" fromto="{} {} {} {} {} {}" rgba="0.2 0.6 1 1" mass="0.01"/>\n'.format(
-            index, s*0.015, start[0], start[1], start[2], end[0], end[1], end[2]
+        xml_body += '                    <geom name="strut_{}" type="capsule" size="{}" fromto="{} {} {} {} {} {}" rgba="0.2 0.6 1 1" mass="0.01" {}/>\n'.format(
+            index, s*0.015, start[0], start[1], start[2], end[0], end[1], end[2], contact.geom_attrs("pistons")
         )
 
     xml_body += '                </body>\n' # End Inner
@@ -164,13 +154,35 @@ def generate_rd_xml(filename="rd_structure.xml"):
     xml_actuator += '        <motor name="act_inner"  joint="motor_inner"  gear="200" ctrllimited="true" ctrlrange="-1 1"/>\n'
     xml_actuator += '    </actuator>\n'
 
+    # --- CONTACT EXCLUDES ---
+    # Nodes/struts are welded into gyro_inner and filtered by MuJoCo already,
+    # only the ring chain needs explicit pairs (when the policy lets rings touch).
+    # Plus structure <-> robot pairs when the policy keeps them apart (bit 0 is shared).
+    xml_contact = ""
+    gyro_bodies = ["gyro_root", "gyro_outer", "gyro_middle", "gyro_inner"]
+    structure = [(b, "gyro") for b in gyro_bodies] + [(f"node_{i}", "nodes") for i in range(len(all_nodes))]
+    separate = contact.separate_pairs(structure, robot_bodies(robot_xml) if contact.conflicts() else None)
+    xml_exclude = contact.exclude_xml(chain_connections(gyro_bodies, "gyro"), separate)
+    if xml_exclude:
+        xml_contact = '    <contact>\n' + xml_exclude + '    </contact>\n'
+
+    # --- RING MESH ASSETS (low LOD) ---
+    xml_asset = ""
+    if rings.xml_asset:
+        xml_asset = '    <asset>\n' + rings.xml_asset + '    </asset>\n'
+
     xml_footer = """</mujocoinclude>
 """
     
     with open(filename, "w") as f:
-        f.write(xml_header + xml_body + xml_actuator + xml_footer)
+        f.write(xml_header + xml_asset + xml_body + xml_actuator + xml_contact + xml_footer)
     
     print(f"Generated {filename} with Pilot, Gyro, Tensegrity, and Actuators.")
 
 if __name__ == "__main__":
-    generate_rd_xml("public/mujoco/menagerie/unitree_g1/rd_structure.xml")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contact-policy", choices=tuple(CONTACT_POLICIES), default=DEFAULT_POLICY)
+    parser.add_argument("--ring-lod", choices=RING_LOD, default="high")
+    parser.add_argument("--robot-xml", default=None, help="robot bodies for structure/robot excludes (default: g1.xml next to the output)")
+    args = parser.parse_args()
+    generate_rd_xml("public/mujoco/menagerie/unitree_g1/rd_structure.xml", contact_policy=args.contact_policy, ring_lod=args.ring_lod, robot_xml=args.robot_xml)
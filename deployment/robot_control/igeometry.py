@@ -1,5 +1,6 @@
 import numpy as np
-import struct
+
+from mesh_io import write_stl
 
 def get_rhombic_dodecahedron_verts():
     # Radius/Scale
@@ -25,7 +26,24 @@ def get_rhombic_dodecahedron_verts():
     verts = np.array(points_axis + points_corners) * (r * 2.0) # Scale it
     return verts
 
-def generate_stl(filename="rhrombic_dodecahedron.stl"):
+# Hull of get_rhombic_dodecahedron_verts(): 12 rhombi (2 axis tips + 2 cube corners),
+# each split along the short (corner-corner) diagonal, wound outward.
+# Fixed topology, so no scipy ConvexHull at runtime.
+RHOMBIC_DODECAHEDRON_FACES = [
+    [13, 9, 0], [9, 13, 2], [0, 7, 11], [3, 11, 7], [0, 11, 13], [4, 13, 11],
+    [9, 7, 0], [7, 9, 5], [1, 8, 12], [2, 12, 8], [10, 6, 1], [6, 10, 3],
+    [12, 10, 1], [10, 12, 4], [1, 6, 8], [5, 8, 6], [13, 12, 2], [12, 13, 4],
+    [2, 8, 9], [5, 9, 8], [3, 10, 11], [4, 11, 10], [7, 6, 3], [6, 7, 5],
+]
+
+def rhombic_dodecahedron_faces():
+    # 24 triangles (12 rhombi) as indices into get_rhombic_dodecahedron_verts()
+    return np.array(RHOMBIC_DODECAHEDRON_FACES)
+
+# Generated hull output. rhrombic_dodecahedron.stl is the checked-in CAD model, never overwrite it.
+HULL_STL = "rhombic_dodecahedron_hull.stl"
+
+def generate_stl(filename=HULL_STL):
     # Vertices
     # Axis indices: 0:+Z, 1:-Z, 2:+Y, 3:-Y, 4:+X, 5:-X
     # Corners: 6..13
@@ -56,31 +74,10 @@ def generate_stl(filename="rhrombic_dodecahedron.stl"):
     # Face 1 (Top-Front-Right?): 
     # Center of face is typically ... 
     
-    # Convex Hull is safest and easiest for "Data".
-    from scipy.spatial import ConvexHull
-    
+    # Hardcoded hull (RHOMBIC_DODECAHEDRON_FACES), normals are computed in write_stl.
     verts = get_rhombic_dodecahedron_verts()
-    hull = ConvexHull(verts)
-    
-    # Write STL
-    with open(filename, 'wb') as f:
-        # Header (80 bytes)
-        f.write(b'\0' * 80)
-        # Number of triangles (4 bytes uint32)
-        # hull.simplices is (N, 3) array of indices
-        n_triangles = len(hull.simplices)
-        f.write(struct.pack('<I', n_triangles))
-        
-        for sim in hull.simplices:
-            # Normal (dummy)
-            f.write(struct.pack('<3f', 0.0, 0.0, 0.0))
-            # Vertices
-            for v_idx in sim:
-                v = verts[v_idx]
-                f.write(struct.pack('<3f', v[0], v[1], v[2]))
-            # Attribute byte count
-            f.write(struct.pack('<H', 0))
+    write_stl(filename, verts, rhombic_dodecahedron_faces())
 
 if __name__ == "__main__":
-    generate_stl("rhrombic_dodecahedron.stl")
-    print("Generated rhrombic_dodecahedron.stl")
+    generate_stl(HULL_STL)
+    print(f"Generated {HULL_STL}")
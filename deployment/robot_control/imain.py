@@ -8,6 +8,9 @@ import websockets
 import json
 import numpy as np
 
+from mocap_nodes import MocapNodes
+from interest import InterestManager
+
 # Path to the model
 # 1. Docker Path
 DOCKER_PATH = "/app/mujoco/menagerie/unitree_g1/scene.xml"
@@ -19,36 +22,67 @@ MODEL_PATH = DOCKER_PATH if os.path.exists(DOCKER_PATH) else os.path.abspath(LOC
 # Global set of connected clients
 connected_clients = set()
 
+# Simulation handles shared with the websocket handler (set in run_simulation)
+sim_data = None
+mocap_nodes = None
+
+# Per-client change-threshold streaming (set in run_simulation, see interest.py)
+interest = None
+
 async def broadcast_state(model, data):
     if not connected_clients:
         return
         
     # Serialize state
-    # Extract Tensegrity Node Positions
-    tensegrity_state = {}
-    # We can optimize this by caching indices, but loop over nbody (small) is fine for now
-    for i in range(model.nbody):
-        name = mujoco.mj_id2name(model, mujoco.mjtObj.mjOBJ_BODY, i)
-        if name and name.startswith("node_"):
-            tensegrity_state[name] = data.xpos[i].tolist()
-
-    message = json.dumps({
-        "time": data.time,
-        "qpos": data.qpos.tolist(),
-        "tensegrity": tensegrity_state
-    })
+    # Full frame (time, qpos, node positions) is built once for all plain clients,
+    # clients that enabled interest management get their own delta frame
+    full_message = None
+    sends = []
+    for client in connected_clients:
+        if interest.subscribed(client):
+            sends.append(client.send(json.dumps(interest.message(client, data))))
+        else:
+            if full_message is None:
+                full_message = json.dumps(interest.full_state(data))
+            sends.append(client.send(full_message))
     
     # Broadcast to all
     # Websockets handles the loop
-    await asyncio.gather(*[client.send(message) for client in connected_clients])
+    # A client that disconnects mid-send must not stop the loop (handler removes it)
+    await asyncio.gather(*sends, return_exceptions=True)
 
 async def handler(websocket):
     print("Client connected!")
     connected_clients.add(websocket)
     try:
-        await websocket.wait_closed()
+        async for message in websocket:
+            try:
+                msg = json.loads(message)
+                if msg.get("type") == "node_pose":
+                    # Drive kinematic (mocap) frame nodes directly
+                    if mocap_nodes is not None and sim_data is not None:
+                        try:
+                            mocap_nodes.handle_message(sim_data, msg)
+                        except (ValueError, TypeError) as e:
+                            await websocket.send(json.dumps({"type": "error", "message": str(e)}))
+                elif msg.get("type") == "interest":
+                    # Only send entities that moved (see interest.py)
+                    if interest is not None:
+                        try:
+                            reply = interest.subscribe(websocket, msg)
+                        except (ValueError, TypeError) as e:
+                            reply = {"type": "error", "message": str(e)}
+                        await websocket.send(json.dumps(reply))
+            except json.JSONDecodeError:
+                pass
+            except Exception as e:
+                print(f"Error handling message: {e}")
+    except websockets.exceptions.ConnectionClosed:
+        pass
     finally:
         connected_clients.remove(websocket)
+        if interest is not None:
+            interest.unsubscribe(websocket)
         print("Client disconnected.")
 
 async def run_simulation(model, data):
@@ -69,6 +103,17 @@ async def run_simulation(model, data):
     if dt == 0: dt = 0.002
     
     steps = 0
+
+    # Kinematic Frame Nodes (scene generated with --node-mode mocap)
+    global sim_data, mocap_nodes, interest
+    sim_data = data
+    mocap_nodes = MocapNodes(model)
+    if len(mocap_nodes) > 0:
+        print(f"Found {len(mocap_nodes)} mocap nodes, pose control via 'node_pose' messages.")
+
+    # Interest Management (clients opt in with an 'interest' message)
+    interest = InterestManager(model)
+    print(f"Streamable entities: {interest.counts()}")
     
     while True:
         frame_start = time.time()
@@ -93,6 +138,8 @@ async def run_simulation(model, data):
         # Log occasionally
         if steps % 500 == 0:
             print(f"SimTime: {data.time:.2f}s | Connections: {len(connected_clients)}")
+            if interest.clients:
+                print(f"  Interest: {len(interest.clients)} delta clients, {100 * interest.savings():.0f}% of entity updates skipped")
 
         # Timing (simple sleep)
         elapsed = time.time() - frame_start
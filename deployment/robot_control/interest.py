@@ -0,0 +1,123 @@
+import mujoco
+import numpy as np
+
+# Interest Management for the state stream (imain.py)
+# A mostly static tensegrity does not need its node positions resent every frame.
+# Each subscribed client has a copy of the poses it last received; an entity is only
+# sent again once it moved more than its channel's epsilon away from that copy (so slow
+# drift still arrives), and every `refresh` frames the client gets everything.
+#
+# Channels (by body name, generate_*.py conventions):
+#   node   - node_*                       position             -> "tensegrity": {name: [x, y, z]}
+#   piston - piston_* / edge_*            position + rotation  -> "pistons": {name: [x, y, z, qw, qx, qy, qz]}
+#   link   - every other body (robot)     position + rotation  -> "links": {...same}
+#
+# Opt in (clients that never do keep receiving the full frame as before):
+#   {"type": "interest", "enable": true, "channels": ["node", "link"],
+#    "epsilon": {"node": 0.002}, "rot_epsilon": {"link": 0.02}, "refresh": 120}
+#   -> {"type": "interest", "enabled": true, "channels": [...], "entities": {...}, "refresh": 120}
+# Frames then carry "full": true/false. Delta frames only hold the entities that moved
+# and merge into the client's copy; full frames also carry qpos.
+
+CHANNEL_KEYS = {"node": "tensegrity", "piston": "pistons", "link": "links"}
+DEFAULT_CHANNELS = ("node",)
+DEFAULT_EPSILON = {"node": 1e-3, "piston": 1e-3, "link": 1e-3} # meters
+DEFAULT_ROT_EPSILON = {"node": None, "piston": 0.01, "link": 0.01} # radians, None = position only
+DEFAULT_REFRESH = 120 # frames, ~2 s at 60 Hz
+
+def classify_body(name):
+    if name.startswith("node_"):
+        return "node"
+    if name.startswith("piston_") or name.startswith("edge_"):
+        return "piston"
+    return "link"
+
+class InterestManager:
+    def __init__(self, model):
+        self.ids = {ch: [] for ch in CHANNEL_KEYS}
+        self.names = {ch: [] for ch in CHANNEL_KEYS}
+        for b in range(1, model.nbody): # Skip world
+            name = mujoco.mj_id2name(model, mujoco.mjtObj.mjOBJ_BODY, b) or f"body_{b}"
+            channel = classify_body(name)
+            self.ids[channel].append(b)
+            self.names[channel].append(name)
+        self.ids = {ch: np.asarray(ids, dtype=int) for ch, ids in self.ids.items()}
+        self.clients = {}
+        self.sent = 0 # Entities sent to subscribed clients
+        self.total = 0 # Entities a full frame would have held
+
+    def counts(self):
+        return {ch: len(ids) for ch, ids in self.ids.items()}
+
+    def subscribed(self, client):
+        return client in self.clients
+
+    def subscribe(self, client, msg):
+        if not msg.get("enable", True):
+            self.unsubscribe(client)
+            return {"type": "interest", "enabled": False}
+        channels = list(msg.get("channels") or DEFAULT_CHANNELS)
+        for ch in channels:
+            if ch not in CHANNEL_KEYS:
+                raise ValueError(f"Unknown channel '{ch}', expected one of {tuple(CHANNEL_KEYS)}")
+        epsilon = {**DEFAULT_EPSILON, **(msg.get("epsilon") or {})}
+        rot_epsilon = {**DEFAULT_ROT_EPSILON, **(msg.get("rot_epsilon") or {})}
+        refresh = max(1, int(msg.get("refresh", DEFAULT_REFRESH)))
+
+        self.clients[client] = {
+            "channels": {ch: {"eps": float(epsilon[ch]),
+                              "rot_eps": None if rot_epsilon[ch] is None else float(rot_epsilon[ch]),
+                              "pos": None, "quat": None} for ch in channels},
+            "refresh": refresh,
+            "frame": refresh, # First frame is full
+        }
+        return {"type": "interest", "enabled": True, "channels": channels, "refresh": refresh,
+                "entities": {ch: len(self.ids[ch]) for ch in channels}}
+
+    def unsubscribe(self, client):
+        self.clients.pop(client, None)
+
+    def full_state(self, data):
+        # The frame non-subscribed clients get (unchanged format)
+        nodes = self.ids["node"]
+        return {
+            "time": data.time,
+            "qpos": data.qpos.tolist(),
+            "tensegrity": dict(zip(self.names["node"], data.xpos[nodes].tolist())),
+        }
+
+    def message(self, client, data):
+        sub = self.clients[client]
+        full = sub["frame"] >= sub["refresh"]
+        sub["frame"] = 0 if full else sub["frame"] + 1
+        msg = {"time": data.time, "full": full}
+        if full:
+            msg["qpos"] = data.qpos.tolist()
+
+        for ch, state in sub["channels"].items():
+            ids = self.ids[ch]
+            pos = data.xpos[ids]
+            quat = data.xquat[ids]
+            if full or state["pos"] is None:
+                idx = np.arange(len(ids))
+                state["pos"], state["quat"] = pos.copy(), quat.copy()
+            else:
+                moved = np.sum((pos - state["pos"]) ** 2, axis=1) > state["eps"] ** 2
+                if state["rot_eps"] is not None:
+                    # Rotation angle between last sent and current orientation
+                    dot = np.abs(np.sum(quat * state["quat"], axis=1))
+                    moved |= dot < np.cos(state["rot_eps"] / 2)
+                idx = np.nonzero(moved)[0]
+                state["pos"][idx] = pos[idx]
+                state["quat"][idx] = quat[idx]
+
+            names = self.names[ch]
+            values = pos[idx] if ch == "node" else np.hstack([pos[idx], quat[idx]])
+            msg[CHANNEL_KEYS[ch]] = {names[i]: v for i, v in zip(idx.tolist(), values.tolist())}
+            self.sent += len(idx)
+            self.total += len(ids)
+        return msg
+
+    def savings(self):
+        # Fraction of entity updates skipped so far
+        return 1.0 - self.sent / self.total if self.total else 0.0
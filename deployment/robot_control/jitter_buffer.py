@@ -0,0 +1,111 @@
+import argparse
+import bisect
+import os
+import sys
+from collections import deque
+
+# Control Jitter Buffer (main_puppet.py)
+# Untimed piston_move messages take effect at whatever step runs next, so network
+# jitter becomes control jitter. Timed messages are queued per piston instead and
+# played out on the sim clock: every physics step applies the value due at that step,
+# linearly interpolated between the samples around it.
+#
+#   {"type": "piston_move", "index": 3, "value": 0.4, "t": 1712.250}     sender clock (s)
+#   {"type": "piston_move", "values": [...], "t": 1712.250}              all pistons at once
+#   {"type": "piston_move", "index": 3, "value": 0.4, "sim_time": 12.5}  explicit target sim time
+#
+# Sender timestamps are mapped to sim time per client with the smallest observed
+# (arrival sim time - t) over the last OFFSET_WINDOW messages (the least delayed
+# packet), plus a playout delay that absorbs jitter: --jitter-delay 0.05 (JITTER_DELAY).
+# The mapping assumes the realtime run mode; at other rates send "sim_time".
+
+DEFAULT_DELAY = 0.05
+OFFSET_WINDOW = 64
+MAX_SAMPLES = 256 # Per piston
+
+def jitter_delay_option(argv=None):
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--jitter-delay", type=float, default=float(os.environ.get("JITTER_DELAY", DEFAULT_DELAY)))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return args.jitter_delay
+
+class JitterBuffer:
+    def __init__(self, n, delay=DEFAULT_DELAY):
+        self.queues = [[] for _ in range(n)] # Sorted (sim_time, value) per piston
+        self.delay = delay
+        self.offsets = {} # client -> deque of (arrival sim time - sender t)
+        self.last_time = 0.0
+        self.stats = {"queued": 0, "late": 0, "overflow": 0}
+
+    @property
+    def active(self):
+        return any(self.queues)
+
+    def target_time(self, client, t, sim_time):
+        # Sender timestamp -> sim time at which the sample should take effect
+        window = self.offsets.get(client)
+        if window is None:
+            window = self.offsets[client] = deque(maxlen=OFFSET_WINDOW)
+        window.append(sim_time - t)
+        return t + min(window) + self.delay
+
+    def push(self, index, value, when, sim_time):
+        q = self.queues[index]
+        if len(q) >= MAX_SAMPLES:
+            q.pop(0)
+            self.stats["overflow"] += 1
+        if when < sim_time:
+            self.stats["late"] += 1
+        bisect.insort(q, (when, max(0.0, min(1.0, float(value)))))
+        self.stats["queued"] += 1
+
+    def handle_message(self, client, msg, sim_time):
+        # Queue a timed piston_move; returns False for untimed messages (apply directly)
+        if msg.get("sim_time") is not None:
+            when = float(msg["sim_time"])
+        elif msg.get("t") is not None:
+            when = self.target_time(client, float(msg["t"]), sim_time)
+        else:
+            return False
+        values = msg.get("values")
+        if values is not None:
+            for i, v in enumerate(values[:len(self.queues)]):
+                if v is not None:
+                    self.push(i, v, when, sim_time)
+        elif msg.get("index") is not None and msg.get("value") is not None:
+            idx = int(msg["index"])
+            if 0 <= idx < len(self.queues):
+                self.push(idx, msg["value"], when, sim_time)
+        return True
+
+    def sample(self, sim_time, targets):
+        # Call before each physics step: writes the values due at sim_time into targets
+        if sim_time < self.last_time:
+            self.clear() # State was reset, queued times no longer mean anything
+        self.last_time = sim_time
+        for i, q in enumerate(self.queues):
+            if not q:
+                continue
+            # Keep only the last sample at or before sim_time and everything after it
+            k = bisect.bisect_right(q, (sim_time, float("inf"))) - 1
+            if k > 0:
+                del q[:k]
+            t0, v0 = q[0]
+            if sim_time < t0:
+                continue # Nothing due yet, hold the current target
+            if len(q) == 1:
+                targets[i] = v0
+                q.clear()
+            else:
+                t1, v1 = q[1]
+                targets[i] = v0 + (v1 - v0) * (sim_time - t0) / (t1 - t0) if t1 > t0 else v1
+
+    def clear(self):
+        for q in self.queues:
+            q.clear()
+
+    def forget(self, client):
+        self.offsets.pop(client, None)
+
+    def info(self):
+        return {"delay": self.delay, "pending": sum(len(q) for q in self.queues), **self.stats}
@@ -0,0 +1,89 @@
+import time
+from collections import deque
+
+import numpy as np
+
+# Control -> State Latency (main_puppet.py)
+# A piston_move with a "seq" is timestamped through the pipeline:
+#   receive (handler) -> apply (start of the next physics batch) -> step (batch done)
+#   -> send (state frame written to the client)
+# The first state frame sent to that client after the step carries "ack": <seq>, so
+# the client can measure the full round trip itself (see test_control.py).
+#
+#   {"type": "piston_move", "index": 3, "value": 0.4, "seq": 17}
+#   -> state frame {..., "ack": 17}
+#   {"type": "latency"} -> {"type": "latency", "stages": {"queue": {"p50", "p90", "p99", "max", "count"}, ...},
+#                           "histogram": {"edges_ms": [...], "<stage>": [counts]}}
+#
+# Stages (ms): queue = receive -> apply, physics = apply -> step, send = step -> send,
+# total = receive -> send.
+
+STAGES = ("queue", "physics", "send", "total")
+HISTOGRAM_EDGES_MS = np.concatenate([[0.0], np.logspace(-2, 4, 61)]) # 10 us .. 10 s, 10 bins per decade
+RECENT = 4096 # Samples per stage kept for exact percentiles
+
+class LatencyTracker:
+    def __init__(self):
+        self.pending = {} # client -> [(seq, t_recv)] not applied yet
+        self.in_flight = {} # client -> [(seq, t_recv, t_apply, t_step)]
+        self._t_apply = None
+        self.recent = {s: deque(maxlen=RECENT) for s in STAGES}
+        self.counts = {s: np.zeros(len(HISTOGRAM_EDGES_MS), dtype=np.int64) for s in STAGES}
+
+    def received(self, client, seq):
+        self.pending.setdefault(client, []).append((seq, time.perf_counter()))
+
+    def applied(self):
+        # Right before the physics batch that uses the new targets
+        self._t_apply = time.perf_counter() if self.pending else None
+
+    def stepped(self):
+        if self._t_apply is None:
+            return
+        t_step = time.perf_counter()
+        for client, entries in self.pending.items():
+            self.in_flight.setdefault(client, []).extend((seq, t_recv, self._t_apply, t_step) for seq, t_recv in entries)
+        self.pending.clear()
+        self._t_apply = None
+
+    def acks(self):
+        # client -> newest seq reflected in the frame about to be sent
+        return {client: entries[-1][0] for client, entries in self.in_flight.items() if entries}
+
+    def sent(self, clients):
+        t_send = time.perf_counter()
+        for client in clients:
+            for _, t_recv, t_apply, t_step in self.in_flight.pop(client, []):
+                self._add("queue", t_apply - t_recv)
+                self._add("physics", t_step - t_apply)
+                self._add("send", t_send - t_step)
+                self._add("total", t_send - t_recv)
+
+    def _add(self, stage, seconds):
+        ms = seconds * 1e3
+        self.recent[stage].append(ms)
+        self.counts[stage][np.searchsorted(HISTOGRAM_EDGES_MS, ms, side="right") - 1] += 1
+
+    def forget(self, client):
+        self.pending.pop(client, None)
+        self.in_flight.pop(client, None)
+
+    def percentiles(self, stage):
+        values = np.asarray(self.recent[stage])
+        if not len(values):
+            return {"count": 0}
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        return {"count": int(self.counts[stage].sum()), "p50": p50, "p90": p90, "p99": p99, "max": float(values.max())}
+
+    def report(self):
+        return {
+            "type": "latency",
+            "stages": {s: self.percentiles(s) for s in STAGES},
+            "histogram": {"edges_ms": HISTOGRAM_EDGES_MS.tolist(), **{s: self.counts[s].tolist() for s in STAGES}},
+        }
+
+    def summary(self):
+        p = self.percentiles("total")
+        if not p["count"]:
+            return "no samples"
+        return f"{p['count']} controls, total p50 {p['p50']:.1f} / p99 {p['p99']:.1f} ms"
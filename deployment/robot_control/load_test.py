@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+import websockets
+
+from compression import decode_state
+
+# Load Generator for the WebSocket servers (main_puppet.py :8766, imain.py :8765)
+# Opens many concurrent connections and reports how the server holds up:
+#   viewers      - only receive state frames (optionally with the binary codec)
+#   controllers  - send a message mix at --control-hz and receive state frames
+#   probe        - one extra viewer that tracks sim time against wall time, giving the
+#                  server's real-time factor while the others connect and load it
+#
+# Measures: frames received per second, sim-time gaps in the frame stream (frames the
+# server skipped or coalesced), control messages never acknowledged, control -> state
+# round trip (piston_move "seq" -> frame "ack", main_puppet only, see latency.py),
+# frame inter-arrival jitter and the realtime factor over time.
+#
+# Usage (from repo root, server already running):
+#   python deployment/robot_control/load_test.py --viewers 500 --controllers 50 --duration 30
+#   python deployment/robot_control/load_test.py --uri ws://127.0.0.1:8765 --viewers 200 --mix piston=0
+#   --mix piston=0.7,values=0.2,history=0.1   relative weights of the controller messages
+
+MIX_TYPES = ("piston", "values", "history")
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in MIX_TYPES:
+            raise argparse.ArgumentTypeError(f"Unknown message type '{name}', expected one of {MIX_TYPES}")
+        weights[name] = float(weight or 1.0)
+    if sum(weights.values()) <= 0:
+        weights = {}
+    return weights
+
+class Stats:
+    def __init__(self):
+        self.open = 0
+        self.connect_failures = 0
+        self.dropped = 0 # Connections closed by the server or the network
+        self.frames = 0
+        self.bytes = 0
+        self.gaps = 0
+        self.sent = 0 # Sequenced controls (piston / values), each expects an ack
+        self.acked = 0
+        self.queries = 0 # History requests
+        self.replies = 0
+        self.rtts = []
+        self.interarrival = []
+        self.rtf = [] # (wall, realtime factor) from the probe
+        self.window_frames = 0
+        self.window_rtts = []
+
+def raise_fd_limit():
+    # POSIX only, the servers (and this tool) also run on Windows
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+async def connect(args):
+    return await websockets.connect(args.uri, compression=None if args.no_deflate else "deflate",
+                                    max_size=None, open_timeout=30)
+
+def frame_time(message):
+    # -> (sim time, ack or None), None for replies that are not state frames,
+    #    "history" for history replies
+    state = decode_state(message)
+    if state.get("type") == "history":
+        return "history"
+    if "time" not in state or "type" in state:
+        return None
+    ack = state.get("ack")
+    if ack is not None:
+        ack = int(np.ravel(ack)[0]) # Binary codecs send it as a 1 element array
+    return float(state["time"]), ack
+
+async def receive_frames(ws, stats, expected_dt, on_ack=None, on_frame=None):
+    last_time = None
+    last_arrival = None
+    async for message in ws:
+        now = time.perf_counter()
+        parsed = frame_time(message)
+        if parsed == "history":
+            stats.replies += 1
+            continue
+        if parsed is None:
+            continue
+        sim_time, ack = parsed
+        stats.frames += 1
+        stats.window_frames += 1
+        stats.bytes += len(message)
+        # Time jumping back is MuJoCo resetting the state, not a gap
+        if last_time is not None and expected_dt[0] and sim_time - last_time > 1.5 * expected_dt[0]:
+            stats.gaps += 1
+        if last_arrival is not None and len(stats.interarrival) < 1_000_000:
+            stats.interarrival.append((now - last_arrival) * 1e3)
+        last_time, last_arrival = sim_time, now
+        if ack is not None and on_ack is not None:
+            on_ack(ack, now)
+        if on_frame is not None:
+            on_frame(sim_time, now)
+
+async def viewer(args, stats, expected_dt, stop):
+    try:
+        ws = await connect(args)
+    except Exception:
+        stats.connect_failures += 1
+        return
+    stats.open += 1
+    try:
+        if args.codec != "json":
+            await ws.send(json.dumps({"type": "hello", "codec": args.codec}))
+        receiver = asyncio.ensure_future(receive_frames(ws, stats, expected_dt))
+        stopped = asyncio.ensure_future(stop.wait())
+        await asyncio.wait([receiver, stopped], return_when=asyncio.FIRST_COMPLETED)
+        if receiver.done():
+            stats.dropped += 1
+        receiver.cancel()
+        stopped.cancel()
+    finally:
+        stats.open -= 1
+        await ws.close()
+
+async def controller(args, stats, expected_dt, stop, rng):
+    try:
+        ws = await connect(args)
+    except Exception:
+        stats.connect_failures += 1
+        return
+    stats.open += 1
+    sent_at = {}
+
+    def on_ack(ack, now):
+        for seq in [s for s in sent_at if s <= ack]:
+            rtt = (now - sent_at.pop(seq)) * 1e3
+            stats.acked += 1
+            stats.rtts.append(rtt)
+            stats.window_rtts.append(rtt)
+
+    receiver = asyncio.ensure_future(receive_frames(ws, stats, expected_dt, on_ack=on_ack))
+    kinds = list(args.mix)
+    weights = [args.mix[k] for k in kinds]
+    seq = 0
+    try:
+        await asyncio.sleep(rng.random() / args.control_hz) # Spread the senders
+        while not stop.is_set() and not receiver.done():
+            kind = rng.choices(kinds, weights)[0] if kinds else None
+            if kind == "piston":
+                seq += 1
+                sent_at[seq] = time.perf_counter()
+                msg = {"type": "piston_move", "index": rng.randrange(12), "value": rng.random(), "seq": seq}
+            elif kind == "values":
+                seq += 1
+                sent_at[seq] = time.perf_counter()
+                msg = {"type": "piston_move", "values": [rng.random() for _ in range(12)], "seq": seq}
+            elif kind == "history":
+                msg = {"type": "history", "channels": ["qpos"], "last": 10.0, "points": 200}
+            else:
+                msg = None
+            if msg is not None:
+                await ws.send(json.dumps(msg))
+                if "seq" in msg:
+                    stats.sent += 1
+                else:
+                    stats.queries += 1
+            await asyncio.sleep(1.0 / args.control_hz)
+        if receiver.done() and not stop.is_set():
+            stats.dropped += 1
+    except websockets.exceptions.ConnectionClosed:
+        stats.dropped += 1
+    finally:
+        receiver.cancel()
+        stats.open -= 1
+        await ws.close()
+
+async def probe(args, stats, expected_dt, stop):
+    # Realtime factor from sim time vs wall time, and the broadcast interval for gap detection
+    ws = await connect(args)
+    samples = []
+
+    def on_frame(sim_time, now):
+        samples.append((now, sim_time))
+        if len(samples) >= 20 and not expected_dt[0]:
+            steps = np.diff([s for _, s in samples[-20:]])
+            if (steps > 0).sum() >= 10:
+                expected_dt[0] = float(np.median(steps[steps > 0]))
+
+    probe_stats = Stats()
+    receiver = asyncio.ensure_future(receive_frames(ws, probe_stats, expected_dt, on_frame=on_frame))
+    try:
+        while not stop.is_set():
+            await asyncio.sleep(1.0)
+            recent = np.array([s for s in samples if s[0] > time.perf_counter() - 1.0])
+            if len(recent) >= 2:
+                # Sim time advanced over the last second, resets (time jumping back) excluded
+                advanced = np.clip(np.diff(recent[:, 1]), 0.0, None).sum()
+                stats.rtf.append((recent[-1, 0], advanced / (recent[-1, 0] - recent[0, 0])))
+            del samples[:-200]
+    finally:
+        receiver.cancel()
+        await ws.close()
+
+async def reporter(stats, stop, start):
+    print(f"{'t':>5} {'open':>6} {'frames/s':>10} {'rtf':>6} {'rtt p99':>9}")
+    while not stop.is_set():
+        await asyncio.sleep(1.0)
+        rtf = stats.rtf[-1][1] if stats.rtf else float("nan")
+        p99 = np.percentile(stats.window_rtts, 99) if stats.window_rtts else float("nan")
+        print(f"{time.perf_counter() - start:5.0f} {stats.open:6d} {stats.window_frames:10d} {rtf:6.2f} {p99:8.1f}ms")
+        stats.window_frames = 0
+        stats.window_rtts = []
+
+async def run(args):
+    limit = raise_fd_limit()
+    total = args.viewers + args.controllers
+    if limit is not None and total + 16 > limit:
+        print(f"Warning: {total} connections requested but the file descriptor limit is {limit}")
+
+    stats = Stats()
+    stop = asyncio.Event()
+    expected_dt = [None] # Broadcast interval in sim time, measured by the probe
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+
+    tasks = [asyncio.ensure_future(probe(args, stats, expected_dt, stop)),
+             asyncio.ensure_future(reporter(stats, stop, start))]
+    # Ramp up connections over --ramp seconds
+    roles = ["viewer"] * args.viewers + ["controller"] * args.controllers
+    rng.shuffle(roles)
+    for role in roles:
+        if role == "viewer":
+            tasks.append(asyncio.ensure_future(viewer(args, stats, expected_dt, stop)))
+        else:
+            tasks.append(asyncio.ensure_future(controller(args, stats, expected_dt, stop, random.Random(rng.random()))))
+        if args.ramp > 0:
+            await asyncio.sleep(args.ramp / max(1, len(roles)))
+
+    await asyncio.sleep(max(0.0, args.duration - (time.perf_counter() - start)))
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n--- Load test: {args.viewers} viewers, {args.controllers} controllers, {elapsed:.1f} s ---")
+    print(f"Connections: {stats.connect_failures} failed to open, {stats.dropped} dropped")
+    print(f"Frames: {stats.frames} ({stats.frames / elapsed:.0f}/s, {stats.bytes / elapsed / 1e6:.2f} MB/s), "
+          f"{stats.gaps} sim-time gaps (broadcast dt {expected_dt[0] or float('nan'):.4f} s)")
+    if stats.interarrival:
+        p50, p99 = np.percentile(stats.interarrival, [50, 99])
+        print(f"Frame inter-arrival: p50 {p50:.1f} ms | p99 {p99:.1f} ms")
+    if stats.sent:
+        print(f"Controls: {stats.sent} sent, {stats.acked} acked, {stats.sent - stats.acked} without ack")
+    if stats.queries:
+        print(f"History: {stats.queries} requests, {stats.replies} replies")
+    if stats.rtts:
+        p50, p90, p99 = np.percentile(stats.rtts, [50, 90, 99])
+        print(f"Control -> state: p50 {p50:.1f} ms | p90 {p90:.1f} ms | p99 {p99:.1f} ms | max {max(stats.rtts):.1f} ms")
+    if stats.rtf:
+        rtf = np.array([r for _, r in stats.rtf])
+        print(f"Realtime factor: mean {rtf.mean():.2f}, min {rtf.min():.2f}, last {rtf[-1]:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent viewer/controller load against a simulation server.")
+    parser.add_argument("--uri", default="ws://127.0.0.1:8766")
+    parser.add_argument("--viewers", type=int, default=100)
+    parser.add_argument("--controllers", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which connections are opened")
+    parser.add_argument("--control-hz", type=float, default=20.0, help="Messages per second per controller")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("piston=1"),
+                        help="Controller message weights, e.g. piston=0.7,values=0.2,history=0.1")
+    parser.add_argument("--codec", choices=("json", "binary", "zlib"), default="json", help="State codec for viewers")
+    parser.add_argument("--no-deflate", action="store_true", help="Decline permessage-deflate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
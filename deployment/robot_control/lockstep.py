@@ -0,0 +1,119 @@
+import asyncio
+
+import mujoco
+import numpy as np
+
+# Lockstep Session (main_puppet.py)
+# One external controller (RL agent, MPC) owns the simulation: the free-running loop
+# pauses and physics only advances when the owner asks for it, so every observation
+# belongs to exactly the action that produced it.
+#
+# Messages (all replies echo "id" when given):
+#   {"type": "lockstep", "enable": true}    -> {"type": "lockstep", "enabled": true, "nu", "nq", "nv", "n_action"}
+#   {"type": "step", "action": [...], "nstep": N, "fields": ["qpos", ...]}
+#       action: normalized piston targets 0..1 (same as piston_move, one per mapped piston)
+#       ctrl:   optional raw ctrl vector (nu), applied after action
+#       -> {"type": "obs", "time", "steps", <fields>}
+#   {"type": "reset", "keyframe": 0}        -> {"type": "obs", ...}
+#   {"type": "lockstep", "enable": false}   (also released when the owner disconnects)
+#
+# mj_step runs on a worker thread so the event loop keeps serving other clients; code that
+# reads or writes the shared MjData from a handler holds `lock` meanwhile.
+
+MAX_NSTEP = 10000 # Bounds one request; it runs off the event loop but holds `lock` throughout
+DEFAULT_FIELDS = ("qpos", "qvel")
+OBS_FIELDS = ("qpos", "qvel", "act", "ctrl", "sensordata", "qacc", "actuator_force", "mocap_pos", "mocap_quat")
+
+class LockstepSession:
+    def __init__(self, model, data, targets, apply_targets):
+        # targets: list of normalized piston targets (shared with piston_move)
+        # apply_targets(): maps targets to data.ctrl
+        self.model = model
+        self.data = data
+        self.targets = targets
+        self.apply_targets = apply_targets
+        self.owner = None
+        self.steps = 0
+        self.lock = asyncio.Lock()
+
+    @property
+    def active(self):
+        return self.owner is not None
+
+    def acquire(self, ws):
+        if self.owner is not None and self.owner is not ws:
+            return False
+        self.owner = ws
+        return True
+
+    def release(self, ws):
+        if self.owner is ws:
+            self.owner = None
+            return True
+        return False
+
+    def observe(self, fields=None):
+        obs = {"type": "obs", "time": self.data.time, "steps": self.steps}
+        for f in fields or DEFAULT_FIELDS:
+            if f not in OBS_FIELDS:
+                raise ValueError(f"Unknown observation field '{f}', expected one of {OBS_FIELDS}")
+            obs[f] = getattr(self.data, f).tolist()
+        return obs
+
+    async def step(self, msg):
+        nstep = int(msg.get("nstep", 1))
+        if not 1 <= nstep <= MAX_NSTEP:
+            raise ValueError(f"nstep must be in [1, {MAX_NSTEP}], got {nstep}")
+
+        action = msg.get("action")
+        if action is not None:
+            if len(action) != len(self.targets):
+                raise ValueError(f"action has {len(action)} values, expected {len(self.targets)}")
+            self.targets[:] = np.clip(np.asarray(action, dtype=np.float64), 0.0, 1.0).tolist()
+        self.apply_targets()
+
+        ctrl = msg.get("ctrl")
+        if ctrl is not None:
+            if len(ctrl) != self.model.nu:
+                raise ValueError(f"ctrl has {len(ctrl)} values, expected {self.model.nu}")
+            self.data.ctrl[:] = ctrl
+
+        async with self.lock:
+            await asyncio.get_running_loop().run_in_executor(None, mujoco.mj_step, self.model, self.data, nstep)
+        self.steps += nstep
+        return self.observe(msg.get("fields"))
+
+    def reset(self, msg):
+        key = msg.get("keyframe")
+        if key is not None and 0 <= int(key) < self.model.nkey:
+            mujoco.mj_resetDataKeyframe(self.model, self.data, int(key))
+        else:
+            mujoco.mj_resetData(self.model, self.data)
+        mujoco.mj_forward(self.model, self.data)
+        self.steps = 0
+        return self.observe(msg.get("fields"))
+
+    def info(self):
+        return {"type": "lockstep", "enabled": self.active, "nu": self.model.nu, "nq": self.model.nq,
+                "nv": self.model.nv, "n_action": len(self.targets), "timestep": self.model.opt.timestep}
+
+    async def handle_message(self, ws, msg):
+        # Returns the reply dict for lockstep/step/reset messages
+        kind = msg.get("type")
+        if kind == "lockstep":
+            if msg.get("enable", True):
+                if not self.acquire(ws):
+                    raise ValueError("Lockstep session is owned by another client")
+            else:
+                self.release(ws)
+            reply = self.info()
+        elif self.owner is not ws:
+            raise ValueError("Send {\"type\": \"lockstep\", \"enable\": true} before step/reset")
+        elif kind == "step":
+            reply = await self.step(msg)
+        else:
+            async with self.lock:
+                reply = self.reset(msg)
+        if "id" in msg:
+            reply["id"] = msg["id"]
+        return reply
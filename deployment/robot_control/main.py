@@ -1,12 +1,27 @@
-import mujoco
-import mujoco.viewer
-import time
 import os
 import sys
 import asyncio
-import websockets
 import json
-import numpy as np
+
+# Started before the mujoco import so the report covers it (see startup.py).
+# mujoco.viewer and websockets are imported only when needed.
+from startup import StartupTimer, headless_requested, launch_viewer, load_model
+from offscreen_render import OffscreenRenderer, configure_gl, render_options, render_requested, stream_frames
+from pacing import Pacer, rate_options
+from compression import StateCodecs, compression_options, describe, serve_kwargs
+startup = StartupTimer()
+
+# Offscreen frame stream for thin clients (--render), GL backend must be picked before import
+if render_requested():
+    configure_gl()
+
+import mujoco
+
+# These import mujoco themselves, keep them after configure_gl()
+from state_history import StateHistory, history_options
+from sensor_slices import SensorIndex
+from multirate import HighRateRecorder
+startup.mark("import")
 
 # Path to the model
 MODEL_PATH = "public/mujoco/menagerie/unitree_g1/scene_puppet.xml"
@@ -14,46 +29,155 @@ MODEL_PATH = "public/mujoco/menagerie/unitree_g1/scene_puppet.xml"
 # Global set of connected clients
 connected_clients = set()
 
+# Clients receiving rendered frames (see offscreen_render.py)
+frame_subscribers = set()
+renderer = None
+
+# Run mode, set in run_simulation (see pacing.py)
+pacer = None
+
+# Recent state for late joiners and plots, set in run_simulation (see state_history.py)
+history = None
+
+# Per-client state codec (see compression.py)
+state_codecs = StateCodecs()
+
+# Sensor address ranges resolved at load (see sensor_slices.py)
+IMU_SENSORS = ["imu-torso-angular-velocity", "imu-torso-linear-acceleration"]
+sensor_index = None
+imu = None
+
+# Clients receiving the whole sensordata array with each state frame
+sensor_subscribers = set()
+
+# Per-step IMU / piston force samples, batched into state frames (see multirate.py)
+recorder = None
+batch_subscribers = set()
+
 async def broadcast_state(data):
     if not connected_clients:
         return
         
-    # Serialize state
-    message = json.dumps({
+    # Serialize state (once per codec in use, see compression.py)
+    # Gyro/Accel data from torso IMU, one slice of sensordata
+    gyro, accel = imu.split(imu.read(data)).values()
+    state = {
         "time": data.time,
-        "qpos": data.qpos.tolist(),
-        # Gyro/Accel data from torso IMU
-        "gyro": data.sensor('imu-torso-angular-velocity').data.tolist(),
-        "accel": data.sensor('imu-torso-linear-acceleration').data.tolist()
-    })
+        "qpos": data.qpos,
+        "gyro": gyro,
+        "accel": accel
+    }
+    # Optional parts (sensordata, per-step batches) per subscriber group
+    batch = recorder.drain() if batch_subscribers else None
+    groups = {}
+    for client in connected_clients:
+        groups.setdefault((client in sensor_subscribers, client in batch_subscribers), []).append(client)
+    messages = []
+    for (with_sensors, with_batch), clients in groups.items():
+        frame = dict(state)
+        if with_sensors:
+            frame["sensordata"] = data.sensordata
+        if with_batch:
+            frame.update(batch)
+        messages += state_codecs.messages(clients, frame)
     
     # Broadcast to all
     # Websockets handles the loop
-    await asyncio.gather(*[client.send(message) for client in connected_clients])
+    # A client that disconnects mid-send must not stop the loop (handler removes it)
+    await asyncio.gather(*[client.send(message) for client, message in messages], return_exceptions=True)
 
 async def handler(websocket):
     print("Client connected!")
     connected_clients.add(websocket)
     try:
-        await websocket.wait_closed()
+        async for message in websocket:
+            try:
+                msg = json.loads(message)
+                if msg.get("type") == "hello":
+                    try:
+                        reply = state_codecs.negotiate(websocket, msg)
+                    except ValueError as e:
+                        reply = {"type": "error", "message": str(e)}
+                    await websocket.send(json.dumps(reply))
+                elif msg.get("type") == "subscribe_frames":
+                    if renderer is None:
+                        await websocket.send(json.dumps({"type": "error", "message": "Server started without --render"}))
+                    else:
+                        await websocket.send(json.dumps(renderer.info()))
+                        frame_subscribers.add(websocket)
+                elif msg.get("type") == "unsubscribe_frames":
+                    frame_subscribers.discard(websocket)
+                elif msg.get("type") == "subscribe_sensors":
+                    if sensor_index is not None:
+                        await websocket.send(json.dumps(sensor_index.layout()))
+                        sensor_subscribers.add(websocket)
+                elif msg.get("type") == "unsubscribe_sensors":
+                    sensor_subscribers.discard(websocket)
+                elif msg.get("type") == "subscribe_batches":
+                    if recorder is not None:
+                        await websocket.send(json.dumps(recorder.layout()))
+                        if not batch_subscribers:
+                            recorder.clear()
+                        batch_subscribers.add(websocket)
+                elif msg.get("type") == "unsubscribe_batches":
+                    batch_subscribers.discard(websocket)
+                elif msg.get("type") == "history":
+                    if history is None:
+                        reply = {"type": "error", "id": msg.get("id"), "message": "Server started with --history-seconds 0"}
+                    else:
+                        try:
+                            reply = history.query(msg)
+                        except (ValueError, TypeError) as e:
+                            reply = {"type": "error", "id": msg.get("id"), "message": str(e)}
+                    await websocket.send(json.dumps(reply))
+                elif msg.get("type") == "set_rate":
+                    if pacer is not None:
+                        try:
+                            pacer.set_rate(msg.get("rate", "realtime"), msg.get("broadcast_hz"))
+                            reply = pacer.info()
+                        except (ValueError, TypeError) as e:
+                            reply = {"type": "error", "id": msg.get("id"), "message": str(e)}
+                        await websocket.send(json.dumps(reply))
+            except json.JSONDecodeError:
+                pass
+            except Exception as e:
+                print(f"Error handling message: {e}")
+    except Exception:
+        pass
     finally:
         connected_clients.remove(websocket)
+        frame_subscribers.discard(websocket)
+        sensor_subscribers.discard(websocket)
+        batch_subscribers.discard(websocket)
+        state_codecs.forget(websocket)
         print("Client disconnected.")
 
 async def run_simulation(model, data):
     print("Starting simulation loop with WebSocket server...")
     
-    # Check if we can launch viewer (local only)
-    viewer = None
-    try:
-        viewer = mujoco.viewer.launch_passive(model, data)
+    # Check if we can launch viewer (local only, skipped with --headless / no display)
+    viewer = launch_viewer(model, data, headless_requested())
+    if viewer is not None:
         # Enable Label ONLY for 'Selection' (The clicked object)
         viewer.opt.label = mujoco.mjtLabel.mjLABEL_SELECTION
         # Enable Sensor Visualization
         viewer.opt.flags[mujoco.mjtVisFlag.mjVIS_SENSOR] = 1
-        print("Native Viewer Launched.")
-    except Exception:
-        print("Running Headless (Viewer launch failed).")
+
+    # Sensor Slices (names resolved once, read as one slice per broadcast)
+    global sensor_index, imu, recorder
+    sensor_index = SensorIndex(model)
+    imu = sensor_index.select(IMU_SENSORS)
+    print(f"Sensors: {len(sensor_index)} ({model.nsensordata} values), IMU read as {'slice' if imu.contiguous else 'gather'}")
+
+    # High-rate channels, recorded every step only while someone subscribed
+    recorder = HighRateRecorder(model, imu)
+    print(f"High-rate channels: {recorder.layout()['channels']}")
+
+    # Offscreen Rendering (own thread, drops frames instead of slowing physics)
+    global renderer
+    if render_requested():
+        renderer = OffscreenRenderer(model, **render_options()).start()
+        asyncio.ensure_future(stream_frames(renderer, frame_subscribers))
 
     # Simulation Params
     dt = model.opt.timestep
@@ -61,34 +185,52 @@ async def run_simulation(model, data):
     
     steps = 0
     
+    # Run Mode (realtime / Nx / fast, see pacing.py)
+    global pacer
+    pacer = Pacer(dt, **rate_options())
+    print(f"Run Mode: {pacer.rate}, {pacer.batch} steps per broadcast")
+
+    # State History (fixed ring, queried with 'history' messages)
+    global history
+    options = history_options()
+    if options["seconds"] > 0:
+        history = StateHistory(model, **options)
+        print(f"State history: {history.capacity} samples ({options['seconds']:g} s at {options['hz']:g} Hz, {history.memory_bytes() / 1e6:.1f} MB)")
+
     while True:
-        frame_start = time.time()
-        
-        # Physics Step
+        # Physics Step (one broadcast period per mj_step call,
+        # step by step while high-rate channels are recorded)
+        n = pacer.batch
+        step = recorder.step if batch_subscribers else mujoco.mj_step
         if viewer is not None:
             with viewer.lock():
-                mujoco.mj_step(model, data)
+                step(model, data, n)
             viewer.sync()
         else:
-            mujoco.mj_step(model, data)
+            step(model, data, n)
         
-        steps += 1
+        steps += n
+        if not startup.reported:
+            startup.mark("first_step")
+            startup.report()
         
         # Broadcast State (Async)
-        # We broadcast every step or throttle? 
-        # 500Hz might be too fast for WS if network is slow. 
-        # Let's throttle to ~60Hz broadcast (every 8 steps roughly if dt=0.002)
-        if steps % 8 == 0:
-            await broadcast_state(data)
+        # Sim-time cadence: once per batch (~60Hz of sim time at dt=0.002)
+        if history is not None:
+            history.record(data)
+        await broadcast_state(data)
+
+        if renderer is not None and frame_subscribers:
+            renderer.submit(data)
             
         # Log occasionally
-        if steps % 500 == 0:
-            print(f"SimTime: {data.time:.2f}s | Connections: {len(connected_clients)}")
+        if steps // 500 != (steps - n) // 500:
+            print(f"SimTime: {data.time:.2f}s | Connections: {len(connected_clients)} | {pacer.rate} ({pacer.achieved(data.time):.1f}x)")
+            if renderer is not None and steps // 5000 != (steps - n) // 5000:
+                print(f"  Render: {renderer.stats()} | Subscribers: {len(frame_subscribers)}")
 
-        # Timing (simple sleep)
-        elapsed = time.time() - frame_start
-        if elapsed < dt:
-            await asyncio.sleep(dt - elapsed) # Async sleep to yield to WS
+        # Timing (sleep until wall clock matches sim time, yields to WS)
+        await pacer.wait(data.time)
 
 async def main_async():
     print("Initializing MuJoCo Native Simulation - Unitree G1...")
@@ -110,10 +252,18 @@ async def main_async():
 
     try:
         print(f"Loading model from {resolved_path}")
-        model = mujoco.MjModel.from_xml_path(resolved_path)
+        model, source = load_model(resolved_path)
         data = mujoco.MjData(model)
-        
-        async with websockets.serve(handler, "localhost", 8766):
+        startup.mark(f"compile ({source})")
+
+        # Compression (permessage-deflate settings, app codec level)
+        options = compression_options()
+        state_codecs.level = options.codec_level
+        print(f"Compression: {describe(options)}")
+
+        import websockets
+        async with websockets.serve(handler, "localhost", 8766, **serve_kwargs(options)):
+            startup.mark("socket_ready")
             print("WebSocket Server started on ws://localhost:8766")
             await run_simulation(model, data)
 
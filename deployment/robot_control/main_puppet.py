@@ -1,16 +1,43 @@
-import mujoco
-import mujoco.viewer
-import time
 import os
 import sys
+import argparse
 import asyncio
-import websockets
 import json
-import numpy as np
 import math
+import signal
+
+# Started before the mujoco import so the report covers it (see startup.py).
+# mujoco.viewer and websockets are imported only when needed.
+from startup import StartupTimer, headless_requested, launch_viewer, load_model
+startup = StartupTimer()
+
+import mujoco
+
+from mocap_nodes import MocapNodes
+from lockstep import LockstepSession
+from pacing import Pacer, rate_options
+from state_history import StateHistory, history_options
+from rollouts import RolloutPool
+from jitter_buffer import JitterBuffer, jitter_delay_option
+from shm_transport import ShmStatePublisher, shm_name_option
+from udp_transport import UdpControlServer, udp_port_option
+from compression import StateCodecs, compression_options, describe, serve_kwargs
+from latency import LatencyTracker
+from sandbox import SandboxPool, sandbox_options
+from health import HealthMonitor, health_options
+startup.mark("import")
 
 # Path to the model (Puppet Scene)
 MODEL_PATH = "public/mujoco/menagerie/unitree_g1/scene_puppet.xml"
+DEFAULT_PORT = 8766
+
+def server_options(argv=None):
+    # --port / --model (PUPPET_PORT / PUPPET_MODEL), gateway.py runs one instance per port
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PUPPET_PORT", DEFAULT_PORT)))
+    parser.add_argument("--model", default=os.environ.get("PUPPET_MODEL", MODEL_PATH))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return args
 
 # Global set of connected clients
 connected_clients = set()
@@ -19,47 +46,67 @@ async def broadcast_state(data):
     if not connected_clients:
         return
         
-    # Serialize state
-    message = json.dumps({
+    # Serialize state (once per codec in use, see compression.py)
+    state = {
         "time": data.time,
-        "qpos": data.qpos.tolist(),
-        # "qvel": data.qvel.tolist() 
-    })
+        "qpos": data.qpos,
+        # "qvel": data.qvel
+    }
+    # Kinematic frame nodes are not in qpos (see mocap_nodes.py)
+    streams_mocap = mocap_nodes is not None and len(mocap_nodes) > 0
+    if streams_mocap:
+        state.update(mocap_nodes.state(data))
+    
+    # Clients with sequenced controls in this frame get their own copy with "ack",
+    # clients in a private sandbox get that sandbox's state instead
+    acks = latency.acks()
+    sandboxed = sandboxes.frames(mocap=streams_mocap) if sandboxes is not None else {}
+    messages = state_codecs.messages([c for c in connected_clients if c not in acks and c not in sandboxed], state)
+    for client, seq in acks.items():
+        if client in connected_clients and client not in sandboxed:
+            messages += state_codecs.messages([client], dict(state, ack=seq))
+    for client, sandbox_state in sandboxed.items():
+        if client in connected_clients:
+            messages += state_codecs.messages([client], sandbox_state)
     
     # Broadcast to all
-    await asyncio.gather(*[client.send(message) for client in connected_clients])
+    # A client that disconnects mid-send must not stop the loop (handler removes it)
+    await asyncio.gather(*[client.send(message) for client, message in messages], return_exceptions=True)
+    latency.sent(acks)
+
+# Per-client state codec (see compression.py)
+state_codecs = StateCodecs()
+
+# Control -> state latency for piston_move messages with "seq" (see latency.py)
+latency = LatencyTracker()
 
 # Global Control State
 target_controls = []
 
-async def handler(websocket):
-    print("Client connected!")
-    connected_clients.add(websocket)
-    try:
-        async for message in websocket:
-            try:
-                msg = json.loads(message)
-                if msg.get("type") == "piston_move":
-                    idx = msg.get("index")
-                    val = msg.get("value")
-                    # Validate
-                    if idx is not None and val is not None:
-                        if 0 <= idx < len(target_controls):
-                            # Clamp value 0.0 to 1.0
-                            val = max(0.0, min(1.0, float(val)))
-                            target_controls[idx] = val
-                            # print(f"Set Piston {idx} to {val}") # Debug (spammy)
-            except json.JSONDecodeError:
-                pass
-            except Exception as e:
-                print(f"Error handling message: {e}")
-    except websockets.exceptions.ConnectionClosed:
-        pass
-    except Exception as e:
-        print(f"WebSocket Error: {e}")
-    finally:
-        connected_clients.remove(websocket)
-        print("Client disconnected.")
+# Simulation handles shared with the websocket handler (set in run_simulation)
+sim_data = None
+mocap_nodes = None
+
+# Run mode, set in run_simulation (see pacing.py)
+pacer = None
+
+# Recent state for late joiners and plots, set in run_simulation (see state_history.py)
+history = None
+
+# External controller session, set in run_simulation (see lockstep.py)
+lockstep = None
+
+# What-if rollout workers, set in run_simulation (see rollouts.py)
+rollouts = None
+
+# Timed piston_move samples played out on the sim clock, set in run_simulation (see jitter_buffer.py)
+jitter = None
+
+# Private per-client simulations forked from the master, set in run_simulation (see sandbox.py)
+sandboxes = None
+
+# Divergence checks and snapshot rollback, set in run_simulation (see health.py)
+health = None
 
 async def run_simulation(model, data):
     print("Starting Puppet Simulation loop with WebSocket server...")
@@ -69,14 +116,10 @@ async def run_simulation(model, data):
     print("  [C]: Breath Cube (Outer)")
     print("  [P]: Breath Connecting Pistons (Rhombic Edges)")
     
-    # Check if we can launch viewer (local only)
-    viewer = None
-    try:
-        viewer = mujoco.viewer.launch_passive(model, data)
+    # Check if we can launch viewer (local only, skipped with --headless / no display)
+    viewer = launch_viewer(model, data, headless_requested())
+    if viewer is not None:
         viewer.opt.label = mujoco.mjtLabel.mjLABEL_SELECTION
-        print("Native Viewer Launched.")
-    except Exception:
-        print("Running Headless (Viewer launch failed).")
 
     # Simulation Params
     dt = model.opt.timestep
@@ -174,9 +217,15 @@ async def run_simulation(model, data):
             print(f"  [ERROR] Could not find actuators for {name} (P:{p_act_id}, R:{r_act_id})")
 
     # Global State for Controls (referenced by websocket handler)
-    global target_controls
+    global target_controls, sim_data, mocap_nodes
     target_controls = [0.0] * len(control_map) # 0.0 to 1.0 range usually, or mapped to limits
 
+    # Kinematic Frame Nodes (scene generated with --node-mode mocap)
+    sim_data = data
+    mocap_nodes = MocapNodes(model)
+    if len(mocap_nodes) > 0:
+        print(f"Found {len(mocap_nodes)} mocap nodes, pose control via 'node_pose' messages.")
+
     # Helper: Map 0-1 input to Actuator Range
     def map_range(val, min_out, max_out):
         # Input assumed 0.0 to 1.0? Or -1 to 1?
@@ -199,17 +248,28 @@ async def run_simulation(model, data):
     # 10.0 scale from previous code.
     robot_scale = 10.0 
 
-    while True:
-        frame_start = time.time()
-        
-        # Process incoming messages (Handled by async handler modifying `target_controls`)
-        # Here we just apply `target_controls` to the physics
-        
+    # Run Mode (realtime / Nx / fast, see pacing.py)
+    global pacer
+    pacer = Pacer(dt, **rate_options())
+    print(f"Run Mode: {pacer.rate}, {pacer.batch} steps per broadcast")
+
+    # State History (fixed ring, queried with 'history' messages)
+    global history
+    options = history_options()
+    if options["seconds"] > 0:
+        history = StateHistory(model, **options)
+        print(f"State history: {history.capacity} samples ({options['seconds']:g} s at {options['hz']:g} Hz, {history.memory_bytes() / 1e6:.1f} MB)")
+
+    # Apply `target_controls` (set by piston_move / lockstep step) to the actuators.
+    # Rollout workers pass their own MjData and target vector.
+    def apply_controls(d=None, targets=None):
+        d = data if d is None else d
+        targets = target_controls if targets is None else targets
         for i, mapping in enumerate(control_map):
-            if i >= len(target_controls): break
+            if i >= len(targets): break
             
             # User Input (0.0 to 1.0)
-            u_val = target_controls[i]
+            u_val = targets[i]
             
             # Map to Piston Physics Range
             p_val = map_range(u_val, p_range_min, p_range_max)
@@ -222,47 +282,177 @@ async def run_simulation(model, data):
             r_val = (p_val - p_mid) * robot_scale
             
             # Apply to Piston Actuator
-            data.ctrl[mapping['piston_id']] = p_val
+            d.ctrl[mapping['piston_id']] = p_val
             
             # Apply to Robot Actuator
-            data.ctrl[mapping['robot_id']] = r_val
+            d.ctrl[mapping['robot_id']] = r_val
 
-        # Physics Step
-        if viewer is not None:
-            with viewer.lock():
-                mujoco.mj_step(model, data)
-            viewer.sync()
-        else:
-            mujoco.mj_step(model, data)
+    # Lockstep Session (external controller owns stepping, see lockstep.py)
+    global lockstep, rollouts
+    lockstep = LockstepSession(model, data, target_controls, apply_controls)
+
+    # What-if Rollouts on background workers (see rollouts.py)
+    rollouts = RolloutPool(model, apply_controls)
+    print(f"Rollout pool: {rollouts.workers} workers, {len(rollouts.node_names)} nodes tracked")
+
+    # Jitter Buffer for timestamped control streams
+    global jitter
+    jitter = JitterBuffer(len(control_map), jitter_delay_option())
+    print(f"Control jitter buffer: {jitter.delay * 1e3:.0f} ms playout delay")
+
+    # Private Sandboxes (preallocated MjData pool sharing the model)
+    global sandboxes
+    options = sandbox_options()
+    if options["size"] > 0:
+        sandboxes = SandboxPool(model, apply_controls, **options)
+        print(f"Sandbox pool: up to {options['size']} (allocated on demand), idle timeout {options['idle_timeout']:g} s")
+
+    # While timed samples are queued, step one by one and apply the value due at each step
+    def step_with_jitter(m, d, nstep):
+        for _ in range(nstep):
+            jitter.sample(d.time, target_controls)
+            apply_controls()
+            mujoco.mj_step(m, d)
+
+    # Divergence Detection (snapshot ring, rollback instead of broadcasting NaNs)
+    global health
+    options = health_options()
+    if options["snapshots"] > 0:
+        health = HealthMonitor(model, **options)
+        health.record(data, target_controls)
+        print(f"Health checks: {options['snapshots']} snapshots every {options['interval']:g} s, energy spike x{options['energy_spike']:g}")
+
+    # Shared-memory transport for local clients (--shm, see shm_transport.py)
+    shm = None
+    shm_name = shm_name_option()
+    if shm_name:
+        shm = ShmStatePublisher(shm_name, model, n_cmd=len(control_map))
+        print(f"Shared memory transport '{shm_name}': {len(shm.frames)} frame ring, {len(control_map)} command slots")
+
+    # The shm segment is closed and unlinked on any exit (error, Ctrl-C, SIGTERM cancel)
+    try:
+        # UDP datagrams for latency sensitive controllers (--udp, see udp_transport.py)
+        udp = None
+        udp_port = udp_port_option()
+        if udp_port:
+            udp = UdpControlServer(target_controls)
+            await asyncio.get_running_loop().create_datagram_endpoint(lambda: udp, local_addr=("127.0.0.1", udp_port))
+            print(f"UDP transport listening on udp://127.0.0.1:{udp_port}")
+
+        while True:
+            # Local clients write piston targets into shared command slots
+            if shm is not None:
+                for idx, val in shm.poll_commands():
+                    target_controls[idx] = max(0.0, min(1.0, val))
+
+            # Paused while an external controller runs a lockstep session
+            if lockstep.active:
+                await asyncio.sleep(0.01)
+                pacer.reset()
+                if health is not None:
+                    health.resync(data) # The owner may reset or rewind the state
+                continue
+
+            # Process incoming messages (Handled by async handler modifying `target_controls`)
+            # Here we just apply `target_controls` to the physics
+            apply_controls()
+
+            # Physics Step (one broadcast period per mj_step call, controls are held over the batch
+            # unless timed control samples are buffered)
+            n = pacer.batch
+            step = step_with_jitter if jitter.active else mujoco.mj_step
+            latency.applied()
+            if viewer is not None:
+                with viewer.lock():
+                    step(model, data, n)
+                viewer.sync()
+            else:
+                step(model, data, n)
+            latency.stepped()
+
+            # Divergence: roll back to a healthy snapshot before anything is published
+            if health is not None:
+                if viewer is not None:
+                    with viewer.lock():
+                        event = health.update(data, target_controls)
+                else:
+                    event = health.update(data, target_controls)
+                if event is not None:
+                    jitter.clear() # Queued samples may be what drove it unstable
+                    # First of a streak (and every 100th) so a scene that cannot recover does not flood the log
+                    if event["failures"] == 1 or event["failures"] % 100 == 0:
+                        restored = "model defaults" if event["restored"] is None else f"t={event['restored']:.3f}s"
+                        print(f"Divergence at t={event['failed_at']:.3f}s ({event['reason']}), rolled back to {restored} [{event['failures']} in a row]")
+
+            # Private sandboxes advance by the same batch; idle ones go back to the pool
+            if sandboxes is not None:
+                await sandboxes.step(n)
+                for client in sandboxes.evict_idle():
+                    print("Sandbox reclaimed after idle timeout.")
+                    asyncio.ensure_future(client.send(json.dumps({"type": "sandbox", "enabled": False, "reason": "idle"})))
         
-        steps += 1
+            steps += n
+            if not startup.reported:
+                startup.mark("first_step")
+                startup.report()
         
-        # Broadcast State (Async)
-        if steps % 8 == 0:
+            # Broadcast State (Async, sim-time cadence)
+            if shm is not None:
+                shm.publish(data)
+            if udp is not None:
+                udp.publish(data)
+            if history is not None:
+                history.record(data)
             await broadcast_state(data)
             
-        # Log occasionally
-        if steps % 500 == 0:
-            # Print status of first active control
-            if control_map:
-                c0 = control_map[0]
-                print(f"Time:{data.time:.1f}s | {c0['name']}: In({target_controls[0]:.2f}) -> P({data.ctrl[c0['piston_id']]:.2f}) / R({data.ctrl[c0['robot_id']]:.2f})")
-
-        elapsed = time.time() - frame_start
-        if elapsed < dt:
-            await asyncio.sleep(dt - elapsed)
-        else:
-            # Force yield to allow WebSocket processing even if lagging
-            await asyncio.sleep(0) 
+            # Log occasionally
+            if steps // 500 != (steps - n) // 500:
+                # Print status of first active control
+                if control_map:
+                    c0 = control_map[0]
+                    print(f"Time:{data.time:.1f}s | {c0['name']}: In({target_controls[0]:.2f}) -> P({data.ctrl[c0['piston_id']]:.2f}) / R({data.ctrl[c0['robot_id']]:.2f}) | {pacer.rate} ({pacer.achieved(data.time):.1f}x)")
+                if steps // 5000 != (steps - n) // 5000 and latency.recent["total"]:
+                    print(f"  Latency: {latency.summary()}")
+                if steps // 5000 != (steps - n) // 5000 and sandboxes is not None and len(sandboxes):
+                    info = sandboxes.info()
+                    print(f"  Sandboxes: {len(sandboxes)}/{info['size']} in use, cpu {info['cpu_percent']:.0f}%")
+
+            # Timing (sleep until wall clock matches sim time, yields to WS)
+            await pacer.wait(data.time)
+    finally:
+        if shm is not None:
+            shm.close()
+            print(f"Shared memory transport '{shm_name}' closed.")
 
 async def handler(websocket):
+    from websockets.exceptions import ConnectionClosed
     print("Client connected!")
     connected_clients.add(websocket)
     try:
         async for message in websocket:
             try:
                 msg = json.loads(message)
-                if msg.get("type") == "piston_move":
+                if sandboxes is not None:
+                    sandboxes.touch(websocket) # Any message keeps a sandbox alive
+                if msg.get("type") == "hello":
+                    try:
+                        reply = state_codecs.negotiate(websocket, msg)
+                    except ValueError as e:
+                        reply = {"type": "error", "message": str(e)}
+                    await websocket.send(json.dumps(reply))
+                elif msg.get("type") == "piston_move":
+                    # Sandboxed clients only move their own copy
+                    if sandboxes is not None and sandboxes.get(websocket) is not None:
+                        try:
+                            sandboxes.set_targets(websocket, msg)
+                        except ValueError as e:
+                            await websocket.send(json.dumps({"type": "error", "id": msg.get("id"), "message": str(e)}))
+                        continue
+                    if msg.get("seq") is not None:
+                        latency.received(websocket, msg["seq"])
+                    # Timed samples ("t" / "sim_time") are queued in the jitter buffer
+                    if jitter is not None and sim_data is not None and jitter.handle_message(websocket, msg, sim_data.time):
+                        continue
                     idx = msg.get("index")
                     val = msg.get("value")
                     # Validate
@@ -272,21 +462,103 @@ async def handler(websocket):
                             val = max(0.0, min(1.0, float(val)))
                             target_controls[idx] = val
                             # print(f"Set Piston {idx} to {val}") # Debug (spammy)
+                    # All pistons at once
+                    for i, v in enumerate((msg.get("values") or [])[:len(target_controls)]):
+                        if v is not None:
+                            target_controls[i] = max(0.0, min(1.0, float(v)))
+                elif msg.get("type") == "node_pose":
+                    # Drive kinematic (mocap) frame nodes directly
+                    sandbox = sandboxes.get(websocket) if sandboxes is not None else None
+                    try:
+                        if mocap_nodes is not None and sandbox is not None:
+                            async with sandboxes.lock:
+                                mocap_nodes.handle_message(sandbox.data, msg)
+                        elif mocap_nodes is not None and sim_data is not None:
+                            async with lockstep.lock: # Not while a lockstep step runs on its thread
+                                mocap_nodes.handle_message(sim_data, msg)
+                    except (ValueError, TypeError) as e:
+                        await websocket.send(json.dumps({"type": "error", "id": msg.get("id"), "message": str(e)}))
+                elif msg.get("type") == "sandbox":
+                    if sandboxes is None:
+                        reply = {"type": "error", "id": msg.get("id"), "message": "Server started with --sandboxes 0"}
+                    else:
+                        try:
+                            async with lockstep.lock: # Fork a consistent master state
+                                reply = await sandboxes.handle_message(websocket, msg, sim_data, target_controls)
+                        except (ValueError, TypeError) as e:
+                            reply = {"type": "error", "id": msg.get("id"), "message": str(e)}
+                    await websocket.send(json.dumps(reply))
+                elif msg.get("type") == "latency":
+                    await websocket.send(json.dumps(latency.report()))
+                elif msg.get("type") == "health":
+                    if health is None:
+                        reply = {"type": "error", "id": msg.get("id"), "message": "Server started with --health-snapshots 0"}
+                    else:
+                        reply = health.info()
+                    await websocket.send(json.dumps(reply))
+                elif msg.get("type") == "history":
+                    if history is None:
+                        reply = {"type": "error", "id": msg.get("id"), "message": "Server started with --history-seconds 0"}
+                    else:
+                        try:
+                            reply = history.query(msg)
+                        except (ValueError, TypeError) as e:
+                            reply = {"type": "error", "id": msg.get("id"), "message": str(e)}
+                    await websocket.send(json.dumps(reply))
+                elif msg.get("type") == "set_rate":
+                    if pacer is not None:
+                        try:
+                            pacer.set_rate(msg.get("rate", "realtime"), msg.get("broadcast_hz"))
+                            reply = pacer.info()
+                        except (ValueError, TypeError) as e:
+                            reply = {"type": "error", "id": msg.get("id"), "message": str(e)}
+                        await websocket.send(json.dumps(reply))
+                elif msg.get("type") in ("lockstep", "step", "reset"):
+                    if lockstep is not None:
+                        try:
+                            reply = await lockstep.handle_message(websocket, msg)
+                        except (ValueError, TypeError) as e:
+                            reply = {"type": "error", "id": msg.get("id"), "message": str(e)}
+                        await websocket.send(json.dumps(reply))
+                elif msg.get("type") == "rollout":
+                    if rollouts is not None and sim_data is not None:
+                        try:
+                            async with lockstep.lock: # Snapshot taken between lockstep steps
+                                job = rollouts.prepare(sim_data, msg)
+                            reply = await rollouts.run(job) # Candidates run without the lock
+                        except (ValueError, TypeError) as e:
+                            reply = {"type": "error", "id": msg.get("id"), "message": str(e)}
+                        await websocket.send(json.dumps(reply))
             except json.JSONDecodeError:
                 pass
             except Exception as e:
                 print(f"Error handling message: {e}")
-    except websockets.exceptions.ConnectionClosed:
+    except ConnectionClosed:
         pass
     finally:
         connected_clients.remove(websocket)
+        state_codecs.forget(websocket)
+        latency.forget(websocket)
+        if jitter is not None:
+            jitter.forget(websocket)
+        if sandboxes is not None and sandboxes.release(websocket):
+            print("Sandbox released.")
+        if lockstep is not None and lockstep.release(websocket):
+            print("Lockstep session released, resuming free run.")
         print("Client disconnected.") 
 
 async def main_async():
+    # SIGTERM (docker stop, gateway.py) cancels like Ctrl-C, so run_simulation's cleanup runs
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass
+
     print("Initializing MuJoCo Puppet Simulation...")
     
     print(f"Current Working Directory: {os.getcwd()}")
-    resolved_path = os.path.abspath(MODEL_PATH)
+    server = server_options()
+    resolved_path = os.path.abspath(server.model)
     print(f"Resolved Model Path: {resolved_path}")
 
     if not os.path.exists(resolved_path):
@@ -295,10 +567,11 @@ async def main_async():
 
     try:
         print(f"Loading model from {resolved_path}")
-        model = mujoco.MjModel.from_xml_path(resolved_path)
+        model, source = load_model(resolved_path)
         data = mujoco.MjData(model)
+        startup.mark(f"compile ({source})")
         
-        print("Starting WebSocket Server on port 8766...")
+        print(f"Starting WebSocket Server on port {server.port}...")
         
         # Debug: Print Actuators
         print(f"Model has {model.nu} actuators.")
@@ -306,8 +579,15 @@ async def main_async():
             name = mujoco.mj_id2name(model, mujoco.mjtObj.mjOBJ_ACTUATOR, i)
             print(f" - Actuator {i}: {name}")
 
-        async with websockets.serve(handler, "localhost", 8766):
-            print("WebSocket Server is actively listening on ws://localhost:8766")
+        # Compression (permessage-deflate settings, app codec level)
+        options = compression_options()
+        state_codecs.level = options.codec_level
+        print(f"Compression: {describe(options)}")
+
+        import websockets
+        async with websockets.serve(handler, "localhost", server.port, **serve_kwargs(options)):
+            startup.mark("socket_ready")
+            print(f"WebSocket Server is actively listening on ws://localhost:{server.port}")
             await run_simulation(model, data)
 
     except asyncio.CancelledError:
@@ -0,0 +1,148 @@
+import argparse
+import time
+
+import numpy as np
+
+# Binary STL I/O
+# The whole file is one NumPy structured array (50 bytes per triangle), so writing
+# is a single tofile() and reading a single np.fromfile() straight into the record
+# array (or a zero-copy np.memmap view with mmap=True).
+#
+# Layout: 80 byte header, uint32 triangle count, then per triangle
+#   normal (3 x float32), vertices (3 x 3 x float32), attribute byte count (uint16)
+#
+# Benchmark (lattice of rhombic dodecahedra):
+#   python deployment/robot_control/mesh_io.py --cells 40
+
+STL_HEADER_SIZE = 84
+STL_DTYPE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("v", "<f4", (3, 3)),
+    ("attr", "<u2"),
+])
+
+def face_normals(triangles):
+    # triangles: (N, 3, 3) -> unit normals (N, 3), zero for degenerate faces
+    t = np.asarray(triangles, dtype=np.float64)
+    n = np.cross(t[:, 1] - t[:, 0], t[:, 2] - t[:, 0])
+    length = np.linalg.norm(n, axis=1, keepdims=True)
+    return np.divide(n, length, out=np.zeros_like(n), where=length > 0)
+
+def orient_outward(verts, faces, center=None):
+    # Flip faces whose normal points towards `center` (default: vertex centroid).
+    # Exact for convex and star-shaped meshes such as the node hulls.
+    verts = np.asarray(verts, dtype=np.float64)
+    faces = np.array(faces, dtype=np.int64)
+    if center is None:
+        center = verts.mean(axis=0)
+    t = verts[faces]
+    n = np.cross(t[:, 1] - t[:, 0], t[:, 2] - t[:, 0])
+    inward = np.einsum("ij,ij->i", n, t.mean(axis=1) - center) < 0
+    faces[inward] = faces[inward][:, ::-1]
+    return faces
+
+def stl_array(verts, faces=None, orient=True):
+    # Build the STL record array from an indexed mesh (verts (V, 3), faces (F, 3))
+    # or directly from a triangle soup (verts (F, 3, 3), faces=None).
+    if faces is None:
+        triangles = np.asarray(verts)
+    else:
+        if orient:
+            faces = orient_outward(verts, faces)
+        triangles = np.asarray(verts)[np.asarray(faces)]
+
+    out = np.zeros(len(triangles), dtype=STL_DTYPE)
+    out["v"] = triangles
+    out["normal"] = face_normals(triangles)
+    return out
+
+def write_stl(filename, verts, faces=None, orient=True, header=b""):
+    records = stl_array(verts, faces, orient)
+    with open(filename, "wb") as f:
+        f.write(header[:80].ljust(80, b"\0"))
+        f.write(np.uint32(len(records)).tobytes())
+        records.tofile(f)
+    return len(records)
+
+def _check_size(nbytes, count, filename):
+    expected = STL_HEADER_SIZE + count * STL_DTYPE.itemsize
+    if nbytes < expected:
+        raise ValueError(f"{filename}: truncated binary STL ({nbytes} bytes, expected {expected} for {count} triangles)")
+
+def read_stl(filename, mmap=False):
+    # Returns the STL record array, read in one go without an intermediate bytes copy.
+    # With mmap=True the file is mapped read-only and nothing is loaded until the
+    # fields are touched.
+    with open(filename, "rb") as f:
+        head = f.read(STL_HEADER_SIZE)
+        if len(head) < STL_HEADER_SIZE:
+            raise ValueError(f"{filename}: not a binary STL")
+        count = int(np.frombuffer(head, dtype="<u4", count=1, offset=80)[0])
+        f.seek(0, 2)
+        size = f.tell()
+        if head.startswith(b"solid") and size != STL_HEADER_SIZE + count * STL_DTYPE.itemsize:
+            return _read_stl_ascii(filename)
+        _check_size(size, count, filename)
+        if mmap:
+            return np.memmap(filename, dtype=STL_DTYPE, mode="r", offset=STL_HEADER_SIZE, shape=(count,))
+        f.seek(STL_HEADER_SIZE)
+        return np.fromfile(f, dtype=STL_DTYPE, count=count)
+
+def _read_stl_ascii(filename):
+    # ASCII STL fallback (exported by some CAD tools), same record layout as binary
+    with open(filename, "r") as f:
+        coords = [line.split()[1:4] for line in f if line.lstrip().startswith("vertex")]
+    triangles = np.array(coords, dtype=np.float32).reshape(-1, 3, 3)
+    return stl_array(triangles)
+
+def read_obj(filename):
+    # Wavefront OBJ -> verts (V, 3), faces (F, 3). Polygons are fan triangulated,
+    # texture/normal indices ("v/vt/vn") and negative indices are handled.
+    verts = []
+    faces = []
+    with open(filename, "r") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "v":
+                verts.append(parts[1:4])
+            elif parts[0] == "f":
+                idx = [int(p.split("/")[0]) for p in parts[1:]]
+                idx = [i - 1 if i > 0 else len(verts) + i for i in idx]
+                for k in range(1, len(idx) - 1):
+                    faces.append((idx[0], idx[k], idx[k + 1]))
+    return np.array(verts, dtype=np.float64).reshape(-1, 3), np.array(faces, dtype=np.int64).reshape(-1, 3)
+
+# --- BENCHMARK ---
+
+def lattice_triangles(cells):
+    # cells^3 rhombic dodecahedra (the node shape from geometry.py) on a cubic grid
+    from geometry import get_rhombic_dodecahedron_verts, rhombic_dodecahedron_faces
+    verts = get_rhombic_dodecahedron_verts()
+    cell = stl_array(verts, rhombic_dodecahedron_faces())["v"]
+    g = np.arange(cells) * 0.5
+    offsets = np.stack(np.meshgrid(g, g, g, indexing="ij"), axis=-1).reshape(-1, 1, 1, 3)
+    return (cell[None] + offsets).reshape(-1, 3, 3)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write and read back a lattice mesh to time the STL I/O.")
+    parser.add_argument("--cells", type=int, default=40, help="Lattice cells per axis")
+    parser.add_argument("--output", default="lattice.stl")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    tris = lattice_triangles(args.cells)
+    t1 = time.perf_counter()
+    n = write_stl(args.output, tris)
+    t2 = time.perf_counter()
+    mesh = read_stl(args.output, mmap=True)
+    t3 = time.perf_counter()
+    checksum = float(mesh["v"].sum())
+    t4 = time.perf_counter()
+
+    print(f"Triangles: {n}")
+    print(f"  build     {1e3 * (t1 - t0):8.1f} ms")
+    print(f"  write     {1e3 * (t2 - t1):8.1f} ms")
+    print(f"  map       {1e3 * (t3 - t2):8.1f} ms")
+    print(f"  touch all {1e3 * (t4 - t3):8.1f} ms (checksum {checksum:.3f})")
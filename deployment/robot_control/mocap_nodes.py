@@ -0,0 +1,100 @@
+import mujoco
+import numpy as np
+
+# Mocap Node Driver
+# Scenes generated with `generate_puppet.py --node-mode mocap` emit the frame nodes
+# as mocap bodies. Their poses are not integrated by the solver, the server sets
+# them directly through data.mocap_pos / data.mocap_quat.
+#
+# WebSocket message (main_puppet.py / imain.py):
+#   {"type": "node_pose", "name": "node_3", "pos": [x, y, z], "quat": [w, x, y, z]}
+#   {"type": "node_pose", "nodes": {"node_3": {"pos": [...]}, "node_4": {"quat": [...]}}}
+# A malformed message (unknown node, pos not 3 / quat not 4 finite numbers, zero quat)
+# raises ValueError and changes nothing; the servers reply {"type": "error", ...}.
+#
+# Mocap poses are not part of qpos, so main_puppet.py adds "mocap_pos" (nmocap x 3) and
+# "mocap_quat" (nmocap x 4) to its state frames when the scene has mocap nodes.
+
+class MocapNodes:
+    def __init__(self, model, prefix="node_"):
+        # Node Name -> Mocap Index
+        self.index = {}
+        for b in range(model.nbody):
+            name = mujoco.mj_id2name(model, mujoco.mjtObj.mjOBJ_BODY, b)
+            mocap_id = model.body_mocapid[b]
+            if name and name.startswith(prefix) and mocap_id >= 0:
+                self.index[name] = int(mocap_id)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _check(self, name, pos, quat):
+        # -> (mocap_id, pos, unit quat), ValueError if the pose can't be applied
+        mocap_id = self.index.get(name)
+        if mocap_id is None:
+            raise ValueError(f"Unknown mocap node '{name}'")
+        if pos is not None:
+            pos = self._vector(name, "pos", pos, 3)
+        if quat is not None:
+            quat = self._vector(name, "quat", quat, 4)
+            norm = np.linalg.norm(quat)
+            if norm == 0:
+                raise ValueError(f"{name}: quat must not be zero")
+            quat = quat / norm
+        return mocap_id, pos, quat
+
+    @staticmethod
+    def _vector(name, key, values, size):
+        try:
+            v = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name}: {key} must be {size} numbers") from None
+        if v.shape != (size,) or not np.isfinite(v).all():
+            raise ValueError(f"{name}: {key} must be {size} finite numbers, got {values!r}")
+        return v
+
+    def set_pose(self, data, name, pos=None, quat=None):
+        mocap_id, pos, quat = self._check(name, pos, quat)
+        if pos is not None:
+            data.mocap_pos[mocap_id] = pos
+        if quat is not None:
+            data.mocap_quat[mocap_id] = quat
+        return True
+
+    def set_poses(self, data, names, pos=None, quat=None):
+        # Vectorized update for many nodes: pos (N, 3), quat (N, 4)
+        ids = [self.index[n] for n in names]
+        if pos is not None:
+            data.mocap_pos[ids] = pos
+        if quat is not None:
+            q = np.asarray(quat, dtype=np.float64)
+            data.mocap_quat[ids] = q / np.linalg.norm(q, axis=1, keepdims=True)
+
+    def get_poses(self, data):
+        return {name: {"pos": data.mocap_pos[i].tolist(), "quat": data.mocap_quat[i].tolist()}
+                for name, i in self.index.items()}
+
+    def handle_message(self, data, msg):
+        # Apply a "node_pose" message, returns the number of nodes updated.
+        # Everything is checked first, a bad entry leaves all poses unchanged.
+        poses = []
+        if "name" in msg:
+            poses.append((msg["name"], msg.get("pos"), msg.get("quat")))
+        nodes = msg.get("nodes") or {}
+        if not isinstance(nodes, dict):
+            raise ValueError("nodes must map node names to {\"pos\", \"quat\"}")
+        for name, pose in nodes.items():
+            if not isinstance(pose, dict):
+                raise ValueError(f"{name}: expected {{\"pos\": [...], \"quat\": [...]}}")
+            poses.append((name, pose.get("pos"), pose.get("quat")))
+        checked = [self._check(*pose) for pose in poses]
+        for mocap_id, pos, quat in checked:
+            if pos is not None:
+                data.mocap_pos[mocap_id] = pos
+            if quat is not None:
+                data.mocap_quat[mocap_id] = quat
+        return len(checked)
+
+    def state(self, data):
+        # Frame fields for the state stream (mocap poses are not in qpos)
+        return {"mocap_pos": data.mocap_pos, "mocap_quat": data.mocap_quat}
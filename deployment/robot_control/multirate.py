@@ -0,0 +1,82 @@
+import mujoco
+import numpy as np
+
+# Multi-rate Channels (main.py)
+# Pose frames go out once per broadcast batch (~60 Hz), but state estimators want the
+# IMU at the physics rate. While someone is subscribed the server steps one physics
+# step at a time, records the high-rate channels into a ring after each step and
+# attaches everything recorded since the last frame to the next state frame.
+#
+#   {"type": "subscribe_batches"}  -> {"type": "batch_layout", "rate_hz": 500, "channels": {"gyro": 3, ...}}
+#   state frames then carry
+#     "batch_time": [t0, t1, ...]              time at which each sample's sensors were evaluated
+#     "batch_gyro": [[x, y, z], ...]           one row per physics step (binary codec: flattened,
+#     "batch_accel", "batch_piston_force"       rows = len(batch_time))
+#   {"type": "unsubscribe_batches"}
+#
+# Samples that no frame picked up for `capacity` steps are dropped (counted in `dropped`).
+
+DEFAULT_CAPACITY = 4096 # ~8 s at dt=0.002
+
+class HighRateRecorder:
+    def __init__(self, model, imu, capacity=DEFAULT_CAPACITY, piston_prefix="act_piston_"):
+        # imu: SensorSelection of [gyro, accel] (see sensor_slices.py)
+        self.dt = model.opt.timestep
+        self.imu = imu
+        self.piston_ids = np.asarray([i for i in range(model.nu)
+                                      if (mujoco.mj_id2name(model, mujoco.mjtObj.mjOBJ_ACTUATOR, i) or "").startswith(piston_prefix)],
+                                     dtype=int)
+
+        # Columns of one ring row
+        self.channels = {}
+        col = 0
+        for name, (a, b) in zip(("gyro", "accel"), imu.offsets.values()):
+            self.channels[name] = (col + a, col + b)
+        col += imu.size
+        if len(self.piston_ids):
+            self.channels["piston_force"] = (col, col + len(self.piston_ids))
+            col += len(self.piston_ids)
+
+        self.capacity = capacity
+        self.time = np.zeros(capacity)
+        self.rows = np.zeros((capacity, col))
+        self.head = 0 # Samples written
+        self.tail = 0 # Samples drained
+        self.dropped = 0
+
+    def layout(self):
+        return {"type": "batch_layout", "rate_hz": 1.0 / self.dt, "capacity": self.capacity,
+                "channels": {name: b - a for name, (a, b) in self.channels.items()}}
+
+    def record(self, data):
+        # Call after every mj_step; sensors were evaluated at the start of that step
+        k = self.head % self.capacity
+        self.time[k] = data.time - self.dt
+        row = self.rows[k]
+        row[:self.imu.size] = data.sensordata[self.imu.index]
+        if len(self.piston_ids):
+            a, b = self.channels["piston_force"]
+            row[a:b] = data.actuator_force[self.piston_ids]
+        self.head += 1
+
+    def step(self, model, data, nstep):
+        # mj_step(model, data, nstep) with a sample after every step
+        for _ in range(nstep):
+            mujoco.mj_step(model, data)
+            self.record(data)
+
+    def drain(self):
+        # -> {"batch_time": (k,), "batch_<channel>": (k, dim)} for samples since the last drain
+        if self.head - self.tail > self.capacity:
+            self.dropped += self.head - self.tail - self.capacity
+            self.tail = self.head - self.capacity
+        idx = np.arange(self.tail, self.head) % self.capacity
+        self.tail = self.head
+        rows = self.rows[idx]
+        batch = {"batch_time": self.time[idx]}
+        for name, (a, b) in self.channels.items():
+            batch[f"batch_{name}"] = rows[:, a:b]
+        return batch
+
+    def clear(self):
+        self.tail = self.head
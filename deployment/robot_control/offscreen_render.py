@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Offscreen Rendering Stream (main.py --render)
+# Renders the live simulation with mujoco.Renderer on its own thread and streams
+# encoded frames over the existing WebSocket, for clients that cannot run the
+# WASM viewer.
+#
+# - Software GL by default (MUJOCO_GL=osmesa, set before mujoco is imported), so no GPU needed.
+#   Needs libosmesa6 in the container; MUJOCO_GL=egl works too where a GPU exists.
+# - The physics loop only calls submit(): a state copy into a single slot, never blocks.
+#   If the render thread is still busy the older pending state is replaced (frame dropped).
+# - Frames: "jpeg" (needs Pillow), "png" (zlib, no extra deps) or "raw" RGB.
+#
+# Protocol:
+#   client -> {"type": "subscribe_frames"}   server -> {"type": "frames", "format", "width", "height", "fps"}
+#   then binary messages: FRAME_HEADER (magic, seq, sim_time, width, height) + encoded image
+#   client -> {"type": "unsubscribe_frames"}
+#   Slow clients skip frames (a client only gets a new frame once the previous send finished).
+
+FRAME_FORMATS = ("jpeg", "png", "raw")
+FRAME_MAGIC = b"FRM1"
+FRAME_HEADER = struct.Struct("<4sIdHH")
+
+def render_requested(argv=None):
+    argv = sys.argv if argv is None else argv
+    return "--render" in argv or os.environ.get("MUJOCO_RENDER", "0") == "1"
+
+def configure_gl(backend="osmesa"):
+    # Must run before the first `import mujoco`
+    os.environ.setdefault("MUJOCO_GL", backend)
+    if os.environ["MUJOCO_GL"] == "osmesa":
+        os.environ.setdefault("PYOPENGL_PLATFORM", "osmesa")
+
+def render_options(argv=None):
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--render", action="store_true")
+    parser.add_argument("--render-size", default="320x240", help="WIDTHxHEIGHT")
+    parser.add_argument("--render-fps", type=float, default=15.0)
+    parser.add_argument("--render-format", choices=FRAME_FORMATS, default="jpeg")
+    parser.add_argument("--render-quality", type=int, default=70, help="JPEG quality")
+    parser.add_argument("--render-camera", default="-1", help="Camera name or id (-1: free camera)")
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    width, height = (int(v) for v in args.render_size.lower().split("x"))
+    camera = int(args.render_camera) if args.render_camera.lstrip("-").isdigit() else args.render_camera
+    return {"width": width, "height": height, "fps": args.render_fps, "fmt": args.render_format,
+            "quality": args.render_quality, "camera": camera}
+
+# --- ENCODING ---
+
+def encode_png(pixels):
+    # Minimal RGB PNG (filter type 0 per row), stdlib only
+    h, w, _ = pixels.shape
+    raw = np.empty((h, 1 + 3 * w), dtype=np.uint8)
+    raw[:, 0] = 0
+    raw[:, 1:] = pixels.reshape(h, -1)
+    def chunk(tag, body):
+        return struct.pack(">I", len(body)) + tag + body + struct.pack(">I", zlib.crc32(tag + body) & 0xFFFFFFFF)
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 1))
+            + chunk(b"IEND", b""))
+
+def encode_frame(pixels, fmt="jpeg", quality=70):
+    if fmt == "raw":
+        return pixels.tobytes()
+    if fmt == "jpeg":
+        import io
+        from PIL import Image
+        buf = io.BytesIO()
+        Image.fromarray(pixels).save(buf, format="JPEG", quality=quality)
+        return buf.getvalue()
+    return encode_png(pixels)
+
+def resolve_format(fmt):
+    # Fall back to PNG when Pillow is missing
+    if fmt == "jpeg":
+        try:
+            import PIL # noqa: F401
+        except ImportError:
+            print("Pillow not installed, streaming PNG frames instead of JPEG.")
+            return "png"
+    return fmt
+
+# --- RENDER THREAD ---
+
+class OffscreenRenderer:
+    def __init__(self, model, width=320, height=240, fps=15.0, fmt="jpeg", quality=70, camera=-1):
+        self.model = model
+        self.width = width
+        self.height = height
+        # Offscreen buffer must fit the requested size
+        model.vis.global_.offwidth = max(model.vis.global_.offwidth, width)
+        model.vis.global_.offheight = max(model.vis.global_.offheight, height)
+        self.fps = fps
+        self.fmt = resolve_format(fmt)
+        self.quality = quality
+        self.camera = camera
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = None
+        self._next_due = 0.0
+        self._stop = False
+        self._thread = None
+
+        # Latest encoded frame, read by the asyncio side
+        self.frame = None
+        self.frame_seq = 0
+        self.frame_time = 0.0
+
+        # Stats
+        self.submitted = 0
+        self.dropped = 0
+        self.rendered = 0
+        self.render_ms = 0.0
+        self.error = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="offscreen-render", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop = True
+        self._wake.set()
+
+    def submit(self, data):
+        # Physics thread: rate limited, non-blocking. Only the state needed to pose the scene is copied.
+        now = time.perf_counter()
+        if now < self._next_due or self.error is not None:
+            return False
+        self._next_due = now + 1.0 / self.fps
+        state = (data.time, data.qpos.copy(), data.mocap_pos.copy(), data.mocap_quat.copy())
+        with self._lock:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = state
+        self.submitted += 1
+        self._wake.set()
+        return True
+
+    def _run(self):
+        import mujoco
+        try:
+            # GL context belongs to this thread
+            renderer = mujoco.Renderer(self.model, height=self.height, width=self.width)
+        except Exception as e:
+            self.error = e
+            print(f"Offscreen renderer unavailable ({e}). Set MUJOCO_GL=osmesa/egl and install the GL libraries.")
+            return
+        render_data = mujoco.MjData(self.model)
+        print(f"Offscreen renderer started: {self.width}x{self.height} @ {self.fps:.0f} fps, {self.fmt} ({os.environ.get('MUJOCO_GL', 'default')} GL)")
+
+        while not self._stop:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                state, self._pending = self._pending, None
+            if state is None:
+                continue
+
+            t0 = time.perf_counter()
+            sim_time, qpos, mocap_pos, mocap_quat = state
+            render_data.time = sim_time
+            render_data.qpos[:] = qpos
+            render_data.mocap_pos[:] = mocap_pos
+            render_data.mocap_quat[:] = mocap_quat
+            mujoco.mj_forward(self.model, render_data)
+            renderer.update_scene(render_data, camera=self.camera)
+            pixels = renderer.render()
+            encoded = encode_frame(pixels, self.fmt, self.quality)
+
+            header = FRAME_HEADER.pack(FRAME_MAGIC, self.frame_seq + 1, sim_time, self.width, self.height)
+            self.frame = header + encoded
+            self.frame_time = sim_time
+            self.frame_seq += 1
+            self.rendered += 1
+            frame_ms = (time.perf_counter() - t0) * 1e3
+            self.render_ms = frame_ms if self.rendered == 1 else 0.9 * self.render_ms + 0.1 * frame_ms
+        renderer.close()
+
+    def info(self):
+        return {"type": "frames", "format": self.fmt, "width": self.width, "height": self.height, "fps": self.fps}
+
+    def stats(self):
+        return f"frames {self.rendered} rendered / {self.dropped} dropped, {self.render_ms:.1f} ms per frame"
+
+# --- WEBSOCKET DELIVERY ---
+
+async def stream_frames(renderer, subscribers):
+    # Runs on the asyncio loop; sends each new frame to every subscriber that is not
+    # still busy with the previous one.
+    busy = set()
+    last_seq = 0
+
+    async def send(ws, frame):
+        try:
+            await ws.send(frame)
+        except Exception:
+            subscribers.discard(ws)
+        finally:
+            busy.discard(ws)
+
+    while renderer.error is None:
+        await asyncio.sleep(0.5 / renderer.fps)
+        if renderer.frame_seq == last_seq or not subscribers:
+            continue
+        last_seq = renderer.frame_seq
+        frame = renderer.frame
+        for ws in list(subscribers):
+            if ws in busy:
+                continue
+            busy.add(ws)
+            asyncio.ensure_future(send(ws, frame))
@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Run Modes for the simulation servers (main.py, main_puppet.py)
+#   "realtime" - sim time follows wall clock
+#   "<N>x"     - fixed multiple of real time (e.g. "4x", "0.5x")
+#   "fast"     - unthrottled, only yields to the event loop between batches
+#
+# Physics runs in mj_step(..., nstep) batches of one broadcast period, so state is
+# broadcast on a sim-time cadence (--broadcast-hz of sim time) in every mode and
+# clients get the same stream, only faster or slower.
+#
+# Select at startup:  --rate fast   (or SIM_RATE=fast)
+# Change at runtime:  {"type": "set_rate", "rate": "4x", "broadcast_hz": 10}  (broadcast_hz optional)
+#                     -> {"type": "rate", "rate": "4x", "batch_steps": ..., "broadcast_dt": ...}
+
+DEFAULT_RATE = "realtime"
+DEFAULT_BROADCAST_HZ = 62.5 # 8 steps at dt=0.002, same as the old `steps % 8`
+
+def parse_rate(rate):
+    # -> realtime factor, None for unthrottled
+    text = str(rate).strip().lower()
+    if text in ("realtime", "rt", "1x"):
+        return 1.0
+    if text in ("fast", "max", "unthrottled"):
+        return None
+    factor = float(text[:-1] if text.endswith("x") else text)
+    if factor <= 0:
+        raise ValueError(f"Rate must be positive, got '{rate}'")
+    return factor
+
+def rate_options(argv=None):
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--rate", default=os.environ.get("SIM_RATE", DEFAULT_RATE))
+    parser.add_argument("--broadcast-hz", type=float, default=float(os.environ.get("BROADCAST_HZ", DEFAULT_BROADCAST_HZ)))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return {"rate": args.rate, "broadcast_hz": args.broadcast_hz}
+
+class Pacer:
+    def __init__(self, dt, rate=DEFAULT_RATE, broadcast_hz=DEFAULT_BROADCAST_HZ):
+        self.dt = dt
+        self.lag_events = 0
+        self.batch = 1
+        self._window = (time.perf_counter(), 0.0)
+        self.set_rate(rate, broadcast_hz)
+
+    def set_rate(self, rate, broadcast_hz=None):
+        # Lower broadcast_hz -> larger mj_step batches (fewer broadcasts per sim second)
+        # Validate both before changing anything, a bad request leaves the mode as it was
+        factor = parse_rate(rate)
+        batch = self.batch
+        if broadcast_hz is not None:
+            hz = float(broadcast_hz)
+            if not hz > 0:
+                raise ValueError(f"broadcast_hz must be positive, got {broadcast_hz!r}")
+            batch = max(1, int(round(1.0 / (hz * self.dt))))
+        self.factor, self.batch = factor, batch
+        self.rate = "fast" if self.factor is None else ("realtime" if self.factor == 1.0 else f"{self.factor:g}x")
+        self._anchor = None
+        self._last_sim = 0.0
+        return self.rate
+
+    def reset(self):
+        # Forget the wall clock anchor (after a pause)
+        self._anchor = None
+
+    def info(self):
+        return {"type": "rate", "rate": self.rate, "batch_steps": self.batch, "broadcast_dt": self.batch * self.dt}
+
+    async def wait(self, sim_time):
+        # Call after each batch: sleeps until wall clock catches up with sim time
+        now = time.perf_counter()
+        if self.factor is None:
+            await asyncio.sleep(0)
+            return
+        # (Re)anchor on start, rate change, or MuJoCo resetting the state (time jumps back).
+        # The anchor is one batch back so the current batch still gets its wall time.
+        if self._anchor is None or sim_time < self._last_sim:
+            self._anchor = (now, sim_time - self.batch * self.dt)
+        self._last_sim = sim_time
+        target = self._anchor[0] + (sim_time - self._anchor[1]) / self.factor
+        delay = target - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            # Behind schedule: don't burst to catch up after long stalls
+            if delay < -0.25:
+                self.lag_events += 1
+                self._anchor = (now, sim_time)
+            await asyncio.sleep(0)
+
+    def achieved(self, sim_time):
+        # Realtime factor actually achieved since the last call
+        now = time.perf_counter()
+        wall0, sim0 = self._window
+        self._window = (now, sim_time)
+        return (sim_time - sim0) / (now - wall0) if now > wall0 and sim_time >= sim0 else 0.0
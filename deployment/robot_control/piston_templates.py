@@ -0,0 +1,163 @@
+import math
+
+# Shared Piston / Spring Templates for the tensegrity generators.
+#
+# Piston Fidelity Levels:
+#   "full"    - Freejoint barrel with two slide-jointed rods, welded to both nodes
+#               and coupled by a joint equality (8 DOF + 13 constraint rows per piston).
+#   "reduced" - Single slide joint rooted at node n1, rod tip connected to node n2
+#               (1 DOF + 3 constraint rows per piston).
+#   "tendon"  - Spatial tendon between the node sites driven by a length actuator,
+#               barrel is visual only (0 DOF, 0 equality rows).
+#
+# All levels keep the actuator names "act_{p_name}_a" (and "act_{p_name}_b" when
+# dual actuators are requested) and the same ctrlrange, so controllers written
+# against the full model keep working.
+PISTON_FIDELITY = ("full", "reduced", "tendon")
+
+# Frame Node Modes (see generate_puppet.py): free bodies, mocap driven, or welded to world
+NODE_MODES = ("free", "mocap", "static")
+
+def node_children_marker(idx):
+    # Placeholder inside a node body, replaced by fill_node_children()
+    return f'        <!-- node_{idx} children -->\n'
+
+def fill_node_children(xml, node_children):
+    # Insert bodies/geoms that live inside node bodies (reduced/tendon pistons)
+    # and strip markers of nodes that got nothing.
+    for idx, children in node_children.items():
+        xml = xml.replace(node_children_marker(idx), children)
+    while '<!-- node_' in xml:
+        start = xml.index('        <!-- node_')
+        end = xml.index('-->\n', start) + 4
+        xml = xml[:start] + xml[end:]
+    return xml
+
+def piston_xml(p_name, n1_idx, n2_idx, p1, p2, z_offset, th_struct, d_joint, d_geom,
+               rod_color="0.6 0.6 0.6 1", kp=1000, dual_actuators=False, center_site=False,
+               fidelity="full"):
+    # Returns the XML fragments of one piston between node_{n1_idx} and node_{n2_idx}:
+    #   body          - worldbody level bodies
+    #   node_children - {node_idx: xml} to be placed inside node bodies
+    #   equality, actuator, tendon
+    if fidelity not in PISTON_FIDELITY:
+        raise ValueError(f"Unknown piston fidelity '{fidelity}', expected one of {PISTON_FIDELITY}")
+
+    out = {"body": "", "node_children": {}, "equality": "", "actuator": "", "tendon": ""}
+
+    mid_x, mid_y, mid_z = (p1[0]+p2[0])/2, (p1[1]+p2[1])/2, (p1[2]+p2[2])/2 + z_offset
+    dx, dy, dz = p2[0]-p1[0], p2[1]-p1[1], p2[2]-p1[2]
+    dist = math.sqrt(dx**2 + dy**2 + dz**2)
+    ux, uy, uz = dx/dist, dy/dist, dz/dist
+
+    # Double Acting Piston Dimensions
+    # Barrel: Central, length 40% of dist. (-0.2 to 0.2)
+    # Rods: Extend from barrel to nodes.
+    # At Neutral (q=0):
+    #   Rod A visual: -0.1 (inside) to -0.5 (anchor).
+    #   Rod B visual:  0.1 (inside) to  0.5 (anchor).
+    barrel_half = dist * 0.2
+    barrel_inner_reach = dist * 0.1 # Visual start of rod inside barrel
+    node_reach = dist * 0.5
+
+    # Per-Rod Ranges
+    # Compression: Rod can retract into barrel until anchor is at -0.25 (dist/4).
+    limit_comp = -dist * 0.25
+    # Extension: Rod can extend out until the inner end reaches the barrel edge.
+    limit_ext = dist * 0.1
+
+    # Point along the edge in node_{n1} frame (nodes are not rotated)
+    def along(t):
+        return f"{ux*t} {uy*t} {uz*t}"
+
+    suffixes = ["a", "b"] if dual_actuators else ["a"]
+
+    if fidelity == "full":
+        # Piston Barrel (Central Housing - Dark Grey)
+        out["body"] += f'    <body name="{p_name}_barrel" pos="{mid_x} {mid_y} {mid_z}" zaxis="{dx} {dy} {dz}" gravcomp="1">\n'
+        out["body"] += '        <freejoint/>\n'
+        out["body"] += f'        <geom type="cylinder" fromto="0 0 {-barrel_half} 0 0 {barrel_half}" size="{th_struct*2.0}" rgba="0.2 0.2 0.2 1" mass="1.0" {d_geom}/>\n'
+        if center_site:
+            out["body"] += f'        <site name="{p_name}_center" pos="0 0 0"/>\n'
+        # No anchor on barrel, it floats between rods.
+
+        # Rod A (Left/Bottom - Negative Z)
+        out["body"] += f'        <body name="{p_name}_rod_a" pos="0 0 0" gravcomp="1">\n'
+        # Axis -1 means positive q moves towards negative Z (Extension away from center)
+        out["body"] += f'            <joint name="slide_{p_name}_a" type="slide" axis="0 0 -1" limited="true" range="{limit_comp} {limit_ext}" {d_joint}/>\n'
+        out["body"] += f'            <geom type="cylinder" fromto="0 0 {-barrel_inner_reach} 0 0 {-node_reach}" size="{th_struct}" rgba="{rod_color}" mass="0.5" {d_geom}/>\n'
+        out["body"] += f'            <site name="{p_name}_anchor_a" pos="0 0 {-node_reach}"/>\n'
+        out["body"] += '        </body>\n'
+
+        # Rod B (Right/Top - Positive Z)
+        out["body"] += f'        <body name="{p_name}_rod_b" pos="0 0 0" gravcomp="1">\n'
+        # Axis +1 means positive q moves towards positive Z (Extension away from center)
+        out["body"] += f'            <joint name="slide_{p_name}_b" type="slide" axis="0 0 1" limited="true" range="{limit_comp} {limit_ext}" {d_joint}/>\n'
+        out["body"] += f'            <geom type="cylinder" fromto="0 0 {barrel_inner_reach} 0 0 {node_reach}" size="{th_struct}" rgba="{rod_color}" mass="0.5" {d_geom}/>\n'
+        out["body"] += f'            <site name="{p_name}_anchor_b" pos="0 0 {node_reach}"/>\n'
+        out["body"] += '        </body>\n'
+
+        out["body"] += '    </body>\n'
+
+        # Weld Constraints to Nodes (Rod A -> N1, Rod B -> N2)
+        out["equality"] += f'        <weld name="weld_{p_name}_a" body1="{p_name}_rod_a" body2="node_{n1_idx}"/>\n'
+        out["equality"] += f'        <weld name="weld_{p_name}_b" body1="{p_name}_rod_b" body2="node_{n2_idx}"/>\n'
+
+        # Symmetry Constraint (Keep Barrel Centered)
+        # Forces slide_a == slide_b, eliminating the floating DOF of the barrel.
+        out["equality"] += f'        <joint name="eq_{p_name}" joint1="slide_{p_name}_a" joint2="slide_{p_name}_b" polycoef="0 1 0 0 0"/>\n'
+
+        for sfx in suffixes:
+            out["actuator"] += f'        <position name="act_{p_name}_{sfx}" joint="slide_{p_name}_{sfx}" kp="{kp}" ctrllimited="true" ctrlrange="{limit_comp} {limit_ext}"/>\n'
+        return out
+
+    # Reduced / Tendon: static housing geoms live in node_{n1}, reaching towards node_{n2}.
+    # Rod A + Barrel are fixed to n1, the moving part (rod B / tendon) spans to n2.
+    fixed = ""
+    fixed += f'        <geom type="cylinder" fromto="{along(0)} {along(0.5*dist - barrel_inner_reach)}" size="{th_struct}" rgba="{rod_color}" mass="0.5" {d_geom}/>\n'
+    if center_site:
+        fixed += f'        <site name="{p_name}_center" pos="{along(0.5*dist)}"/>\n'
+
+    # Both rods move together in the full model, so one joint/tendon covers twice the
+    # per-rod stroke. gear="0.5" maps it back so ctrl stays the per-rod displacement.
+    stroke_comp = 2 * limit_comp
+    stroke_ext = 2 * limit_ext
+
+    if fidelity == "reduced":
+        fixed += f'        <geom type="cylinder" fromto="{along(0.5*dist - barrel_half)} {along(0.5*dist + barrel_half)}" size="{th_struct*2.0}" rgba="0.2 0.2 0.2 1" mass="1.0" {d_geom}/>\n'
+        # Single slide chain rooted at node n1 (no free barrel)
+        fixed += f'        <body name="{p_name}_rod_b" pos="0 0 0" zaxis="{dx} {dy} {dz}" gravcomp="1">\n'
+        fixed += f'            <joint name="slide_{p_name}_a" type="slide" axis="0 0 1" limited="true" range="{stroke_comp} {stroke_ext}" {d_joint}/>\n'
+        fixed += f'            <geom type="cylinder" fromto="0 0 {0.5*dist + barrel_inner_reach} 0 0 {dist}" size="{th_struct}" rgba="{rod_color}" mass="0.5" {d_geom}/>\n'
+        fixed += f'            <site name="{p_name}_anchor_b" pos="0 0 {dist}"/>\n'
+        fixed += '        </body>\n'
+        out["node_children"][n1_idx] = fixed
+
+        # Point constraint only (rod orientation already follows node n1)
+        out["equality"] += f'        <connect name="conn_{p_name}_b" body1="{p_name}_rod_b" body2="node_{n2_idx}" anchor="0 0 {dist}"/>\n'
+
+        for sfx in suffixes:
+            out["actuator"] += f'        <position name="act_{p_name}_{sfx}" joint="slide_{p_name}_a" kp="{kp}" gear="0.5" ctrllimited="true" ctrlrange="{limit_comp} {limit_ext}"/>\n'
+        return out
+
+    # Tendon: Visual-only barrel (no mass, no contacts)
+    fixed += f'        <geom type="cylinder" fromto="{along(0.5*dist - barrel_half)} {along(0.5*dist + barrel_half)}" size="{th_struct*2.0}" rgba="0.2 0.2 0.2 1" mass="0" contype="0" conaffinity="0" group="1"/>\n'
+    out["node_children"][n1_idx] = fixed
+
+    out["tendon"] += f'        <spatial name="{p_name}_tendon" limited="true" range="{dist + stroke_comp} {dist + stroke_ext}" damping="10" width="{th_struct}" rgba="{rod_color}">\n'
+    out["tendon"] += f'            <site site="node_{n1_idx}"/>\n'
+    out["tendon"] += f'            <site site="node_{n2_idx}"/>\n'
+    out["tendon"] += '        </spatial>\n'
+
+    # Length actuator: force = kp * (ctrl - 0.5 * (L - L0)), same stiffness as the full model
+    for sfx in suffixes:
+        out["actuator"] += f'        <general name="act_{p_name}_{sfx}" tendon="{p_name}_tendon" gear="0.5" gainprm="{kp}" biastype="affine" biasprm="{kp * 0.5 * dist} {-kp} 0" ctrllimited="true" ctrlrange="{limit_comp} {limit_ext}"/>\n'
+    return out
+
+def spring_xml(t_name, site1, site2, stiffness=100, damping=10, width=0.01, rgba="1 0.4 0.2 1"):
+    # Passive spatial tendon between two sites
+    xml = f'        <spatial name="{t_name}" stiffness="{stiffness}" damping="{damping}" width="{width}" rgba="{rgba}">\n'
+    xml += f'            <site site="{site1}"/>\n'
+    xml += f'            <site site="{site2}"/>\n'
+    xml += '        </spatial>\n'
+    return xml
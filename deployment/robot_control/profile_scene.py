@@ -0,0 +1,196 @@
+import argparse
+import re
+import time
+
+import mujoco
+import numpy as np
+
+# Scene Profiler
+# Runs a generated scene headless and reports where the step time goes:
+# MuJoCo internal timers (data.timer), solver iterations per step, active
+# constraint counts by type, and a breakdown per generator feature.
+#
+# Usage (from repo root):
+#   python deployment/robot_control/profile_scene.py public/mujoco/menagerie/unitree_g1/scene_puppet.xml --steps 2000
+
+DEFAULT_SCENE = "public/mujoco/menagerie/unitree_g1/scene_puppet.xml"
+
+# Generator Features, matched against element names in order (first match wins).
+# Names follow the generate_*.py conventions.
+FEATURES = [
+    ("pistons", [r"^weld_piston_", r"^eq_piston_", r"^conn_(edge|piston)_", r"^weld_edge_",
+                 r"^slide_", r"^piston_", r"^edge_", r"^act_piston_", r"^act_edge_"]),
+    ("springs", [r"^spring_"]),
+    ("ve_tendons", [r"^ve_tendon_"]),
+    ("robot_attachment", [r"^attach_robot$", r"^center_anchor$"]),
+    ("nodes", [r"^node_"]),
+    ("gyro", [r"^gyro_", r"^motor_", r"^act_(outer|middle|inner)$"]),
+]
+FEATURE_PATTERNS = [(name, [re.compile(p) for p in pats]) for name, pats in FEATURES]
+
+def classify(name):
+    if not name:
+        return "robot"
+    for feature, patterns in FEATURE_PATTERNS:
+        for p in patterns:
+            if p.search(name):
+                return feature
+    return "robot"
+
+# Short labels for enums (mjCNSTR_LIMIT_JOINT -> limit_joint)
+def _enum_labels(enum_type, prefix, count_name):
+    labels = {}
+    for name, value in enum_type.__members__.items():
+        if name == count_name:
+            continue
+        labels[int(value)] = name[len(prefix):].lower()
+    return labels
+
+CNSTR_LABELS = _enum_labels(mujoco.mjtConstraint, "mjCNSTR_", None)
+TIMER_LABELS = _enum_labels(mujoco.mjtTimer, "mjTIMER_", "mjNTIMER")
+WARNING_LABELS = _enum_labels(mujoco.mjtWarning, "mjWARN_", "mjNWARNING")
+
+def _name(model, obj, idx):
+    return mujoco.mj_id2name(model, obj, idx)
+
+def efc_feature(model, data, row):
+    # Map one constraint row back to the generator feature that produced it
+    ctype = data.efc_type[row]
+    obj_id = data.efc_id[row]
+    if ctype == mujoco.mjtConstraint.mjCNSTR_EQUALITY:
+        return classify(_name(model, mujoco.mjtObj.mjOBJ_EQUALITY, obj_id))
+    if ctype == mujoco.mjtConstraint.mjCNSTR_LIMIT_JOINT:
+        return classify(_name(model, mujoco.mjtObj.mjOBJ_JOINT, obj_id))
+    if ctype in (mujoco.mjtConstraint.mjCNSTR_LIMIT_TENDON, mujoco.mjtConstraint.mjCNSTR_FRICTION_TENDON):
+        return classify(_name(model, mujoco.mjtObj.mjOBJ_TENDON, obj_id))
+    if ctype == mujoco.mjtConstraint.mjCNSTR_FRICTION_DOF:
+        return classify(_name(model, mujoco.mjtObj.mjOBJ_BODY, model.dof_bodyid[obj_id]))
+    # Contacts: efc_id is the contact index, attribute to the first geom's body
+    geom = data.contact[obj_id].geom1
+    return "contact:" + classify(_name(model, mujoco.mjtObj.mjOBJ_BODY, model.geom_bodyid[geom]))
+
+def model_breakdown(model):
+    # Static cost per feature: DOFs (by owning body), equalities, tendons, actuators
+    rows = {}
+    def bump(feature, key, n=1):
+        rows.setdefault(feature, {"dof": 0, "equality": 0, "tendon": 0, "actuator": 0})[key] += n
+
+    for i in range(model.nv):
+        bump(classify(_name(model, mujoco.mjtObj.mjOBJ_BODY, model.dof_bodyid[i])), "dof")
+    for i in range(model.neq):
+        bump(classify(_name(model, mujoco.mjtObj.mjOBJ_EQUALITY, i)), "equality")
+    for i in range(model.ntendon):
+        bump(classify(_name(model, mujoco.mjtObj.mjOBJ_TENDON, i)), "tendon")
+    for i in range(model.nu):
+        bump(classify(_name(model, mujoco.mjtObj.mjOBJ_ACTUATOR, i)), "actuator")
+    return rows
+
+def profile_model(model, data, steps=1000, warmup=100):
+    for _ in range(warmup):
+        mujoco.mj_step(model, data)
+
+    # Start from clean diagnostics
+    for i in range(len(data.timer)):
+        data.timer[i].duration = 0
+        data.timer[i].number = 0
+    warn_start = [data.warning[i].number for i in range(len(data.warning))]
+
+    niter = np.zeros(steps, dtype=np.int32)
+    nefc = np.zeros(steps, dtype=np.int32)
+    ncon = np.zeros(steps, dtype=np.int32)
+    by_type = {}
+    by_feature = {}
+
+    wall_start = time.perf_counter()
+    for k in range(steps):
+        mujoco.mj_step(model, data)
+        niter[k] = data.solver_niter[:max(data.nisland, 1)].max()
+        nefc[k] = data.nefc
+        ncon[k] = data.ncon
+        for row in range(data.nefc):
+            t = CNSTR_LABELS[int(data.efc_type[row])]
+            by_type[t] = by_type.get(t, 0) + 1
+            f = efc_feature(model, data, row)
+            by_feature[f] = by_feature.get(f, 0) + 1
+    wall = time.perf_counter() - wall_start
+
+    # Note: the constraint accounting loop above is included in wall time,
+    # the MuJoCo timers below are not affected by it.
+    timers = {}
+    for i, label in TIMER_LABELS.items():
+        t = data.timer[i]
+        if t.number > 0:
+            timers[label] = {"total_s": t.duration, "calls": t.number, "per_step_us": t.duration / steps * 1e6}
+
+    warnings = {}
+    for i, label in WARNING_LABELS.items():
+        n = data.warning[i].number - warn_start[i]
+        if n > 0:
+            warnings[label] = n
+
+    return {
+        "steps": steps,
+        "wall_s": wall,
+        "timers": timers,
+        "solver_iter": {"mean": float(niter.mean()), "max": int(niter.max())},
+        "nefc": {"mean": float(nefc.mean()), "max": int(nefc.max())},
+        "ncon": {"mean": float(ncon.mean()), "max": int(ncon.max())},
+        "constraints_by_type": {k: v / steps for k, v in by_type.items()},
+        "constraints_by_feature": {k: v / steps for k, v in by_feature.items()},
+        "warnings": warnings,
+    }
+
+def print_report(model, report):
+    print(f"Model: nq={model.nq} nv={model.nv} nbody={model.nbody} ngeom={model.ngeom} "
+          f"neq={model.neq} ntendon={model.ntendon} nu={model.nu} timestep={model.opt.timestep}")
+
+    print("\n--- Static Cost per Feature ---")
+    print(f"  {'feature':<18}{'dof':>6}{'equality':>10}{'tendon':>8}{'actuator':>10}")
+    for feature, row in sorted(model_breakdown(model).items()):
+        print(f"  {feature:<18}{row['dof']:>6}{row['equality']:>10}{row['tendon']:>8}{row['actuator']:>10}")
+
+    steps = report["steps"]
+    step_us = report["timers"].get("step", {}).get("per_step_us", 0.0)
+    print(f"\n--- Timers ({steps} steps, avg per step) ---")
+    for label, t in sorted(report["timers"].items(), key=lambda kv: -kv[1]["per_step_us"]):
+        share = 100.0 * t["per_step_us"] / step_us if step_us > 0 else 0.0
+        print(f"  {label:<18}{t['per_step_us']:>10.1f} us  {share:5.1f}%")
+    print(f"  Realtime factor: {model.opt.timestep / (step_us * 1e-6):.1f}x" if step_us > 0 else "  Realtime factor: n/a")
+
+    s = report["solver_iter"]
+    print(f"\n--- Solver ---")
+    print(f"  Iterations/step: mean {s['mean']:.2f}, max {s['max']} (limit {model.opt.iterations})")
+    print(f"  Active constraint rows: mean {report['nefc']['mean']:.1f}, max {report['nefc']['max']}")
+    print(f"  Contacts: mean {report['ncon']['mean']:.1f}, max {report['ncon']['max']}")
+
+    print("\n--- Active Constraint Rows by Type (avg per step) ---")
+    for label, n in sorted(report["constraints_by_type"].items(), key=lambda kv: -kv[1]):
+        print(f"  {label:<22}{n:>8.1f}")
+
+    print("\n--- Active Constraint Rows by Feature (avg per step) ---")
+    total = sum(report["constraints_by_feature"].values()) or 1.0
+    for label, n in sorted(report["constraints_by_feature"].items(), key=lambda kv: -kv[1]):
+        print(f"  {label:<22}{n:>8.1f}  {100.0 * n / total:5.1f}%")
+
+    if report["warnings"]:
+        print("\n--- Warnings ---")
+        for label, n in report["warnings"].items():
+            print(f"  {label}: {n}")
+        if any(k.startswith("bad") for k in report["warnings"]):
+            print("  Simulation was reset by MuJoCo during the run, timer totals only cover steps after the last reset.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile a generated MuJoCo scene headless.")
+    parser.add_argument("scene", nargs="?", default=DEFAULT_SCENE)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"Loading model from {args.scene}")
+    model = mujoco.MjModel.from_xml_path(args.scene)
+    data = mujoco.MjData(model)
+    report = profile_model(model, data, steps=args.steps, warmup=args.warmup)
+    print_report(model, report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import functools
+import math
+
+# Level-of-Detail Ring Geometry for the gyroscope assembly
+# (generate_mjcf.py, generate_mjcf_interconnected.py, igenerate_mjcf.py)
+#
+# LOD Levels:
+#   "high"     - 2 x seg capsules per ring, colliding and visible (original geometry)
+#   "low"      - 2 x proxy_seg capsules as collision proxy (hidden, group 3) plus one
+#                high-detail tube mesh per ring, visual only (no contacts, no mass)
+#   "headless" - collision proxy only, visible, no mesh (cheapest, for training)
+#
+# Ring mass is preserved across levels (proxy capsules carry the full ring mass).
+# Meshes are built once per distinct ring and reused, the vertex/face data is
+# emitted inline in <asset> so no mesh files or meshdir handling is needed.
+RING_LOD = ("high", "low", "headless")
+
+PROXY_SEG = 4      # Capsules per arc in the collision proxy
+MESH_SIDES = 8     # Tube cross-section resolution of the visual mesh
+MESH_ARC_STEPS = 4 # Mesh samples per original capsule segment
+
+def _ring_point(radius, a, axis):
+    c, s = math.cos(a), math.sin(a)
+    if axis == 'y': return (radius*c, 0, radius*s)
+    if axis == 'x': return (0, radius*c, radius*s)
+    return (radius*c, radius*s, 0)
+
+def _ring_normal(axis):
+    # Oriented so (radial, normal, arc direction) has the same handedness for every axis
+    if axis == 'y': return (0, -1, 0)
+    if axis == 'x': return (1, 0, 0)
+    return (0, 0, 1)
+
+def _arc_starts(gap):
+    return [gap, math.pi + gap]
+
+def capsule_arcs(radius, color, thickness, axis, phase, seg, gap, mass, geom_attrs, extra=""):
+    g = ""
+    for start in _arc_starts(gap):
+        for i in range(seg):
+            a1 = start + i * (math.pi - 2*gap)/seg + phase
+            a2 = start + (i+1) * (math.pi - 2*gap)/seg + phase
+            p1 = _ring_point(radius, a1, axis)
+            p2 = _ring_point(radius, a2, axis)
+            g += '        <geom type="capsule" fromto="{:.4f} {:.4f} {:.4f} {:.4f} {:.4f} {:.4f}" size="{}" rgba="{}" mass="{}" {}{}/>\n'.format(
+                p1[0], p1[1], p1[2], p2[0], p2[1], p2[2], thickness, color, mass, geom_attrs, extra
+            )
+    return g
+
+@functools.lru_cache(maxsize=None)
+def ring_mesh_data(radius, thickness, axis, phase, seg, gap):
+    # Closed tube mesh (two arcs with end caps), returns MJCF vertex/face strings
+    n = seg * MESH_ARC_STEPS
+    nx, ny, nz = _ring_normal(axis)
+    verts = []
+    faces = []
+    for start in _arc_starts(gap):
+        base = len(verts)
+        for i in range(n + 1):
+            a = start + i * (math.pi - 2*gap)/n + phase
+            cx, cy, cz = _ring_point(radius, a, axis)
+            rx, ry, rz = cx/radius, cy/radius, cz/radius
+            for k in range(MESH_SIDES):
+                t = 2*math.pi*k/MESH_SIDES
+                ct, st = math.cos(t), math.sin(t)
+                verts.append((cx + thickness*(ct*rx + st*nx),
+                              cy + thickness*(ct*ry + st*ny),
+                              cz + thickness*(ct*rz + st*nz)))
+        # Tube side
+        for i in range(n):
+            for k in range(MESH_SIDES):
+                a0 = base + i*MESH_SIDES + k
+                a1 = base + i*MESH_SIDES + (k + 1) % MESH_SIDES
+                b0 = a0 + MESH_SIDES
+                b1 = a1 + MESH_SIDES
+                faces.append((a0, b1, a1))
+                faces.append((a0, b0, b1))
+        # End caps (fan around the arc end centers)
+        for i, flip in ((0, True), (n, False)):
+            a = start + i * (math.pi - 2*gap)/n + phase
+            center = len(verts)
+            verts.append(_ring_point(radius, a, axis))
+            for k in range(MESH_SIDES):
+                v0 = base + i*MESH_SIDES + k
+                v1 = base + i*MESH_SIDES + (k + 1) % MESH_SIDES
+                faces.append((center, v1, v0) if flip else (center, v0, v1))
+
+    vertex = " ".join(f"{x:.5f} {y:.5f} {z:.5f}" for x, y, z in verts)
+    face = " ".join(f"{a} {b} {c}" for a, b, c in faces)
+    return vertex, face
+
+class RingLOD:
+    # Collects the ring geoms of one generator run and the <mesh> assets they need
+    def __init__(self, lod="high"):
+        if lod not in RING_LOD:
+            raise ValueError(f"Unknown ring LOD '{lod}', expected one of {RING_LOD}")
+        self.lod = lod
+        self.mesh_names = {}
+        self.xml_asset = ""
+
+    def mesh_name(self, radius, thickness, axis, phase, seg, gap):
+        key = (radius, thickness, axis, phase, seg, gap)
+        if key not in self.mesh_names:
+            name = f"gyro_ring_mesh_{len(self.mesh_names)}"
+            vertex, face = ring_mesh_data(*key)
+            self.mesh_names[key] = name
+            self.xml_asset += f'    <mesh name="{name}" vertex="{vertex}" face="{face}"/>\n'
+        return self.mesh_names[key]
+
+    def geoms(self, radius, color, thickness, axis='z', phase=0, seg=16, gap=0.2, mass=0.1, geom_attrs=""):
+        if self.lod == "high":
+            return capsule_arcs(radius, color, thickness, axis, phase, seg, gap, mass, geom_attrs)
+
+        proxy_mass = mass * seg / PROXY_SEG
+        if self.lod == "headless":
+            return capsule_arcs(radius, color, thickness, axis, phase, PROXY_SEG, gap, proxy_mass, geom_attrs)
+
+        # Low: hidden collision proxy + visual-only mesh
+        g = capsule_arcs(radius, color, thickness, axis, phase, PROXY_SEG, gap, proxy_mass, geom_attrs, extra=' group="3"')
+        name = self.mesh_name(radius, thickness, axis, phase, seg, gap)
+        g += f'        <geom type="mesh" mesh="{name}" rgba="{color}" mass="0" contype="0" conaffinity="0" group="1"/>\n'
+        return g
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mujoco
+import numpy as np
+
+# What-if Rollouts (main_puppet.py)
+# Clones the live state (mj_getState) and runs B candidate control sequences on a
+# thread pool, each worker on its own MjData. The live simulation is never touched
+# and keeps stepping; mj_step releases the GIL so candidates run on separate cores.
+#
+# Request:
+#   {"type": "rollout", "id": 7,
+#    "controls": [[[...n_action], ...T], ...B],   normalized piston targets 0..1 per control step
+#    "nstep": 10,                                  physics steps per control step (held)
+#    "every": 1,                                   keep every Nth node sample in the reply
+#    "target": {"body": "node_3", "pos": [x, y, z]},  optional cost term
+#    "effort_weight": 0.0}
+# Reply:
+#   {"type": "rollout", "id": 7, "time": t0, "dt": nstep * timestep, "nodes": [names],
+#    "results": [{"nodes": [T'][n_nodes][3], "cost": c, "final_dist": d, "diverged": false}, ...B],
+#    "best": index of the lowest cost candidate (null when all diverged), "elapsed_ms": ...}
+# A diverged candidate has "cost": null (JSON has no Infinity).
+#
+# Cost = mean squared distance of target body to target pos + effort_weight * mean (ctrl - start ctrl)^2
+
+MAX_BATCH = 64
+MAX_SEQUENCE_STEPS = 20000 # nstep * T per candidate
+
+class RolloutPool:
+    def __init__(self, model, apply_targets, workers=None, node_prefix="node_"):
+        # apply_targets(data, targets): maps normalized piston targets to data.ctrl
+        self.model = model
+        self.apply_targets = apply_targets
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rollout")
+        self._local = threading.local()
+        self.spec = mujoco.mjtState.mjSTATE_INTEGRATION
+        self.state_size = mujoco.mj_stateSize(model, self.spec)
+
+        self.node_names = []
+        self.node_ids = []
+        for b in range(model.nbody):
+            name = mujoco.mj_id2name(model, mujoco.mjtObj.mjOBJ_BODY, b)
+            if name and name.startswith(node_prefix):
+                self.node_names.append(name)
+                self.node_ids.append(b)
+
+    def snapshot(self, data):
+        # Called on the simulation thread between steps
+        state = np.empty(self.state_size)
+        mujoco.mj_getState(self.model, data, state, self.spec)
+        return state
+
+    def _data(self):
+        # One MjData per worker thread, reused across requests
+        d = getattr(self._local, "data", None)
+        if d is None:
+            d = self._local.data = mujoco.MjData(self.model)
+        return d
+
+    def run_one(self, state, controls, nstep, every, target_id, target_pos, effort_weight):
+        m = self.model
+        d = self._data()
+        mujoco.mj_setState(m, d, state, self.spec)
+        ctrl0 = d.ctrl.copy()
+        t0 = d.time
+        d.warning[mujoco.mjtWarning.mjWARN_BADQACC].number = 0 # Per-thread MjData, counts from earlier requests
+
+        samples = []
+        dist_sq = []
+        effort = []
+        diverged = False
+        for k, targets in enumerate(controls):
+            self.apply_targets(d, targets)
+            mujoco.mj_step(m, d, nstep)
+            # MuJoCo resets the data on instability (time jumps back, unless t0 was 0)
+            if d.time < t0 or d.warning[mujoco.mjtWarning.mjWARN_BADQACC].number or not np.isfinite(d.qpos).all():
+                diverged = True
+                break
+            if k % every == 0:
+                samples.append(d.xpos[self.node_ids].tolist())
+            if target_id >= 0:
+                dist_sq.append(float(np.sum((d.xpos[target_id] - target_pos) ** 2)))
+            effort.append(float(np.mean((d.ctrl - ctrl0) ** 2)) if m.nu else 0.0)
+
+        cost = (np.mean(dist_sq) if dist_sq else 0.0) + effort_weight * (np.mean(effort) if effort else 0.0)
+        return {
+            "nodes": samples,
+            "cost": None if diverged else float(cost),
+            "final_dist": float(np.sqrt(dist_sq[-1])) if dist_sq else None,
+            "diverged": diverged,
+        }
+
+    def prepare(self, data, msg):
+        # Validate and snapshot, synchronous so the caller can hold its lock only for this.
+        # -> job for run()
+        start = time.perf_counter()
+        controls = msg.get("controls") or []
+        nstep = int(msg.get("nstep", 1))
+        every = max(1, int(msg.get("every", 1)))
+        if not 1 <= len(controls) <= MAX_BATCH:
+            raise ValueError(f"controls must hold 1..{MAX_BATCH} candidate sequences, got {len(controls)}")
+        longest = max(len(seq) for seq in controls)
+        if nstep < 1 or nstep * longest > MAX_SEQUENCE_STEPS:
+            raise ValueError(f"nstep * sequence length must be in [1, {MAX_SEQUENCE_STEPS}]")
+
+        target_id, target_pos = -1, None
+        target = msg.get("target")
+        if target:
+            target_id = mujoco.mj_name2id(self.model, mujoco.mjtObj.mjOBJ_BODY, target.get("body", ""))
+            if target_id < 0:
+                raise ValueError(f"Unknown target body '{target.get('body')}'")
+            target_pos = np.asarray(target.get("pos", [0, 0, 0]), dtype=np.float64)
+        effort_weight = float(msg.get("effort_weight", 0.0))
+
+        return {
+            "start": start, "time": data.time, "state": self.snapshot(data), "id": msg.get("id"),
+            "controls": [np.clip(np.asarray(seq, dtype=np.float64), 0.0, 1.0) for seq in controls],
+            "args": (nstep, every, target_id, target_pos, effort_weight),
+        }
+
+    async def run(self, job):
+        # Candidates on the worker pool, the live state is no longer needed here
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, self.run_one, job["state"], seq, *job["args"])
+            for seq in job["controls"]
+        ])
+
+        reply = {
+            "type": "rollout",
+            "time": job["time"],
+            "dt": job["args"][0] * self.model.opt.timestep,
+            "nodes": self.node_names,
+            "results": results,
+            "best": min((i for i, r in enumerate(results) if not r["diverged"]), key=lambda i: results[i]["cost"], default=None),
+            "elapsed_ms": (time.perf_counter() - job["start"]) * 1e3,
+        }
+        if job["id"] is not None:
+            reply["id"] = job["id"]
+        return reply
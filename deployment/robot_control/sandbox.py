@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mujoco
+
+# Private Sandboxes (main_puppet.py)
+# All clients share the master MjData, so one piston_move moves the puppet for everyone.
+# A client can fork a private copy of the current master state (mj_copyData) and play
+# with it alone: its piston_move / node_pose messages then go to the sandbox and it
+# receives the sandbox's state frames instead of the master's. Sandboxes step in the
+# same loop as the master (same batch, same pacing), on a thread pool since mj_step
+# releases the GIL.
+#
+#   {"type": "sandbox", "enable": true}    fork (again) from the master -> {"type": "sandbox", "enabled": true, "sandbox": k, "time": t}
+#   {"type": "sandbox", "enable": false}   back to the shared simulation
+#   {"type": "sandbox"}                    pool report: per sandbox cpu % and memory
+#
+# The MjData objects share the one MjModel. They are allocated on the first fork that
+# needs one (tens of MB each for the puppet) and reused after release:
+#   --sandboxes 4          (SANDBOXES)       pool size, 0 disables
+#   --sandbox-idle 300     (SANDBOX_IDLE)    seconds without a message before a sandbox is reclaimed
+# State frames from a sandbox carry "sandbox": k, and "ack": <seq> after a piston_move with
+# "seq" took effect. Timed piston_move ("t" / "sim_time") is rejected in a sandbox; the
+# jitter buffer, latency stats, history, lockstep and rollouts only serve the master.
+
+DEFAULT_SIZE = 4
+DEFAULT_IDLE = 300.0
+EVICT_CHECK_INTERVAL = 1.0 # Wall seconds between idle scans
+
+def sandbox_options(argv=None):
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--sandboxes", type=int, default=int(os.environ.get("SANDBOXES", DEFAULT_SIZE)))
+    parser.add_argument("--sandbox-idle", type=float, default=float(os.environ.get("SANDBOX_IDLE", DEFAULT_IDLE)))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return {"size": args.sandboxes, "idle_timeout": args.sandbox_idle}
+
+class Sandbox:
+    def __init__(self, index, data):
+        self.index = index
+        self.data = data
+        self.owner = None
+        self.targets = []
+        self.forked_at = 0.0 # Wall clock
+        self.last_active = 0.0
+        self.steps = 0
+        self.pending_ack = None # seq of the last piston_move, acked once a step applied it
+        self.ack = None
+        self.cpu_s = 0.0 # Thread CPU time spent stepping since the fork
+        self._window = (0.0, 0.0) # (wall, cpu_s) at the last report
+
+    def memory_bytes(self):
+        # Fixed arrays + arena/stack, allocated once per MjData
+        return self.data.nbuffer + self.data.narena
+
+    def info(self):
+        now = time.monotonic()
+        then, cpu_then = self._window
+        self._window = (now, self.cpu_s)
+        return {
+            "sandbox": self.index,
+            "time": self.data.time,
+            "steps": self.steps,
+            "age_s": now - self.forked_at,
+            "idle_s": now - self.last_active,
+            "cpu_percent": 100.0 * (self.cpu_s - cpu_then) / (now - then) if now > then else 0.0,
+            "cpu_s": self.cpu_s,
+            "memory_mb": self.memory_bytes() / 1e6,
+            "arena_used_mb": self.data.maxuse_arena / 1e6,
+        }
+
+class SandboxPool:
+    def __init__(self, model, apply_targets, size=DEFAULT_SIZE, idle_timeout=DEFAULT_IDLE, workers=None):
+        # apply_targets(data, targets): maps normalized piston targets to data.ctrl
+        self.model = model
+        self.apply_targets = apply_targets
+        self.idle_timeout = idle_timeout
+        self.size = size
+        self.sandboxes = [] # Allocated so far, at most size
+        self.free = []
+        self.by_client = {}
+        self.workers = workers or max(1, min(size, os.cpu_count() or 1))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sandbox")
+        # Held while sandboxes step on the pool, so forks and releases never touch a
+        # MjData that a worker thread is still stepping
+        self.lock = asyncio.Lock()
+        self._last_check = time.monotonic()
+
+    def __len__(self):
+        return len(self.by_client)
+
+    def get(self, client):
+        return self.by_client.get(client)
+
+    def touch(self, client):
+        sandbox = self.by_client.get(client)
+        if sandbox is not None:
+            sandbox.last_active = time.monotonic()
+        return sandbox
+
+    def fork(self, client, master, targets):
+        # Copy of the master state and piston targets; forking again resets the same sandbox
+        sandbox = self.by_client.get(client)
+        if sandbox is None:
+            if self.free:
+                sandbox = self.free.pop()
+            elif len(self.sandboxes) < self.size:
+                sandbox = Sandbox(len(self.sandboxes), mujoco.MjData(self.model))
+                self.sandboxes.append(sandbox)
+            else:
+                raise ValueError(f"All {self.size} sandboxes are in use")
+            sandbox.owner = client
+            self.by_client[client] = sandbox
+        mujoco.mj_copyData(sandbox.data, self.model, master)
+        sandbox.targets = list(targets)
+        sandbox.forked_at = sandbox.last_active = time.monotonic()
+        sandbox.steps = 0
+        sandbox.pending_ack = sandbox.ack = None
+        sandbox.cpu_s = 0.0
+        sandbox._window = (sandbox.forked_at, 0.0)
+        return sandbox
+
+    def release(self, client):
+        sandbox = self.by_client.pop(client, None)
+        if sandbox is None:
+            return False
+        sandbox.owner = None
+        self.free.append(sandbox)
+        return True
+
+    def set_targets(self, client, msg):
+        # piston_move for a sandboxed client; False if the client has no sandbox
+        sandbox = self.by_client.get(client)
+        if sandbox is None:
+            return False
+        if msg.get("t") is not None or msg.get("sim_time") is not None:
+            raise ValueError("Timed piston_move (t / sim_time) is not supported in a sandbox")
+        if msg.get("seq") is not None:
+            sandbox.pending_ack = msg["seq"]
+        idx = msg.get("index")
+        val = msg.get("value")
+        if idx is not None and val is not None and 0 <= idx < len(sandbox.targets):
+            sandbox.targets[idx] = max(0.0, min(1.0, float(val)))
+        for i, v in enumerate((msg.get("values") or [])[:len(sandbox.targets)]):
+            if v is not None:
+                sandbox.targets[i] = max(0.0, min(1.0, float(v)))
+        return True
+
+    def _step_one(self, sandbox, nstep):
+        # Worker thread: thread_time only counts this sandbox's stepping
+        start = time.thread_time()
+        ack, sandbox.pending_ack = sandbox.pending_ack, None
+        self.apply_targets(sandbox.data, sandbox.targets)
+        mujoco.mj_step(self.model, sandbox.data, nstep)
+        sandbox.cpu_s += time.thread_time() - start
+        sandbox.steps += nstep
+        if ack is not None:
+            sandbox.ack = ack
+
+    async def step(self, nstep):
+        if not self.by_client:
+            return
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[loop.run_in_executor(self.executor, self._step_one, sandbox, nstep)
+                                   for sandbox in self.by_client.values()])
+
+    def frames(self, mocap=False):
+        # client -> state dict for its own frame (mocap: add the mocap poses, like the master frame)
+        frames = {}
+        for client, s in self.by_client.items():
+            frames[client] = {"time": s.data.time, "qpos": s.data.qpos, "sandbox": s.index}
+            if mocap:
+                frames[client].update(mocap_pos=s.data.mocap_pos, mocap_quat=s.data.mocap_quat)
+            if s.ack is not None:
+                frames[client]["ack"] = s.ack
+                s.ack = None
+        return frames
+
+    def evict_idle(self):
+        # -> clients whose sandbox was reclaimed (checked at most once per EVICT_CHECK_INTERVAL)
+        now = time.monotonic()
+        if self.idle_timeout <= 0 or now - self._last_check < EVICT_CHECK_INTERVAL:
+            return []
+        self._last_check = now
+        idle = [c for c, s in self.by_client.items() if now - s.last_active > self.idle_timeout]
+        for client in idle:
+            self.release(client)
+        return idle
+
+    def info(self):
+        active = [s.info() for s in self.sandboxes if s.owner is not None]
+        return {
+            "size": self.size,
+            "allocated": len(self.sandboxes),
+            "free": self.size - len(self.by_client),
+            "idle_timeout": self.idle_timeout,
+            "workers": self.workers,
+            "memory_mb": sum(s.memory_bytes() for s in self.sandboxes) / 1e6,
+            "cpu_percent": sum(s["cpu_percent"] for s in active),
+            "active": active,
+        }
+
+    async def handle_message(self, client, msg, master, targets):
+        reply = {"type": "sandbox"}
+        enable = msg.get("enable")
+        async with self.lock:
+            if enable:
+                sandbox = self.fork(client, master, targets)
+                reply.update(enabled=True, sandbox=sandbox.index, time=sandbox.data.time)
+            elif enable is not None:
+                self.release(client)
+                reply["enabled"] = False
+            else:
+                reply.update(enabled=client in self.by_client, **self.info())
+        if "id" in msg:
+            reply["id"] = msg["id"]
+        return reply
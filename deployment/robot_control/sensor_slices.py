@@ -0,0 +1,81 @@
+import mujoco
+import numpy as np
+
+# Sensor Slices (main.py)
+# Resolves sensor names once at load into address ranges inside data.sensordata, so
+# reading any set of sensors is one NumPy slice (adjacent sensors) or one gather
+# instead of a data.sensor(name) lookup + copy per sensor per broadcast.
+#
+#   sensors = SensorIndex(model)
+#   imu = sensors.select(["imu-torso-angular-velocity", "imu-torso-linear-acceleration"])
+#   values = imu.read(data)                 (6,) array, one copy
+#   parts = imu.split(values)               {"imu-torso-angular-velocity": (3,), ...} views
+#
+# Full sensordata stream for IMU heavy clients (main.py):
+#   {"type": "subscribe_sensors"}    -> {"type": "sensor_layout", "nsensordata": N,
+#                                        "sensors": [{"name", "type", "adr", "dim"}, ...]}
+#   state frames then carry "sensordata" (the whole array, layout above gives offsets)
+#   {"type": "unsubscribe_sensors"}
+
+def _type_name(sensor_type):
+    # mjSENS_ACCELEROMETER -> accelerometer
+    return mujoco.mjtSensor(sensor_type).name[len("mjSENS_"):].lower()
+
+class SensorSelection:
+    def __init__(self, names, ranges):
+        self.names = list(names)
+        # Offsets of each sensor inside the values returned by read()
+        self.offsets = {}
+        pos = 0
+        for name, (adr, dim) in zip(self.names, ranges):
+            self.offsets[name] = (pos, pos + dim)
+            pos += dim
+        self.size = pos
+
+        # One slice when the sensors are adjacent in sensordata, otherwise a gather
+        index = np.concatenate([np.arange(adr, adr + dim) for adr, dim in ranges]) if ranges else np.zeros(0, dtype=int)
+        if len(index) and np.array_equal(index, np.arange(index[0], index[0] + len(index))):
+            self.index = slice(int(index[0]), int(index[0]) + len(index))
+        else:
+            self.index = index
+
+    @property
+    def contiguous(self):
+        return isinstance(self.index, slice)
+
+    def read(self, data):
+        # Copy of the selected values (slice views are copied so later steps don't change them)
+        values = data.sensordata[self.index]
+        return values.copy() if self.contiguous else values
+
+    def split(self, values):
+        return {name: values[a:b] for name, (a, b) in self.offsets.items()}
+
+class SensorIndex:
+    def __init__(self, model):
+        self.nsensordata = model.nsensordata
+        self.sensors = {}
+        for i in range(model.nsensor):
+            name = mujoco.mj_id2name(model, mujoco.mjtObj.mjOBJ_SENSOR, i) or f"sensor_{i}"
+            self.sensors[name] = {
+                "name": name,
+                "type": _type_name(model.sensor_type[i]),
+                "adr": int(model.sensor_adr[i]),
+                "dim": int(model.sensor_dim[i]),
+            }
+
+    def __len__(self):
+        return len(self.sensors)
+
+    def __contains__(self, name):
+        return name in self.sensors
+
+    def select(self, names):
+        missing = [n for n in names if n not in self.sensors]
+        if missing:
+            raise KeyError(f"Unknown sensors: {missing}")
+        return SensorSelection(names, [(self.sensors[n]["adr"], self.sensors[n]["dim"]) for n in names])
+
+    def layout(self):
+        return {"type": "sensor_layout", "nsensordata": self.nsensordata,
+                "sensors": sorted(self.sensors.values(), key=lambda s: s["adr"])}
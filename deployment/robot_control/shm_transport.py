@@ -0,0 +1,234 @@
+import argparse
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Shared-Memory Transport for co-located clients (main_puppet.py --shm)
+# One shared_memory block holds:
+#   header    - layout + index of the latest complete frame
+#   frames    - ring of `capacity` state frames (seq, time, qpos, qvel, ctrl, sensordata)
+#   commands  - one slot per mapped piston (seq, value), written by clients
+#
+# No locks: every frame and command slot carries its own sequence counter used as a
+# seqlock (odd while being written, even when complete). Readers copy and re-check the
+# counter; a mismatch means the slot was overwritten and the read is retried / skipped.
+# Relies on aligned 8 byte stores being atomic (x86-64, aarch64).
+#
+# Server:  pub = ShmStatePublisher("tensegrity_puppet", model, n_cmd=12)
+#          pub.publish(data)                    after each physics batch
+#          for idx, value in pub.poll_commands(): ...
+# Client:  c = ShmClient("tensegrity_puppet")
+#          frame = c.latest()                   dict of numpy arrays (copies) or None
+#          frames = c.read_since(seq)           all frames still in the ring after seq
+#          c.send_command(3, 0.8)
+
+MAGIC = 0x54534731 # "TSG1"
+VERSION = 1
+HEADER_WORDS = 16
+DEFAULT_NAME = "tensegrity_puppet"
+DEFAULT_CAPACITY = 256
+
+# Header word indices
+H_MAGIC, H_VERSION, H_NQ, H_NV, H_NU, H_NSENS, H_CAPACITY, H_NCMD, H_LATEST, H_FRAME_OFF, H_CMD_OFF = range(11)
+
+COMMAND_DTYPE = np.dtype([("seq", "<u8"), ("value", "<f8")])
+
+def frame_dtype(nq, nv, nu, nsens):
+    return np.dtype([
+        ("seq", "<u8"),
+        ("time", "<f8"),
+        ("qpos", "<f8", (nq,)),
+        ("qvel", "<f8", (nv,)),
+        ("ctrl", "<f8", (nu,)),
+        ("sensordata", "<f8", (nsens,)),
+    ])
+
+def _views(buf, header):
+    nq, nv, nu, nsens = (int(header[i]) for i in (H_NQ, H_NV, H_NU, H_NSENS))
+    capacity, n_cmd = int(header[H_CAPACITY]), int(header[H_NCMD])
+    frames = np.ndarray((capacity,), dtype=frame_dtype(nq, nv, nu, nsens), buffer=buf, offset=int(header[H_FRAME_OFF]))
+    commands = np.ndarray((n_cmd,), dtype=COMMAND_DTYPE, buffer=buf, offset=int(header[H_CMD_OFF]))
+    return frames, commands
+
+def shm_name_option(argv=None):
+    # --shm [NAME] or PUPPET_SHM=NAME, None when disabled
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--shm", nargs="?", const=DEFAULT_NAME, default=os.environ.get("PUPPET_SHM"))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return args.shm
+
+class ShmStatePublisher:
+    def __init__(self, name, model, n_cmd=0, capacity=DEFAULT_CAPACITY):
+        dtype = frame_dtype(model.nq, model.nv, model.nu, model.nsensordata)
+        frame_off = HEADER_WORDS * 8
+        cmd_off = frame_off + capacity * dtype.itemsize
+        size = cmd_off + max(n_cmd, 1) * COMMAND_DTYPE.itemsize
+
+        # Replace a stale block left by a crashed server
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+
+        self.header = np.ndarray((HEADER_WORDS,), dtype="<u8", buffer=self.shm.buf)
+        self.header[:] = 0
+        self.header[H_NQ], self.header[H_NV], self.header[H_NU], self.header[H_NSENS] = model.nq, model.nv, model.nu, model.nsensordata
+        self.header[H_CAPACITY], self.header[H_NCMD] = capacity, n_cmd
+        self.header[H_FRAME_OFF], self.header[H_CMD_OFF] = frame_off, cmd_off
+        self.frames, self.commands = _views(self.shm.buf, self.header)
+        self.frames["seq"] = 0
+        self.commands["seq"] = 0
+        self._last_cmd_seq = np.zeros(n_cmd, dtype=np.uint64)
+        self.count = 0
+        self.header[H_VERSION] = VERSION
+        self.header[H_MAGIC] = MAGIC # Written last: clients wait for it
+
+    def publish(self, data):
+        k = self.count
+        slot = self.frames[k % len(self.frames)]
+        slot["seq"] = 2 * k + 1 # Writing
+        slot["time"] = data.time
+        slot["qpos"] = data.qpos
+        slot["qvel"] = data.qvel
+        slot["ctrl"] = data.ctrl
+        slot["sensordata"] = data.sensordata
+        slot["seq"] = 2 * k + 2 # Complete
+        self.count = k + 1
+        self.header[H_LATEST] = self.count
+
+    def poll_commands(self):
+        # Returns [(index, value)] of slots written since the last poll (vectorized check)
+        if not len(self.commands):
+            return []
+        seq = self.commands["seq"].copy()
+        changed = np.nonzero((seq != self._last_cmd_seq) & (seq % 2 == 0))[0]
+        out = []
+        for i in changed:
+            value = float(self.commands["value"][i])
+            if self.commands["seq"][i] == seq[i]: # Not rewritten while reading
+                self._last_cmd_seq[i] = seq[i]
+                out.append((int(i), value))
+        return out
+
+    def close(self):
+        self.frames = self.commands = self.header = None
+        self.shm.close()
+        self.shm.unlink()
+
+class ShmClient:
+    def __init__(self, name=DEFAULT_NAME, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name)
+                break
+            except FileNotFoundError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        _untrack(self.shm)
+
+        self.header = np.ndarray((HEADER_WORDS,), dtype="<u8", buffer=self.shm.buf)
+        while self.header[H_MAGIC] != MAGIC:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Shared memory '{name}' was never initialized")
+            time.sleep(0.01)
+        self.frames, self.commands = _views(self.shm.buf, self.header)
+        self.capacity = len(self.frames)
+
+    @property
+    def latest_seq(self):
+        # Number of frames published so far
+        return int(self.header[H_LATEST])
+
+    def _read(self, k):
+        # Frame k (0-based) or None if it was overwritten meanwhile
+        slot = self.frames[k % self.capacity]
+        expected = 2 * k + 2
+        if slot["seq"] != expected:
+            return None
+        frame = {"seq": k + 1, "time": float(slot["time"]), "qpos": slot["qpos"].copy(), "qvel": slot["qvel"].copy(),
+                 "ctrl": slot["ctrl"].copy(), "sensordata": slot["sensordata"].copy()}
+        if slot["seq"] != expected:
+            return None
+        return frame
+
+    def latest(self):
+        n = self.latest_seq
+        for _ in range(3):
+            if n == 0:
+                return None
+            frame = self._read(n - 1)
+            if frame is not None:
+                return frame
+            n = self.latest_seq
+        return None
+
+    def latest_view(self):
+        # Zero-copy: structured view of the newest slot. Valid until the writer wraps
+        # around the ring (capacity frames later); check view["seq"] after use.
+        n = self.latest_seq
+        return None if n == 0 else self.frames[(n - 1) % self.capacity]
+
+    def read_since(self, seq):
+        # Frames with seq > `seq` still in the ring (loggers); older ones are lost
+        n = self.latest_seq
+        start = max(seq, n - self.capacity + 1)
+        out = []
+        for k in range(start, n):
+            frame = self._read(k)
+            if frame is not None:
+                out.append(frame)
+        return out
+
+    def wait_next(self, seq, timeout=1.0, spin=0.0001):
+        # Block until a frame newer than `seq` exists
+        deadline = time.monotonic() + timeout
+        while self.latest_seq <= seq:
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(spin)
+        return self.latest()
+
+    def send_command(self, index, value):
+        # Single writer per slot: one client should own each index
+        slot = self.commands[index]
+        s = int(slot["seq"])
+        s += 1 if s % 2 == 0 else 0
+        slot["seq"] = s # Odd: writing
+        slot["value"] = value
+        slot["seq"] = s + 1
+
+    def close(self):
+        self.frames = self.commands = self.header = None
+        self.shm.close()
+
+def _untrack(shm):
+    # Attaching registers the block with this process' resource tracker, which would
+    # unlink it when the client exits (Python < 3.13). The server owns the block.
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+if __name__ == "__main__":
+    # Tail the live state: python deployment/robot_control/shm_transport.py
+    client = ShmClient(DEFAULT_NAME)
+    print(f"Attached to '{DEFAULT_NAME}': {client.capacity} frame ring, {len(client.commands)} command slots")
+    seq = client.latest_seq
+    while True:
+        frame = client.wait_next(seq, timeout=5.0)
+        if frame is None:
+            print("No frames for 5 s")
+            continue
+        if frame["seq"] // 60 != seq // 60:
+            print(f"seq {frame['seq']} time {frame['time']:.3f} qpos[:3] {np.round(frame['qpos'][:3], 3)}")
+        seq = frame["seq"]
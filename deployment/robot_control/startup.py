@@ -0,0 +1,117 @@
+import hashlib
+import os
+import sys
+import time
+
+# Fast-Start Helpers for the simulation servers (main.py, main_puppet.py)
+#
+# Import this module before mujoco so the timer covers the heavy imports.
+#   - StartupTimer: import / compile / socket ready / first step report with a budget
+#   - headless_requested(): --headless, MUJOCO_HEADLESS=1, or no display on Linux.
+#     In that case mujoco.viewer is never imported and launch_passive never probed.
+#   - load_model(): compiled model cache (.mjb). Autoscaled workers only pay the XML
+#     compile (mesh processing) once per model version.
+#
+# Env:
+#   MUJOCO_HEADLESS=1           skip the native viewer
+#   MUJOCO_MODEL_CACHE=0        disable the .mjb cache
+#   MUJOCO_MODEL_CACHE_DIR=...  cache location (default: .mjb_cache next to the XML)
+#   STARTUP_BUDGET_MS=1000      report warns when startup exceeds this
+
+DEFAULT_BUDGET_MS = 1000.0
+
+class StartupTimer:
+    def __init__(self, budget_ms=None):
+        self.t0 = time.perf_counter()
+        self.marks = []
+        if budget_ms is None:
+            budget_ms = float(os.environ.get("STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS))
+        self.budget_ms = budget_ms
+        self.reported = False
+
+    def mark(self, label):
+        self.marks.append((label, time.perf_counter()))
+
+    def total_ms(self):
+        return (self.marks[-1][1] - self.t0) * 1e3 if self.marks else 0.0
+
+    def report(self):
+        # Printed once, after the last mark
+        if self.reported:
+            return
+        self.reported = True
+        print("--- Startup ---")
+        prev = self.t0
+        for label, t in self.marks:
+            print(f"  {label:<14}{(t - prev) * 1e3:8.1f} ms   (t={(t - self.t0) * 1e3:7.1f} ms)")
+            prev = t
+        total = self.total_ms()
+        status = "OK" if total <= self.budget_ms else "OVER BUDGET"
+        print(f"  {'total':<14}{total:8.1f} ms   budget {self.budget_ms:.0f} ms [{status}]")
+
+def headless_requested(argv=None):
+    argv = sys.argv if argv is None else argv
+    if "--headless" in argv or os.environ.get("MUJOCO_HEADLESS", "0") == "1":
+        return True
+    # No display server: launch_passive would only fail (slowly)
+    if sys.platform.startswith("linux") and not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")):
+        return True
+    return False
+
+def launch_viewer(model, data, headless):
+    # Returns a passive viewer or None. The viewer module is only imported when needed.
+    if headless:
+        print("Running Headless (viewer skipped).")
+        return None
+    try:
+        import mujoco.viewer
+        viewer = mujoco.viewer.launch_passive(model, data)
+        print("Native Viewer Launched.")
+        return viewer
+    except Exception:
+        print("Running Headless (Viewer launch failed).")
+        return None
+
+def _cache_key(xml_path):
+    # XML content + MuJoCo version + size/mtime of everything next to it (includes, meshes)
+    import mujoco
+    h = hashlib.sha1()
+    h.update(mujoco.__version__.encode())
+    with open(xml_path, "rb") as f:
+        h.update(f.read())
+    root = os.path.dirname(os.path.abspath(xml_path))
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != ".mjb_cache")
+        for name in sorted(filenames):
+            st = os.stat(os.path.join(dirpath, name))
+            h.update(f"{os.path.relpath(os.path.join(dirpath, name), root)}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()[:16]
+
+def load_model(xml_path, use_cache=None):
+    # Returns (model, source) with source "mjb" (cache hit) or "xml"
+    import mujoco
+    if use_cache is None:
+        use_cache = os.environ.get("MUJOCO_MODEL_CACHE", "1") != "0"
+    if not use_cache:
+        return mujoco.MjModel.from_xml_path(xml_path), "xml"
+
+    cache_dir = os.environ.get("MUJOCO_MODEL_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(xml_path)), ".mjb_cache")
+    base = os.path.splitext(os.path.basename(xml_path))[0]
+    mjb_path = os.path.join(cache_dir, f"{base}-{_cache_key(xml_path)}.mjb")
+
+    if os.path.exists(mjb_path):
+        try:
+            return mujoco.MjModel.from_binary_path(mjb_path), "mjb"
+        except Exception as e:
+            print(f"Model cache unreadable ({e}), recompiling.")
+
+    model = mujoco.MjModel.from_xml_path(xml_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{mjb_path}.{os.getpid()}.tmp"
+        mujoco.mj_saveModel(model, tmp_path, None)
+        os.replace(tmp_path, mjb_path) # Atomic, several workers may start at once
+        print(f"Cached compiled model: {mjb_path}")
+    except OSError as e:
+        print(f"Could not write model cache ({e}).")
+    return model, "xml"
@@ -0,0 +1,153 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from sensor_slices import SensorIndex
+
+# State History (main.py, main_puppet.py)
+# Fixed-size ring of the physics state, recorded every 1/hz of sim time, so a client
+# that connects late can still plot the last minute without recording it itself.
+#
+#   --history-seconds 60   (HISTORY_SECONDS)   ring length, 0 disables
+#   --history-hz 50        (HISTORY_HZ)        sample rate in sim time
+#
+# Query:
+#   {"type": "history", "channels": ["qpos", "imu-torso-angular-velocity"],
+#    "t0": 10.0, "t1": 40.0,         sim time range (defaults: everything)
+#    "last": 30.0,                   or the most recent 30 s instead of t0/t1
+#    "points": 500,                  downsample to at most this many points
+#    "mode": "mean", "id": 3}        mean | sample | minmax
+#   -> {"type": "history", "id": 3, "count": raw samples in range, "time": [...],
+#       "qpos": [[...], ...], ...}      minmax: "<channel>": {"min": [...], "max": [...]}
+# Channels are data fields (FIELDS) or sensor names (columns of sensordata).
+# MuJoCo resetting the state (time jumping back) starts a new history.
+
+FIELDS = ("qpos", "qvel", "ctrl", "sensordata")
+MODES = ("mean", "sample", "minmax")
+DEFAULT_SECONDS = 60.0
+DEFAULT_HZ = 50.0
+
+def history_options(argv=None):
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--history-seconds", type=float, default=float(os.environ.get("HISTORY_SECONDS", DEFAULT_SECONDS)))
+    parser.add_argument("--history-hz", type=float, default=float(os.environ.get("HISTORY_HZ", DEFAULT_HZ)))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return {"seconds": args.history_seconds, "hz": args.history_hz}
+
+class StateHistory:
+    def __init__(self, model, seconds=DEFAULT_SECONDS, hz=DEFAULT_HZ):
+        self.period = 1.0 / hz
+        self.capacity = max(1, int(round(seconds * hz)))
+        self.sensors = SensorIndex(model)
+        widths = {"qpos": model.nq, "qvel": model.nv, "ctrl": model.nu, "sensordata": model.nsensordata}
+
+        # One row per sample: [qpos | qvel | ctrl | sensordata]
+        self.columns = {}
+        col = 0
+        for field in FIELDS:
+            self.columns[field] = (col, col + widths[field])
+            col += widths[field]
+        self.time = np.zeros(self.capacity)
+        self.rows = np.zeros((self.capacity, col))
+        self.count = 0 # Samples written since the last clear
+        self.next_time = None
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def memory_bytes(self):
+        return self.time.nbytes + self.rows.nbytes
+
+    def clear(self):
+        self.count = 0
+        self.next_time = None
+
+    def record(self, data):
+        # Call after each physics batch; keeps one sample per period of sim time
+        t = data.time
+        if self.count and t < self.time[(self.count - 1) % self.capacity]:
+            self.clear() # State was reset
+        if self.next_time is not None and t < self.next_time - 1e-9:
+            return
+        # Stay on the sample grid when batches don't divide the period evenly
+        if self.next_time is None or t - self.next_time > self.period:
+            self.next_time = t
+        self.next_time += self.period
+        k = self.count % self.capacity
+        self.time[k] = t
+        row = self.rows[k]
+        for field in FIELDS:
+            a, b = self.columns[field]
+            row[a:b] = getattr(data, field)
+        self.count += 1
+
+    def _columns(self, channel):
+        if channel in self.columns:
+            return self.columns[channel]
+        sensor = self.sensors.sensors.get(channel)
+        if sensor is None:
+            raise ValueError(f"Unknown channel '{channel}', expected one of {FIELDS} or a sensor name")
+        start = self.columns["sensordata"][0] + sensor["adr"]
+        return start, start + sensor["dim"]
+
+    def ordered(self):
+        # Ring indices oldest -> newest
+        n = len(self)
+        return np.arange(self.count - n, self.count) % self.capacity
+
+    def query(self, msg):
+        channels = msg.get("channels") or ["qpos"]
+        mode = msg.get("mode", "mean")
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+        points = int(msg.get("points", 500))
+        if points < 1:
+            raise ValueError("points must be >= 1")
+        spans = [self._columns(ch) for ch in channels]
+
+        idx = self.ordered()
+        times = self.time[idx]
+        if msg.get("last") is not None and len(times):
+            t0, t1 = times[-1] - float(msg["last"]), np.inf
+        else:
+            t0 = float(msg["t0"]) if msg.get("t0") is not None else -np.inf
+            t1 = float(msg["t1"]) if msg.get("t1") is not None else np.inf
+        lo, hi = np.searchsorted(times, t0, "left"), np.searchsorted(times, t1, "right")
+        idx, times = idx[lo:hi], times[lo:hi]
+        count = len(idx)
+
+        reply = {"type": "history", "count": count, "mode": mode}
+        if count <= points:
+            # Few enough samples: send them as recorded
+            reply["time"] = times.tolist()
+            for ch, (a, b) in zip(channels, spans):
+                values = self.rows[idx, a:b].tolist()
+                reply[ch] = {"min": values, "max": values} if mode == "minmax" else values
+        else:
+            # Split into `points` contiguous bins, reduce each bin in one reduceat call
+            starts = np.linspace(0, count, points + 1).astype(int)[:-1]
+            sizes = np.diff(np.append(starts, count))[:, None]
+            if mode == "sample":
+                reply["time"] = times[starts].tolist()
+            else:
+                reply["time"] = (np.add.reduceat(times, starts) / sizes[:, 0]).tolist()
+            for ch, (a, b) in zip(channels, spans):
+                values = self.rows[idx, a:b]
+                if mode == "mean":
+                    reply[ch] = (np.add.reduceat(values, starts, axis=0) / sizes).tolist()
+                elif mode == "sample":
+                    reply[ch] = values[starts].tolist()
+                else:
+                    reply[ch] = {"min": np.minimum.reduceat(values, starts, axis=0).tolist(),
+                                 "max": np.maximum.reduceat(values, starts, axis=0).tolist()}
+        if "id" in msg:
+            reply["id"] = msg["id"]
+        return reply
+
+    def info(self):
+        times = self.time[self.ordered()]
+        return {"samples": len(self), "capacity": self.capacity, "hz": 1.0 / self.period,
+                "range": [float(times[0]), float(times[-1])] if len(times) else None,
+                "mb": self.memory_bytes() / 1e6}
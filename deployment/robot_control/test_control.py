@@ -1,7 +1,11 @@
 import asyncio
+import argparse
 import websockets
 import json
 import random
+import time
+
+import numpy as np
 
 async def test_control():
     uri = "ws://127.0.0.1:8766"
@@ -30,5 +34,58 @@ async def test_control():
     except Exception as e:
         print(f"Connection Failed: {e}")
 
+async def test_latency(samples, interval):
+    # Round trip: piston_move with "seq" -> first state frame carrying "ack" >= seq (see latency.py)
+    uri = "ws://127.0.0.1:8766"
+    print(f"Measuring control -> state latency on {uri} ({samples} samples)...")
+    try:
+        async with websockets.connect(uri) as websocket:
+            sent_at = {}
+            rtts = []
+
+            async def receive():
+                async for message in websocket:
+                    if not isinstance(message, str):
+                        continue
+                    msg = json.loads(message)
+                    if msg.get("type") == "latency":
+                        return msg
+                    ack = msg.get("ack")
+                    if ack is None:
+                        continue
+                    now = time.perf_counter()
+                    # One frame can acknowledge several controls
+                    for seq in [s for s in sent_at if s <= ack]:
+                        rtts.append((now - sent_at.pop(seq)) * 1e3)
+
+            receiver = asyncio.ensure_future(receive())
+            for seq in range(1, samples + 1):
+                sent_at[seq] = time.perf_counter()
+                msg = {"type": "piston_move", "index": seq % 12, "value": random.random(), "seq": seq}
+                await websocket.send(json.dumps(msg))
+                await asyncio.sleep(interval)
+            await asyncio.sleep(0.5) # Let the last acks arrive
+            await websocket.send(json.dumps({"type": "latency"}))
+            server = await asyncio.wait_for(receiver, timeout=5.0)
+
+            if not rtts:
+                print("No acknowledged controls (server without latency support?)")
+                return
+            p50, p90, p99 = np.percentile(rtts, [50, 90, 99])
+            print(f"Round trip ({len(rtts)}/{samples} acked): p50 {p50:.2f} ms | p90 {p90:.2f} ms | p99 {p99:.2f} ms | max {max(rtts):.2f} ms")
+            print("Server stages:")
+            for stage, p in server["stages"].items():
+                if p["count"]:
+                    print(f"  {stage:<8} p50 {p['p50']:8.2f} ms | p90 {p['p90']:8.2f} ms | p99 {p['p99']:8.2f} ms | max {p['max']:8.2f} ms")
+    except Exception as e:
+        print(f"Connection Failed: {e}")
+
 if __name__ == "__main__":
-    asyncio.run(test_control())
+    parser = argparse.ArgumentParser(description="Drive the puppet pistons over WebSocket.")
+    parser.add_argument("--latency", type=int, default=0, metavar="N", help="Measure round trip latency with N sequenced controls")
+    parser.add_argument("--interval", type=float, default=0.01, help="Seconds between latency probes")
+    args = parser.parse_args()
+    if args.latency:
+        asyncio.run(test_latency(args.latency, args.interval))
+    else:
+        asyncio.run(test_control())
@@ -0,0 +1,43 @@
+import os
+
+import mujoco
+import numpy as np
+import pytest
+
+from generate_from_mesh import DEFAULT_WELD_TOL, generate_scene_from_mesh, load_mesh, weld_vertices
+from piston_templates import PISTON_FIDELITY
+
+# The checked-in CAD model (Shapr3D export, mm, chamfered corners) must produce a scene
+# MuJoCo compiles, at native scale and scaled with --size.
+STL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rhrombic_dodecahedron.stl")
+
+def test_weld_merges_cad_chamfers():
+    verts, faces = weld_vertices(*load_mesh(STL_PATH))
+    assert len(verts) == 14 # 6 axis tips + 8 cube corners
+
+@pytest.mark.parametrize("shift", [0.0, 0.5])
+def test_weld_merges_across_cell_boundary(shift):
+    # Unit square as two triangles; the shared corner b comes twice, 2e-12 apart on
+    # either side of a spatial hash cell boundary (cell = tol * bbox diagonal).
+    cell = DEFAULT_WELD_TOL * np.sqrt(2.0)
+    x = (3000 + shift) * cell
+    verts = np.array([
+        [0, 0, 0], [x - 1e-12, 0, 0], [0, 1, 0],
+        [x + 1e-12, 0, 0], [1, 0, 0], [0, 1, 0],
+        [1, 0, 0], [1, 1, 0], [0, 1, 0],
+    ])
+    faces = np.arange(9).reshape(-1, 3)
+    welded, faces = weld_vertices(verts, faces)
+    assert len(welded) == 5
+    assert len(faces) == 3
+
+@pytest.mark.parametrize("fidelity", PISTON_FIDELITY)
+@pytest.mark.parametrize("size", [None, 3.6])
+def test_scene_from_repo_stl_compiles(tmp_path, fidelity, size):
+    output = str(tmp_path / "scene_mesh.xml")
+    generate_scene_from_mesh(STL_PATH, output, size=size, piston_fidelity=fidelity)
+    model = mujoco.MjModel.from_xml_path(output)
+    data = mujoco.MjData(model)
+    mujoco.mj_step(model, data, 10)
+    assert model.nbody > 14
+    assert data.time > 0
@@ -0,0 +1,213 @@
+import argparse
+import os
+import socket
+import struct
+import sys
+import time
+
+import numpy as np
+
+# UDP Datagram Transport (main_puppet.py --udp [PORT])
+# Teleoperation / hardware-in-the-loop controllers only care about the newest sample.
+# Over TCP one lost segment stalls every later update (head-of-line blocking); here
+# each datagram stands alone and anything older than what was already seen is dropped.
+#
+# Datagram = 22 byte header + float32 payload:
+#   magic "TS", version, kind, seq (u32), ack (u32), time (f64), count (u16)
+#   HELLO   client -> server  (re)subscribe, resets the client's sequence
+#   CONTROL client -> server  seq, payload = normalized piston targets 0..1 (NaN = keep)
+#   STATE   server -> client  seq = frame, ack = last CONTROL seq applied from this
+#                             client, time = sim time, payload = qpos
+#   BYE     client -> server  unsubscribe
+# Clients that send nothing for CLIENT_TIMEOUT seconds are dropped (send HELLO or
+# CONTROL as keepalive). qpos is float32: meant for control loops and display.
+#
+# Client:  c = UdpClient("127.0.0.1", 8767)
+#          c.send_targets([0.5] * 12)
+#          frame = c.recv_state(timeout=0.1)   newest STATE only, older ones discarded
+
+MAGIC = b"TS"
+VERSION = 1
+HELLO, CONTROL, STATE, BYE = range(4)
+HEADER = struct.Struct("<2sBBIIdH")
+DEFAULT_PORT = 8767
+CLIENT_TIMEOUT = 5.0
+MAX_DATAGRAM = 65507
+
+def udp_port_option(argv=None):
+    # --udp [PORT] or PUPPET_UDP_PORT=PORT, None when disabled
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--udp", nargs="?", type=int, const=DEFAULT_PORT, default=os.environ.get("PUPPET_UDP_PORT"))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return None if args.udp is None else int(args.udp)
+
+def pack(kind, seq, values=(), ack=0, stamp=0.0):
+    payload = np.asarray(values, dtype="<f4")
+    return HEADER.pack(MAGIC, VERSION, kind, seq & 0xFFFFFFFF, ack & 0xFFFFFFFF, stamp, len(payload)) + payload.tobytes()
+
+def unpack(datagram):
+    # -> (kind, seq, ack, time, values) or None for malformed / foreign packets
+    if len(datagram) < HEADER.size:
+        return None
+    magic, version, kind, seq, ack, stamp, count = HEADER.unpack_from(datagram)
+    if magic != MAGIC or version != VERSION or len(datagram) != HEADER.size + 4 * count:
+        return None
+    values = np.frombuffer(datagram, dtype="<f4", count=count, offset=HEADER.size)
+    return kind, seq, ack, stamp, values
+
+def is_newer(seq, last):
+    # u32 serial number arithmetic, survives wraparound
+    return 0 < ((seq - last) & 0xFFFFFFFF) < 0x80000000
+
+class UdpControlServer:
+    # asyncio DatagramProtocol, create with loop.create_datagram_endpoint
+    def __init__(self, targets):
+        # targets: list of normalized piston targets (shared with piston_move)
+        self.targets = targets
+        self.clients = {} # addr -> {"seq", "seen"}
+        self.transport = None
+        self.frame = 0
+        self.stats = {"received": 0, "applied": 0, "stale": 0, "malformed": 0, "sent": 0}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+    def error_received(self, exc):
+        # ICMP port unreachable from a client that went away; expiry removes it
+        pass
+
+    def datagram_received(self, datagram, addr):
+        self.stats["received"] += 1
+        packet = unpack(datagram)
+        if packet is None:
+            self.stats["malformed"] += 1
+            return
+        kind, seq, _, _, values = packet
+        now = time.monotonic()
+        client = self.clients.get(addr)
+
+        if kind == BYE:
+            self.clients.pop(addr, None)
+            return
+        if kind == HELLO or client is None or now - client["seen"] > CLIENT_TIMEOUT:
+            # New or returning client: accept whatever sequence it starts from
+            client = self.clients[addr] = {"seq": (seq - 1) & 0xFFFFFFFF, "seen": now}
+        client["seen"] = now
+        if kind != CONTROL:
+            return
+        if not is_newer(seq, client["seq"]):
+            self.stats["stale"] += 1
+            return
+        client["seq"] = seq
+
+        # Latest sample wins: applied directly, the loop picks it up on its next batch
+        n = min(len(values), len(self.targets))
+        for i in range(n):
+            v = float(values[i])
+            if v == v: # NaN keeps the current target
+                self.targets[i] = max(0.0, min(1.0, v))
+        self.stats["applied"] += 1
+
+    def publish(self, data):
+        # One STATE datagram per subscribed client (same payload, per-client ack)
+        if self.transport is None or not self.clients:
+            return
+        now = time.monotonic()
+        for addr in [a for a, c in self.clients.items() if now - c["seen"] > CLIENT_TIMEOUT]:
+            del self.clients[addr]
+
+        self.frame = (self.frame + 1) & 0xFFFFFFFF
+        payload = data.qpos.astype("<f4").tobytes()
+        if HEADER.size + len(payload) > MAX_DATAGRAM:
+            return
+        for addr, client in self.clients.items():
+            header = HEADER.pack(MAGIC, VERSION, STATE, self.frame, client["seq"], data.time, data.qpos.shape[0])
+            self.transport.sendto(header + payload, addr)
+            self.stats["sent"] += 1
+
+    def info(self):
+        return {"clients": len(self.clients), **self.stats}
+
+class UdpClient:
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.addr = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.seq = 0
+        self.last_frame = None
+        self.sent_at = {} # control seq -> perf_counter, for round trip times
+        self.stale = 0
+        self.sock.sendto(pack(HELLO, 0), self.addr)
+
+    def send_targets(self, values):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        self.sent_at[self.seq] = time.perf_counter()
+        if len(self.sent_at) > 1024:
+            self.sent_at.pop(next(iter(self.sent_at)))
+        self.sock.sendto(pack(CONTROL, self.seq, values), self.addr)
+        return self.seq
+
+    def recv_state(self, timeout=0.1):
+        # Drains the socket and returns the newest STATE frame (dict) or None
+        deadline = time.monotonic() + timeout
+        newest = None
+        while True:
+            try:
+                datagram = self.sock.recv(MAX_DATAGRAM)
+            except BlockingIOError:
+                if newest is not None or time.monotonic() >= deadline:
+                    return newest
+                time.sleep(0.0005)
+                continue
+            except ConnectionRefusedError:
+                continue
+            packet = unpack(datagram)
+            if packet is None or packet[0] != STATE:
+                continue
+            _, seq, ack, sim_time, values = packet
+            if self.last_frame is not None and not is_newer(seq, self.last_frame):
+                self.stale += 1
+                continue
+            self.last_frame = seq
+            sent = self.sent_at.get(ack)
+            newest = {"seq": seq, "ack": ack, "time": sim_time, "qpos": values,
+                      "rtt_ms": (time.perf_counter() - sent) * 1e3 if sent is not None else None}
+
+    def close(self):
+        try:
+            self.sock.sendto(pack(BYE, self.seq), self.addr)
+        finally:
+            self.sock.close()
+
+if __name__ == "__main__":
+    # Round trip probe: python deployment/robot_control/udp_transport.py [--host H] [--port P] [--seconds S]
+    parser = argparse.ArgumentParser(description="Send piston targets over UDP and report control -> state latency")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--n-action", type=int, default=12)
+    parser.add_argument("--hz", type=float, default=100.0)
+    args = parser.parse_args()
+
+    client = UdpClient(args.host, args.port)
+    rtts = []
+    acked = 0
+    end = time.monotonic() + args.seconds
+    while time.monotonic() < end:
+        phase = 0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * time.monotonic())
+        client.send_targets([phase] * args.n_action)
+        frame = client.recv_state(timeout=1.0 / args.hz)
+        if frame is not None and frame["ack"] != acked and frame["rtt_ms"] is not None:
+            acked = frame["ack"]
+            rtts.append(frame["rtt_ms"])
+    client.close()
+
+    if not rtts:
+        print(f"No state received from {args.host}:{args.port} (server started with --udp?)")
+    else:
+        p50, p95, p99 = np.percentile(rtts, [50, 95, 99])
+        print(f"{len(rtts)} acked controls, {client.seq} sent, {client.stale} stale frames dropped")
+        print(f"control -> state: p50 {p50:.2f} ms | p95 {p95:.2f} ms | p99 {p99:.2f} ms | max {max(rtts):.2f} ms")